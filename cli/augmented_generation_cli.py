@@ -1,69 +1,128 @@
 import argparse
-
-from lib.rag_search import rag_command, summarize_command, citations_command, question_command
-from lib.search_utils import DEFAULT_SEARCH_LIMIT
+from typing import Callable
+
+from lib.rag_search import rag_command, summarize_command, citations_command, question_command, batch_rag_command, RAG_PIPELINES
+from lib.llm_client import usage
+from lib.search_utils import DEFAULT_SEARCH_LIMIT, DEFAULT_RAG_CONCURRENCY, DEFAULT_CONTEXT_TOKEN_BUDGET
+from lib.profiling import enable_profiling
+from lib.tracing import enable_tracing
+
+def print_context(context: dict) -> None:
+    print(
+        f"Context: {context["context_tokens"]} of {context["full_tokens"]} tokens "
+        f"({context["tokens_saved"]} saved)"
+    )
+
+def print_token(token: str) -> None:
+    print(token, end="", flush=True)
+
+def run_generation(heading: str, answer_key: str, stream: bool, command: Callable[..., dict], *args) -> None:
+    if stream:
+        print(f"{heading}:")
+        results = command(*args, on_token=print_token)
+        print("\n")
+    else:
+        results = command(*args)
+
+    if "error" in results:
+        print(f"Error: {results["error"]}")
+        return
+
+    print("Search Results:")
+    for res in results["search_results"]:
+        print(f"   - {res["title"]}")
+    print_context(results["context"])
+    print()
+
+    if not stream:
+        print(f"{heading}:")
+        print(f"{results[answer_key]}")
+        print()
+
+    generation = results["generation"]
+    if generation["streamed"]:
+        print(f"Time to first token: {generation["ttft"]:.2f}s, total generation time: {generation["total"]:.2f}s")
+    else:
+        print(f"Generation time: {generation["total"]:.2f}s")
 
 def main():
     parser = argparse.ArgumentParser(description="Retrieval Augmented Generation CLI")
+    parser.add_argument("--trace", type=str, metavar="PATH", help="Write a Chrome trace-event JSON of this run to PATH")
+    parser.add_argument("--profile", type=str, metavar="PATH", help="Sample this run's stacks; write them collapsed (flamegraph format) to PATH and print the hottest functions")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     rag_parser = subparsers.add_parser("rag", help="Perform RAG (search + generate answer)")
     rag_parser.add_argument("query", type=str, help="Search query for RAG")
+    rag_parser.add_argument("--token-budget", type=int, default=DEFAULT_CONTEXT_TOKEN_BUDGET, help=f"Approximate token budget for retrieved context, 0 to send full documents (default={DEFAULT_CONTEXT_TOKEN_BUDGET})")
+    rag_parser.add_argument("--stream", action="store_true", help="Print the response as it is generated")
 
     summarize_parser = subparsers.add_parser("summarize", help="Summarizes search results")
     summarize_parser.add_argument("query", type=str, help="Search query for Summarize")
     summarize_parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help="Number of search results to return")
+    summarize_parser.add_argument("--token-budget", type=int, default=DEFAULT_CONTEXT_TOKEN_BUDGET, help=f"Approximate token budget for retrieved context, 0 to send full documents (default={DEFAULT_CONTEXT_TOKEN_BUDGET})")
+    summarize_parser.add_argument("--stream", action="store_true", help="Print the response as it is generated")
 
     citations_parser = subparsers.add_parser("citations", help="Provides citations in search results")
     citations_parser.add_argument("query", type=str, help="Search query for Citations")
     citations_parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help="Number of search results to return")
+    citations_parser.add_argument("--token-budget", type=int, default=DEFAULT_CONTEXT_TOKEN_BUDGET, help=f"Approximate token budget for retrieved context, 0 to send full documents (default={DEFAULT_CONTEXT_TOKEN_BUDGET})")
+    citations_parser.add_argument("--stream", action="store_true", help="Print the response as it is generated")
 
     questions_parser = subparsers.add_parser("question", help="Provides answer to a question")
     questions_parser.add_argument("question", type=str, help="Question you want to ask")
     questions_parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help="Number of search results to return")
+    questions_parser.add_argument("--token-budget", type=int, default=DEFAULT_CONTEXT_TOKEN_BUDGET, help=f"Approximate token budget for retrieved context, 0 to send full documents (default={DEFAULT_CONTEXT_TOKEN_BUDGET})")
+    questions_parser.add_argument("--stream", action="store_true", help="Print the response as it is generated")
+
+    batch_parser = subparsers.add_parser("batch", help="Run many RAG queries concurrently")
+    batch_parser.add_argument("file", type=str, help="File with one query per line")
+    batch_parser.add_argument("--mode", type=str, choices=list(RAG_PIPELINES), default="rag", help="RAG pipeline to run for each query")
+    batch_parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help="Number of search results to return")
+    batch_parser.add_argument("--max-concurrency", type=int, default=DEFAULT_RAG_CONCURRENCY, help=f"Maximum number of queries in flight (default={DEFAULT_RAG_CONCURRENCY})")
+    batch_parser.add_argument("--token-budget", type=int, default=DEFAULT_CONTEXT_TOKEN_BUDGET, help=f"Approximate token budget for retrieved context, 0 to send full documents (default={DEFAULT_CONTEXT_TOKEN_BUDGET})")
 
     args = parser.parse_args()
+    if args.trace:
+        enable_tracing(args.trace)
+    if args.profile:
+        enable_profiling(args.profile)
 
     match args.command:
         case "rag":
-            results = rag_command(args.query)
-            print("Search Results:")
-            for res in results["search_results"]:
-                print(f"   - {res["title"]}")
-            print()
-
-            print("RAG Response:")
-            print({results["answer"]})
+            run_generation("RAG Response", "answer", args.stream, rag_command, args.query, args.token_budget)
         case "summarize":
-            results = summarize_command(args.query, args.limit)
-            
-            print("Search Results:")
-            for res in results["search_results"]:
-                print(f"   - {res["title"]}")
-            print()
-
-            print("LLM Summary:")
-            print(f"{results["summary"]}")
+            run_generation("LLM Summary", "summary", args.stream, summarize_command, args.query, args.limit, args.token_budget)
         case "citations":
-            results = citations_command(args.query, args.limit)
-
-            print("Search Results:")
-            for res in results["search_results"]:
-                print(f"   - {res["title"]}")
-            print()
-            
-            print("LLM Answer:")
-            print(f"{results["summary"]}")
+            run_generation("LLM Answer", "summary", args.stream, citations_command, args.query, args.limit, args.token_budget)
         case "question":
-            results = question_command(args.question, args.limit)
-
-            print("Search Results:")
-            for res in results["search_results"]:
-                print(f"   - {res["title"]}")
-            print()
-
-            print("Answer:")
-            print(f"{results["answer"]}")
+            run_generation("Answer", "answer", args.stream, question_command, args.question, args.limit, args.token_budget)
+
+        case "batch":
+            with open(args.file, "r") as f:
+                queries = [line.strip() for line in f if line.strip()]
+
+            results = batch_rag_command(queries, args.mode, args.limit, args.max_concurrency, args.token_budget)
+
+            for res in results:
+                print(f"Query: {res.get("query", res.get("question"))}")
+                if "error" in res:
+                    print(f"   Error: {res["error"]}")
+                    print()
+                    continue
+                print("Search Results:")
+                for search_result in res["search_results"]:
+                    print(f"   - {search_result["title"]}")
+                print_context(res["context"])
+                print("Response:")
+                print(f"{res.get("answer", res.get("summary"))}")
+                print()
+
+            print("LLM usage:")
+            for stage, stats in usage.report().items():
+                print(
+                    f"   - {stage}: {stats["calls"]} calls ({stats["cached"]} cached), "
+                    f"{stats["total_tokens"]} tokens, {stats["avg_latency"]:.2f}s avg latency"
+                )
 
         case _:
             parser.print_help()
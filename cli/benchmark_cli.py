@@ -0,0 +1,164 @@
+import argparse
+import json
+import sys
+
+from lib.benchmark import BENCHMARKS, benchmark_command, compare_command, save_baseline_command
+from lib.memory_report import memory_report_command
+from lib.startup_check import startup_check_command
+from lib.search_utils import (
+    BENCHMARK_COMPARE_ROUNDS,
+    BENCHMARK_MIN_DELTA_MB,
+    BENCHMARK_MIN_DELTA_MS,
+    BENCHMARK_REGRESSION_THRESHOLD,
+    BENCHMARK_SIGNIFICANCE,
+    DEFAULT_BASELINE_NAME,
+    DEFAULT_BENCHMARK_REPEAT,
+    DEFAULT_SEARCH_LIMIT,
+    MEMORY_REPORT_SCALES,
+    STARTUP_IMPORT_BUDGET,
+    STARTUP_REPEAT,
+)
+from lib.sweep import SWEEP_METRICS, SWEEP_RERANK_METHODS, sweep_command
+from lib.profiling import enable_profiling
+from lib.tracing import enable_tracing
+
+def main():
+    parser = argparse.ArgumentParser(description="Search Performance Benchmark CLI")
+    parser.add_argument("--trace", type=str, metavar="PATH", help="Write a Chrome trace-event JSON of this run to PATH")
+    parser.add_argument("--profile", type=str, metavar="PATH", help="Sample this run's stacks; write them collapsed (flamegraph format) to PATH and print the hottest functions")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    run_parser = subparsers.add_parser("run", help="Benchmark every search mode over the golden-dataset queries, offline")
+    run_parser.add_argument("--only", type=str, action="append", choices=BENCHMARKS, help="Benchmark to run (repeatable, default=all)")
+    run_parser.add_argument("--repeat", type=int, default=DEFAULT_BENCHMARK_REPEAT, help=f"Passes over the queries per benchmark (default={DEFAULT_BENCHMARK_REPEAT})")
+    run_parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help=f"Number of results per search (default={DEFAULT_SEARCH_LIMIT})")
+    run_parser.add_argument("--samples", action="store_true", help="Include every latency in the report, as samples_ms")
+    run_parser.add_argument("--output", type=str, help="Also write the JSON report to this file")
+
+    baseline_parser = subparsers.add_parser("baseline", help="Run the suite and save it as a baseline under benchmarks/ (or $SEARCH_BASELINES_DIR)")
+    baseline_parser.add_argument("--name", type=str, default=DEFAULT_BASELINE_NAME, help=f"Baseline name (default={DEFAULT_BASELINE_NAME})")
+    baseline_parser.add_argument("--only", type=str, action="append", choices=BENCHMARKS, help="Benchmark to run (repeatable, default=all)")
+    baseline_parser.add_argument("--repeat", type=int, default=DEFAULT_BENCHMARK_REPEAT, help=f"Passes over the queries per benchmark (default={DEFAULT_BENCHMARK_REPEAT})")
+    baseline_parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help=f"Number of results per search (default={DEFAULT_SEARCH_LIMIT})")
+    baseline_parser.add_argument("--rounds", type=int, default=BENCHMARK_COMPARE_ROUNDS, help=f"Fresh-process runs to record (default={BENCHMARK_COMPARE_ROUNDS})")
+
+    compare_parser = subparsers.add_parser("compare", help="Run the suite against a saved baseline; exits 1 on a significant regression")
+    compare_parser.add_argument("--name", type=str, default=DEFAULT_BASELINE_NAME, help=f"Baseline name (default={DEFAULT_BASELINE_NAME})")
+    compare_parser.add_argument("--only", type=str, action="append", choices=BENCHMARKS, help="Benchmark to run (repeatable, default=all)")
+    compare_parser.add_argument("--repeat", type=int, default=DEFAULT_BENCHMARK_REPEAT, help=f"Passes over the queries per benchmark (default={DEFAULT_BENCHMARK_REPEAT})")
+    compare_parser.add_argument("--limit", type=int, help="Number of results per search (default=the baseline's)")
+    compare_parser.add_argument("--threshold", type=float, default=BENCHMARK_REGRESSION_THRESHOLD, help=f"Relative slowdown that counts as a regression (default={BENCHMARK_REGRESSION_THRESHOLD})")
+    compare_parser.add_argument("--significance", type=float, default=BENCHMARK_SIGNIFICANCE, help=f"Family-wise p-value below which a slowdown is significant, Bonferroni-corrected over the checks (default={BENCHMARK_SIGNIFICANCE})")
+    compare_parser.add_argument("--min-delta-ms", type=float, default=BENCHMARK_MIN_DELTA_MS, help=f"Smallest latency increase, in ms, that counts as a regression (default={BENCHMARK_MIN_DELTA_MS})")
+    compare_parser.add_argument("--min-delta-mb", type=float, default=BENCHMARK_MIN_DELTA_MB, help=f"Smallest peak-allocation increase, in MiB, that counts as a regression (default={BENCHMARK_MIN_DELTA_MB})")
+    compare_parser.add_argument("--rounds", type=int, default=BENCHMARK_COMPARE_ROUNDS, help=f"Fresh-process runs a regression must repeat in (default={BENCHMARK_COMPARE_ROUNDS})")
+    compare_parser.add_argument("--output", type=str, help="Also write the JSON report to this file")
+
+    memory_parser = subparsers.add_parser("memory-report", help="Load the hybrid stack and report the memory of each index, embedding and model structure")
+    memory_parser.add_argument("--scales", type=float, nargs="+", help=f"Corpus size multiples to project totals for (default={" ".join(map(str, MEMORY_REPORT_SCALES))})")
+
+    startup_parser = subparsers.add_parser("startup", help="Check every CLI's import time and heavy imports; exits 1 over budget")
+    startup_parser.add_argument("--budget", type=float, default=STARTUP_IMPORT_BUDGET, help=f"Import-time budget per CLI in seconds (default={STARTUP_IMPORT_BUDGET})")
+    startup_parser.add_argument("--repeat", type=int, default=STARTUP_REPEAT, help=f"Runs per CLI, keeping the fastest (default={STARTUP_REPEAT})")
+    startup_parser.add_argument("--only", type=str, action="append", metavar="SCRIPT", help="CLI script to check, e.g. keyword_search_cli.py (repeatable, default=all)")
+
+    sweep_parser = subparsers.add_parser("sweep", help="Score retrieval knob settings on the golden dataset against their latency")
+    sweep_parser.add_argument("--depths", type=int, nargs="+", help="Candidate depths, as multiples of the limit, fetched per retriever")
+    sweep_parser.add_argument("--rrf-k", type=int, nargs="+", help="RRF k values")
+    sweep_parser.add_argument("--alphas", type=float, nargs="+", help="Weighted-search alpha values")
+    sweep_parser.add_argument("--rerank-method", type=str, choices=SWEEP_RERANK_METHODS, help="Also rerank every setting with this method")
+    sweep_parser.add_argument("--multipliers", type=int, nargs="+", help="Candidates reranked, as multiples of the limit")
+    sweep_parser.add_argument("--metric", type=str, choices=SWEEP_METRICS, default="recall", help="Quality metric for the Pareto frontier (default=recall)")
+    sweep_parser.add_argument("--min-quality", type=float, default=0.0, help="Quality floor for the recommended setting (default=0.0)")
+    sweep_parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help=f"Number of results per search (default={DEFAULT_SEARCH_LIMIT})")
+    sweep_parser.add_argument("--output", type=str, help="Also write the JSON report to this file")
+
+    args = parser.parse_args()
+    if args.trace:
+        enable_tracing(args.trace)
+    if args.profile:
+        enable_profiling(args.profile)
+
+    match args.command:
+        case "run":
+            result = benchmark_command(args.only, args.repeat, args.limit, args.samples)
+            report = json.dumps(result, indent=2)
+            if args.output:
+                with open(args.output, "w") as f:
+                    f.write(report + "\n")
+            print(report)
+        case "baseline":
+            result = save_baseline_command(args.name, args.only, args.repeat, args.limit, args.rounds)
+            print(f"Saved baseline '{result["name"]}' ({len(result["benchmarks"])} benchmarks, commit {result["commit"]}) to {result["path"]}")
+        case "compare":
+            result = compare_command(
+                args.name, args.only, args.repeat, args.limit, args.threshold, args.significance,
+                args.min_delta_ms, args.min_delta_mb, args.rounds,
+            )
+            if args.output:
+                with open(args.output, "w") as f:
+                    f.write(json.dumps(result, indent=2) + "\n")
+            print(f"Comparing against baseline '{result["baseline"]}' (commit {result["baseline_commit"]}), threshold {result["threshold"]:.0%}, p < {result["corrected_significance"]:.4f}, confirmed over {result["rounds"]} runs")
+            for benchmark, checks in result["comparisons"].items():
+                print(f"  {benchmark}:")
+                for metric, check in checks.items():
+                    mark = "REGRESSION" if check["regression"] else f"flagged {check["rounds_flagged"]}/{result["rounds"]}" if check["rounds_flagged"] else ""
+                    p_value = f"p={check["p_value"]:.3f}" if check["p_value"] is not None else ""
+                    print(f"     - {metric:<12} {check["baseline"]:>10.2f} -> {check["current"]:>10.2f} ({check["change"]:+.1%} worse) {p_value:<8} {mark}")
+            for benchmark in result["unmatched"]:
+                print(f"  {benchmark}: not in the baseline, skipped")
+            if result["regressions"]:
+                print(f"{len(result["regressions"])} regression(s): {", ".join(result["regressions"])}")
+                sys.exit(1)
+            print("No regressions")
+        case "memory-report":
+            result = memory_report_command(args.scales)
+            print(f"Memory for {result["documents"]} documents, {result["chunks"]} chunks, {result["terms"]} terms")
+            print(f"RSS by load step (from {result["start_rss_mb"]:.1f} MiB):")
+            for step in result["steps"]:
+                print(f"   - {step["step"]:<22} {step["rss_mb"]:>9.1f} MiB ({step["delta_mb"]:+.1f})")
+            print("Deep size by structure:")
+            for structure in result["structures"]:
+                print(f"   - {structure["name"]:<48} {structure["mb"]:>9.2f} MiB")
+            print(f"Memory-mapped docstore file: {result["mapped_mb"]:.2f} MiB")
+            print(f"Corpus-sized: {result["corpus_mb"]:.2f} MiB, fixed (models): {result["fixed_mb"]:.2f} MiB")
+            print("Projected heap at larger corpora (plus the mapped file):")
+            for projection in result["projections"]:
+                print(f"   - {projection["scale"]:g}x ({projection["documents"]} documents): {projection["mb"]:.1f} MiB + {projection["mapped_mb"]:.1f} MiB mapped")
+        case "startup":
+            result = startup_check_command(args.budget, args.repeat, args.only)
+            print(f"Startup import time per CLI (budget {result["budget"]:.3f}s, fastest of {result["repeat"]}):")
+            for check in result["results"]:
+                status = "; ".join(check["problems"]) or "ok"
+                print(f"   - {check["command"]:<45} {check["import_time"]:>7.3f}s  {status}")
+            if result["failures"]:
+                print(f"{len(result["failures"])} CLI(s) over budget or importing heavy modules")
+                sys.exit(1)
+            print("All CLIs within budget")
+        case "sweep":
+            result = sweep_command(
+                args.depths, args.rrf_k, args.alphas, args.rerank_method, args.multipliers,
+                args.metric, args.min_quality, args.limit,
+            )
+            if args.output:
+                with open(args.output, "w") as f:
+                    f.write(json.dumps(result, indent=2) + "\n")
+            print(f"Sweep over {result["test_cases_count"]} golden queries (limit={result["limit"]}), * = Pareto frontier on {result["metric"]}")
+            print(f"  {"setting":<44} {"prec":>6} {"recall":>6} {"mrr":>6} {"mean ms":>9} {"p95 ms":>9}")
+            for point in sorted(result["points"], key=lambda point: point["latency"]["mean_ms"]):
+                mark = "*" if point["pareto"] else " "
+                print(
+                    f"{mark} {point["label"]:<44} {point["precision"]:>6.3f} {point["recall"]:>6.3f} {point["mrr"]:>6.3f}"
+                    f" {point["latency"]["mean_ms"]:>9.2f} {point["latency"]["p95_ms"]:>9.2f}"
+                )
+            recommended = result["recommended"]
+            if recommended is None:
+                print(f"No setting reaches {result["metric"]} >= {result["min_quality"]}")
+            else:
+                print(f"Recommended: {recommended["label"]} ({result["metric"]}={recommended[result["metric"]]:.3f}, mean {recommended["latency"]["mean_ms"]:.2f} ms)")
+        case _:
+            parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse
+
+from lib.synthetic_corpus import generate_corpus_command
+from lib.search_utils import (
+    SYNTHETIC_QUERY_COUNT,
+    SYNTHETIC_VOCAB_SIZE,
+    SYNTHETIC_ZIPF_EXPONENT,
+)
+from lib.profiling import enable_profiling
+from lib.tracing import enable_tracing
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic Corpus CLI")
+    parser.add_argument("--trace", type=str, metavar="PATH", help="Write a Chrome trace-event JSON of this run to PATH")
+    parser.add_argument("--profile", type=str, metavar="PATH", help="Sample this run's stacks; write them collapsed (flamegraph format) to PATH and print the hottest functions")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    generate_parser = subparsers.add_parser("generate", help="Write a movies.json-compatible synthetic corpus of any size")
+    generate_parser.add_argument("output_dir", type=str, help="Directory for movies.json, golden_dataset.json and stopwords.txt")
+    generate_parser.add_argument("--movies", type=int, required=True, help="Number of movies to generate")
+    generate_parser.add_argument("--vocab-size", type=int, default=SYNTHETIC_VOCAB_SIZE, help=f"Distinct description words (default={SYNTHETIC_VOCAB_SIZE})")
+    generate_parser.add_argument("--zipf", type=float, default=SYNTHETIC_ZIPF_EXPONENT, help=f"Zipf exponent of the word frequencies (default={SYNTHETIC_ZIPF_EXPONENT})")
+    generate_parser.add_argument("--queries", type=int, default=SYNTHETIC_QUERY_COUNT, help=f"Golden-dataset queries to generate (default={SYNTHETIC_QUERY_COUNT})")
+    generate_parser.add_argument("--seed", type=int, default=0, help="Random seed (default=0)")
+
+    args = parser.parse_args()
+    if args.trace:
+        enable_tracing(args.trace)
+    if args.profile:
+        enable_profiling(args.profile)
+
+    match args.command:
+        case "generate":
+            result = generate_corpus_command(args.output_dir, args.movies, args.vocab_size, args.zipf, args.queries, args.seed)
+            print(f"Wrote {result["movies"]} movies ({result["bytes"]} bytes) to {result["output_dir"]}")
+            print(f"   Vocabulary: {result["vocab_size"]} words, {result["avg_words"]:.1f} words per description")
+            print(f"   Golden dataset: {result["test_cases"]} queries")
+            print()
+            print("Build and query it without the embedding model with:")
+            print(f"   SEARCH_DATA_DIR={result["output_dir"]} SEARCH_CACHE_DIR={result["output_dir"]}/cache EMBEDDING_MODEL=random python snapshot_cli.py build")
+        case _:
+            parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
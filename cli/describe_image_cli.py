@@ -2,9 +2,10 @@ import os
 import argparse
 
 from mimetypes import guess_type
-from google import genai
-from google.genai import types
-from dotenv import load_dotenv
+
+from lib.llm_client import generate_content, usage
+from lib.profiling import enable_profiling
+from lib.tracing import enable_tracing
 
 model = "gemini-2.0-flash"
 instructions = f"""Given the included image and text query, rewrite the text query to improve search results from a movie database. Make sure to:
@@ -14,38 +15,42 @@ instructions = f"""Given the included image and text query, rewrite the text que
 """
 
 def main():
-    load_dotenv()
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY not set")
-
     parser = argparse.ArgumentParser(description="Multimodel Search CLI")
+    parser.add_argument("--trace", type=str, metavar="PATH", help="Write a Chrome trace-event JSON of this run to PATH")
+    parser.add_argument("--profile", type=str, metavar="PATH", help="Sample this run's stacks; write them collapsed (flamegraph format) to PATH and print the hottest functions")
     parser.add_argument("--image", type=str, help="Path to image file")
     parser.add_argument("--query", type=str, help="Text search")
     args = parser.parse_args()
+    if args.trace:
+        enable_tracing(args.trace)
+    if args.profile:
+        enable_profiling(args.profile)
 
     if not os.path.exists(args.image):
         raise FileNotFoundError(f"Image file not found: {args.image}")
     
+    from google.genai import types
+
     mime, _ = guess_type(args.image)
     mime = mime or "image/jpeg"
     with open(args.image, "rb") as f:
         img = f.read()
-    
-    client = genai.Client(api_key=api_key)
+
     parts = [
         instructions.strip(),
         types.Part.from_bytes(data=img, mime_type=mime),
         args.query.strip(),
     ]
 
-    resp = client.models.generate_content(model=model, contents=parts)
+    resp = generate_content(parts, "describe_image", model=model)
     if resp.text is None:
         raise RuntimeError("No text in Gemini response")
 
     print(f"Rewritten query: {resp.text.strip()}")
     if resp.usage_metadata is not None:
         print(f"Total tokens: {resp.usage_metadata.total_token_count}")
+    stats = usage.report()["describe_image"]
+    print(f"Latency: {stats["latency"]:.2f}s{" (cached)" if stats["cached"] else ""}")
 
 if __name__ == "__main__":
     main()
@@ -1,12 +1,20 @@
 import argparse
 
 from lib.evaluation import evaluate_command
+from lib.profiling import enable_profiling
+from lib.tracing import enable_tracing
 
 def main():
     parser = argparse.ArgumentParser(description="Search Evaluation CLI")
+    parser.add_argument("--trace", type=str, metavar="PATH", help="Write a Chrome trace-event JSON of this run to PATH")
+    parser.add_argument("--profile", type=str, metavar="PATH", help="Sample this run's stacks; write them collapsed (flamegraph format) to PATH and print the hottest functions")
     parser.add_argument("--limit", type=int, default=5, help="Number of results to evaluate (k for precision@k, recall@k)")
 
     args = parser.parse_args()
+    if args.trace:
+        enable_tracing(args.trace)
+    if args.profile:
+        enable_profiling(args.profile)
 
     results = evaluate_command(args.limit)
 
@@ -18,8 +26,16 @@ def main():
         print(f"   - F1 Score: {res["f1score"]:.4f}")
         print(f"   - Retrieved: {", ".join(res["retrieved"])}")
         print(f"   - Relevant: {", ".join(res["relevant_docs"])}")
+        print(f"   - Latency: {res["latency"] * 1000:.1f}ms")
         print()
 
+    latency = results["latency"]
+    print(f"Mean Precision@{args.limit}: {results["mean_precision"]:.4f}")
+    print(f"Mean Recall@{args.limit}: {results["mean_recall"]:.4f}")
+    print(f"Mean F1 Score: {results["mean_f1score"]:.4f}")
+    print(f"Latency: p50 {latency["p50_ms"]:.1f}ms, p95 {latency["p95_ms"]:.1f}ms, p99 {latency["p99_ms"]:.1f}ms ({latency["qps"]:.1f} QPS)")
+    print(f"Total: {results["total_time"]:.2f}s ({results["setup_time"]:.2f}s loading indexes and encoding queries)")
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
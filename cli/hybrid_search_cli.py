@@ -6,14 +6,25 @@ from lib.hybrid_search import (
     rrf_search_command,
 )
 
+from lib.reranking import parse_cascade
+from lib.sharded_search import sharded_search_command
+
+from lib.llm_client import set_rate_limit
 from lib.search_utils import (
+    DEFAULT_RERANK_CONCURRENCY,
     DEFAULT_SEARCH_LIMIT,
+    DEFAULT_SHARD_COUNT,
+    LLM_RPS,
 )
 
 from lib.evaluation import llm_judge_results
+from lib.profiling import enable_profiling
+from lib.tracing import enable_tracing
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Hybrid Search CLI")
+    parser.add_argument("--trace", type=str, metavar="PATH", help="Write a Chrome trace-event JSON of this run to PATH")
+    parser.add_argument("--profile", type=str, metavar="PATH", help="Sample this run's stacks; write them collapsed (flamegraph format) to PATH and print the hottest functions")
     subparser = parser.add_subparsers(dest="command", help="Available commands")
 
     normalize_parser = subparser.add_parser("normalize", help="Normalize a list of scores")
@@ -23,17 +34,35 @@ def main() -> None:
     weighted_parser.add_argument("query", type=str, help="search query")
     weighted_parser.add_argument("--alpha", type=float, nargs="?", default=0.5, help="Weight for BM25 vs semantic (0=all semantic, 1=all BM25, default=0.5)")
     weighted_parser.add_argument("--limit", type=int, nargs="?", default=DEFAULT_SEARCH_LIMIT, help="Number of results to return (default=5)")
+    weighted_parser.add_argument("--filter", type=str, action="append", dest="filters", help="Metadata filter such as year>=2000 or genre=comedy (repeatable)")
 
     rrf_parser = subparser.add_parser("rrf-search", help="Perform Reciprocal Rank Fusion hybrid search")
     rrf_parser.add_argument("query", type=str, help="search query")
     rrf_parser.add_argument("--k", type=int, default=60, help="RRF k parameter controlling weight distribution - higher-ranked results vs lower-ranked ones (1=high rank distribution, 100=low rank distribution) - default=60")
-    rrf_parser.add_argument("--enhance", type=str, choices=["spell", "rewrite", "expand"], help="Query enhancement method")
+    rrf_parser.add_argument("--enhance", type=str, choices=["spell", "rewrite", "expand", "fanout"], help="Query enhancement method (fanout runs every method concurrently and fuses all variants)")
     rrf_parser.add_argument("--rerank-method", type=str, choices=["individual", "batch", "cross_encoder"], help="Reranking method")
+    rrf_parser.add_argument("--cascade", type=str, help="Rerank cascade of method:width stages, e.g. rrf:100,cross_encoder:20,batch:5")
+    rrf_parser.add_argument("--timeout", type=float, help="Request deadline in seconds; optional stages are skipped or cut short to meet it")
     rrf_parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help="Number of results to return (default=5)")
     rrf_parser.add_argument("--evaluate", action="store_true", help="Rates search results")
+    rrf_parser.add_argument("--filter", type=str, action="append", dest="filters", help="Metadata filter such as year>=2000 or genre=comedy (repeatable)")
+    rrf_parser.add_argument("--rps", type=float, default=LLM_RPS, help=f"Gemini requests per second allowed across the whole process (default={LLM_RPS})")
+    rrf_parser.add_argument("--concurrency", type=int, default=DEFAULT_RERANK_CONCURRENCY, help=f"Individual LLM rerank requests in flight (default={DEFAULT_RERANK_CONCURRENCY})")
     
 
+    sharded_parser = subparser.add_parser("sharded-search", help="Perform RRF hybrid search scattered across worker processes")
+    sharded_parser.add_argument("query", type=str, help="search query")
+    sharded_parser.add_argument("--shards", type=int, default=DEFAULT_SHARD_COUNT, help=f"Number of shard worker processes (default={DEFAULT_SHARD_COUNT})")
+    sharded_parser.add_argument("--k", type=int, default=60, help="RRF k parameter (default=60)")
+    sharded_parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help="Number of results to return (default=5)")
+    sharded_parser.add_argument("--filter", type=str, action="append", dest="filters", help="Metadata filter such as year>=2000 or genre=comedy (repeatable)")
+    sharded_parser.add_argument("--check", action="store_true", help="Compare against the single-process engine")
+
     args = parser.parse_args()
+    if args.trace:
+        enable_tracing(args.trace)
+    if args.profile:
+        enable_profiling(args.profile)
 
     match args.command:
         case "normalize":
@@ -41,7 +70,7 @@ def main() -> None:
             for score in normalized:
                 print(f"* {score:.4f}")
         case "weighted-search":
-            results = weighted_search_command(args.query, args.alpha, args.limit)
+            results = weighted_search_command(args.query, args.alpha, args.limit, args.filters)
             print(f"Weighted Hybrid Search Results for '{results["query"]}' (alpha={results["alpha"]}):")
             print(f"   Alpha {results["alpha"]}: {int(results["alpha"] * 100)}% Keyword, {int((1 - results["alpha"]) * 100)}% Semantic")
             for i, res in enumerate(results["results"], 1):
@@ -55,16 +84,58 @@ def main() -> None:
                 print(f"   {res['document'][:100]}...")
                 print()
         case "rrf-search":
-            results = rrf_search_command(args.query, args.k, args.enhance, args.rerank_method, args.limit, args.evaluate)
+            if args.cascade and args.rerank_method:
+                parser.error("--cascade and --rerank-method are mutually exclusive")
+            if args.cascade:
+                try:
+                    parse_cascade(args.cascade)
+                except ValueError as e:
+                    parser.error(str(e))
+            if args.rps <= 0 or args.concurrency < 1:
+                parser.error("--rps must be positive and --concurrency at least 1")
+            set_rate_limit(args.rps)
+            results = rrf_search_command(
+                args.query, args.k, args.enhance, args.rerank_method, args.limit, args.evaluate, args.filters,
+                args.cascade, args.timeout, concurrency=args.concurrency,
+            )
             
             if results["enhanced_query"]:
                 print(f"Enhnaced query ({results["enhance_method"]}): '{results["original_query"]}' -> '{results["enhanced_query"]}'\n")
 
+            if results["enhancement_cache"]:
+                cache = results["enhancement_cache"]
+                print(
+                    f"Enhancement cache: {cache["hits"]} hit(s), {cache["misses"]} miss(es) "
+                    f"({cache["hit_rate"]:.0%} hit rate)\n"
+                )
+
+            if results["fanout"]:
+                fanout = results["fanout"]
+                print(f"Fused {len(fanout["variants"])} query variants in {fanout["total_time"]:.2f}s:")
+                for label, variant in fanout["variants"].items():
+                    print(f"   - {label} ({fanout["latencies"][label]:.2f}s): '{variant}'")
+                for label, error in fanout["errors"].items():
+                    print(f"   - {label}: failed ({error})")
+                print()
+
             if results["reranked"]:
                 print(
                     f"Reranking top {len(results['results'])} results using {results['rerank_method']} method...\n"
                 )
 
+            if results["degraded"]:
+                print(f"Degraded to meet the {results["timeout"]}s deadline:")
+                for stage in results["degraded"]:
+                    print(f"   - {stage["stage"]}: {stage["reason"]} -> {stage["fallback"]}")
+                print()
+
+            if results["cascade"]:
+                print("Rerank cascade:")
+                for stage in results["cascade"]:
+                    candidates = "" if stage["candidates"] is None else f"{stage["candidates"]} -> "
+                    print(f"   - {stage["method"]} top {stage["width"]}: {candidates}{stage["survivors"]} ({stage["latency"]:.2f}s)")
+                print()
+
             print(f"Reciprocal Rank Fusion Results for '{results["query"]}' (k={results["k"]}):")
 
             for i, res in enumerate(results["results"], 1):
@@ -74,7 +145,7 @@ def main() -> None:
                     print(f"   Rerank Score: {res.get("individual_score", 0):.3f}/10")
                 if "batch_rank" in res:
                     print(f"   Rerank Rank: {res.get("batch_rank", 0)}")
-                if "cross_encoder_score" in res:
+                if "crossencoder_score" in res:
                     print(f"   Cross-Encoder Score: {res["crossencoder_score"]:.3f}")
                 print(f"   RRF Score: {res["score"]:.3f}")
                 metadata = res.get("metadata", {})
@@ -86,6 +157,21 @@ def main() -> None:
                 llm_scores = llm_judge_results(results["query"], results["results"])
                 for i, res in enumerate(llm_scores, 1):
                     print(f"{i}. {res["title"]}: {res["score"]}/3")
+        case "sharded-search":
+            results = sharded_search_command(args.query, args.shards, args.k, args.limit, args.filters, args.check)
+
+            print(f"Sharded RRF Results for '{results["query"]}' (k={results["k"]}, shards={results["shards"]}):")
+            for i, res in enumerate(results["results"], 1):
+                print(f"{i}. {res["title"]}")
+                print(f"   RRF Score: {res["score"]:.3f}")
+                metadata = res.get("metadata", {})
+                print(f"   BM25 Rank: {metadata["bm25_rank"]}, Semantic Rank: {metadata["semantic_rank"]}")
+                print(f"   {res["document"][:100]}...")
+                print()
+
+            if results["matches_single_shard"] is not None:
+                status = "match" if results["matches_single_shard"] else "DIFFER FROM"
+                print(f"Sharded results {status} the single-process engine")
         case _:
             parser.print_help()
 
@@ -5,14 +5,19 @@ import argparse
 from lib.keyword_search import search_command, build_command, tf_command, idf_command, tfidf_command, bm25_idf_command, bm25_tf_command, bm25search_command
 from lib.search_utils import BM25_K1, BM25_B, DEFAULT_SEARCH_LIMIT
 from lib.keyword_search import tokenize_text
+from lib.profiling import enable_profiling
+from lib.tracing import enable_tracing
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Keyword Search CLI")
+    parser.add_argument("--trace", type=str, metavar="PATH", help="Write a Chrome trace-event JSON of this run to PATH")
+    parser.add_argument("--profile", type=str, metavar="PATH", help="Sample this run's stacks; write them collapsed (flamegraph format) to PATH and print the hottest functions")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     search_parser = subparsers.add_parser("search", help="Search movies using BM25")
     search_parser.add_argument("query", type=str, help="Search query")
+    search_parser.add_argument("--filter", type=str, action="append", dest="filters", help="Metadata filter such as year>=2000 or genre=comedy (repeatable)")
 
     subparsers.add_parser("build", help="Build the inverted index")
     
@@ -39,8 +44,13 @@ def main() -> None:
     bm25search_parser = subparsers.add_parser("bm25search", help="Search movies using full BM25 scoring")
     bm25search_parser.add_argument("query", type=str, help="Search query")
     bm25search_parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help="Maximum number of results to return")
+    bm25search_parser.add_argument("--filter", type=str, action="append", dest="filters", help="Metadata filter such as year>=2000 or genre=comedy (repeatable)")
 
     args = parser.parse_args()
+    if args.trace:
+        enable_tracing(args.trace)
+    if args.profile:
+        enable_profiling(args.profile)
 
     match args.command:
         case "build":  
@@ -49,7 +59,7 @@ def main() -> None:
             print("Inverted index built successfully.")
         case "search":
             print(f'Searching for: {args.query}')
-            results = search_command(args.query)
+            results = search_command(args.query, filters=args.filters)
             for i, res in enumerate(results, 1):
                 print(f"{i}. ({res['id']}) {res['title']}")
         case "tf":
@@ -69,7 +79,7 @@ def main() -> None:
             print(f"BM25 TF score of '{args.term}' in document '{args.doc_id}': {bm25tf:.2f}")
         case "bm25search":
             print("Searching for:", args.query)
-            results = bm25search_command(args.query, args.limit)
+            results = bm25search_command(args.query, args.limit, args.filters)
             for i, res in enumerate(results, 1):
                 print(f"{i}. ({res["id"]}) {res["title"]} - Score: {res["score"]:.2f}")
         case _:
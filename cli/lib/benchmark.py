@@ -0,0 +1,446 @@
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+import numpy as np
+
+from .docstore import load_documents
+from .hybrid_search import HybridSearch
+from .keyword_search import InvertedIndex, tokenize_text
+from .llm_cache import llm_cache
+from .llm_client import FakeClient, set_client, set_rate_limit
+from .query_enhancement import enhance_query
+from .reranking import CrossEncoderReranker, llm_rerank_batch
+from .search_utils import (
+    BASELINES_DIR,
+    BENCHMARK_BOOTSTRAP_SAMPLES,
+    BENCHMARK_COMPARE_ROUNDS,
+    BENCHMARK_MIN_DELTA_MB,
+    BENCHMARK_MIN_DELTA_MS,
+    BENCHMARK_REGRESSION_THRESHOLD,
+    BENCHMARK_SIGNIFICANCE,
+    DEFAULT_ALPHA,
+    DEFAULT_BASELINE_NAME,
+    DEFAULT_BENCHMARK_REPEAT,
+    DEFAULT_SEARCH_LIMIT,
+    PROJECT_ROOT,
+    RRF_K,
+    SEARCH_MULTIPLIER,
+    load_golden_dataset,
+)
+from .semantic_search import SemanticSearch
+
+CLI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCHMARKS = (
+    "tokenize",
+    "index_build",
+    "index_load",
+    "bm25_search",
+    "search",
+    "search_chunks",
+    "weighted_search",
+    "rrf_search",
+    "cross_encoder_rerank",
+    "enhance",
+    "batch_rerank",
+)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB everywhere else.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def latency_stats(latencies: list[float]) -> dict:
+    total = sum(latencies)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (0.0, 0.0, 0.0)
+    return {
+        "runs": len(latencies),
+        "mean_ms": total / len(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": float(p50) * 1000,
+        "p95_ms": float(p95) * 1000,
+        "p99_ms": float(p99) * 1000,
+        "qps": len(latencies) / total if total > 0 else 0.0,
+    }
+
+
+@contextmanager
+def offline_llm():
+    """Answer LLM calls from an unthrottled FakeClient with the response cache off, restoring all three afterwards."""
+    previous_client = set_client(FakeClient())
+    previous_rps = set_rate_limit(None)
+    previous_mode = llm_cache.mode
+    llm_cache.mode = "off"
+    try:
+        yield
+    finally:
+        set_client(previous_client)
+        set_rate_limit(previous_rps)
+        llm_cache.mode = previous_mode
+
+
+def time_calls(call: Callable[[str], object], inputs: list[str], repeat: int, warmup: int = 1) -> list[float]:
+    """Latency of `call` on every input, `repeat` times over, after `warmup` untimed passes on the first input."""
+    if not inputs:
+        raise ValueError("no inputs to benchmark; the golden dataset has no queries")
+    for _ in range(warmup):
+        call(inputs[0])
+
+    latencies = []
+    for _ in range(repeat):
+        for value in inputs:
+            start = time.perf_counter()
+            call(value)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def peak_alloc_mb(call: Callable[[str], object], inputs: list[str]) -> float:
+    """Peak memory allocated by one untimed pass of `call` over `inputs`, in MiB.
+
+    tracemalloc only sees allocations made after it starts, so the peak
+    belongs to this operation alone and not to whatever ran before it.
+    """
+    tracemalloc.start()
+    try:
+        for value in inputs:
+            call(value)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def run_benchmarks(
+    names: tuple[str, ...] = BENCHMARKS,
+    repeat: int = DEFAULT_BENCHMARK_REPEAT,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    queries: Optional[list[str]] = None,
+    keep_samples: bool = False,
+) -> dict:
+    """Time each benchmark over the golden-dataset queries.
+
+    LLM stages answer from an in-process FakeClient with the response cache
+    off, so the suite runs offline and measures only the code around the
+    Gemini calls; the previous client and cache mode are restored afterwards.
+    Index build and load run `repeat` times in total, not per query.
+    With `keep_samples` every latency is kept too, as `samples_ms`.
+    Each benchmark's `peak_alloc_mb` comes from a separate untimed pass, since
+    tracing allocations would slow the timed ones down.
+    """
+    if queries is None:
+        queries = [test_case["query"] for test_case in load_golden_dataset()["test_cases"]]
+    documents = load_documents()
+
+    with offline_llm():
+        searcher = HybridSearch(documents)
+        chunked = searcher.semantic_search
+        reranker = CrossEncoderReranker(cache_size=0)
+        semantic = None
+        if "search" in names:
+            semantic = SemanticSearch()
+            semantic.load_or_create_embeddings(documents)
+        candidates = {}
+        if "cross_encoder_rerank" in names or "batch_rerank" in names:
+            candidates = {query: searcher.rrf_search(query, RRF_K, limit * SEARCH_MULTIPLIER) for query in queries}
+
+        def build_index(_: str) -> None:
+            InvertedIndex().build()
+
+        def load_index(_: str) -> None:
+            InvertedIndex().load()
+
+        benchmarks: dict[str, tuple[Callable[[str], object], list[str]]] = {
+            "tokenize": (tokenize_text, queries),
+            "index_build": (build_index, [""]),
+            "index_load": (load_index, [""]),
+            "bm25_search": (lambda q: searcher.idx.bm25_search(q, limit), queries),
+            "search": (lambda q: semantic.search(q, limit), queries),
+            "search_chunks": (lambda q: chunked.search_chunks(q, limit), queries),
+            "weighted_search": (lambda q: searcher.weighted_search(q, DEFAULT_ALPHA, limit), queries),
+            "rrf_search": (lambda q: searcher.rrf_search(q, RRF_K, limit), queries),
+            "cross_encoder_rerank": (lambda q: reranker.rerank(q, candidates[q], limit), queries),
+            "enhance": (lambda q: enhance_query(q, "rewrite", use_cache=False), queries),
+            "batch_rerank": (lambda q: llm_rerank_batch(q, candidates[q], limit), queries),
+        }
+
+        results = {}
+        for name in names:
+            call, inputs = benchmarks[name]
+            latencies = time_calls(call, inputs, repeat)
+            results[name] = {**latency_stats(latencies), "peak_alloc_mb": peak_alloc_mb(call, inputs)}
+            if keep_samples:
+                results[name]["samples_ms"] = [latency * 1000 for latency in latencies]
+
+    return {
+        "queries": len(queries),
+        "repeat": repeat,
+        "limit": limit,
+        "documents": len(documents),
+        "python": sys.version.split()[0],
+        "peak_rss_mb": peak_rss_mb(),
+        "benchmarks": results,
+    }
+
+
+def select_benchmarks(names: Optional[list[str]]) -> tuple[str, ...]:
+    unknown = set(names or []) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+    return tuple(name for name in BENCHMARKS if not names or name in names)
+
+
+def benchmark_command(
+    names: Optional[list[str]] = None,
+    repeat: int = DEFAULT_BENCHMARK_REPEAT,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    keep_samples: bool = False,
+) -> dict:
+    return run_benchmarks(select_benchmarks(names), repeat, limit, keep_samples=keep_samples)
+
+
+def run_benchmarks_isolated(names: tuple[str, ...], repeat: int, limit: int) -> dict:
+    """run_benchmarks with raw latencies, in a fresh interpreter so warm caches from an earlier run cannot carry over."""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        path = f.name
+    argv = [sys.executable, "benchmark_cli.py", "run", "--samples", "--repeat", str(repeat), "--limit", str(limit), "--output", path]
+    for name in names:
+        argv += ["--only", name]
+    try:
+        completed = subprocess.run(argv, cwd=CLI_DIR, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"benchmark run exited with {completed.returncode}: {completed.stderr.strip()}")
+        with open(path) as f:
+            return json.load(f)
+    finally:
+        os.remove(path)
+
+
+def baseline_path(name: str) -> str:
+    return os.path.join(BASELINES_DIR, f"{name}.json")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=PROJECT_ROOT)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def save_baseline_command(
+    name: str = DEFAULT_BASELINE_NAME,
+    names: Optional[list[str]] = None,
+    repeat: int = DEFAULT_BENCHMARK_REPEAT,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    rounds: int = BENCHMARK_COMPARE_ROUNDS,
+) -> dict:
+    """Run the suite in `rounds` fresh processes and store it as benchmarks/<name>.json for `compare` to test against.
+
+    Each benchmark keeps its pooled raw latencies and, under `runs`, the
+    stats of every round, so `compare` can tell how far one run drifts from
+    the next on this host.
+    """
+    if rounds < 1:
+        raise ValueError("rounds must be at least 1")
+    selected = select_benchmarks(names)
+    runs = [run_benchmarks_isolated(selected, repeat, limit) for _ in range(rounds)]
+    result = {key: value for key, value in runs[0].items() if key != "benchmarks"}
+    result["rounds"] = rounds
+    result["peak_rss_mb"] = max(run["peak_rss_mb"] for run in runs)
+    result["benchmarks"] = {}
+    for benchmark in selected:
+        stats = [run["benchmarks"][benchmark] for run in runs]
+        samples = [sample for run_stats in stats for sample in run_stats["samples_ms"]]
+        result["benchmarks"][benchmark] = {
+            **latency_stats([sample / 1000 for sample in samples]),
+            "peak_alloc_mb": max(run_stats["peak_alloc_mb"] for run_stats in stats),
+            "runs": [{key: value for key, value in run_stats.items() if key != "samples_ms"} for run_stats in stats],
+            "samples_ms": samples,
+        }
+    result["commit"] = git_commit()
+    result["created"] = time.time()
+    path = baseline_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+        f.write("\n")
+    return {"name": name, "path": path, **result}
+
+
+def bootstrap_p_value(
+    baseline: np.ndarray,
+    current: np.ndarray,
+    statistic: Callable[[np.ndarray], np.ndarray],
+    samples: int = BENCHMARK_BOOTSTRAP_SAMPLES,
+    seed: int = 0,
+) -> float:
+    """One-sided bootstrap p-value that `statistic` is no larger on `current` than on `baseline`.
+
+    `statistic` maps a (resamples, n) array to one value per row.
+    """
+    rng = np.random.default_rng(seed)
+    baseline_stats = statistic(rng.choice(baseline, size=(samples, len(baseline))))
+    current_stats = statistic(rng.choice(current, size=(samples, len(current))))
+    return float(np.mean(current_stats - baseline_stats <= 0))
+
+
+LATENCY_CHECKS = {
+    "p50_ms": lambda samples: np.percentile(samples, 50, axis=-1),
+    "p99_ms": lambda samples: np.percentile(samples, 99, axis=-1),
+    # Throughput falls exactly when mean latency rises, so it is tested on the mean.
+    "qps": lambda samples: np.mean(samples, axis=-1),
+}
+
+# The latency each check's absolute slowdown is measured on.
+LATENCY_DELTAS = {"p50_ms": "p50_ms", "p99_ms": "p99_ms", "qps": "mean_ms"}
+
+
+def worst_run(baseline: dict, metric: str) -> float:
+    """The baseline's worst `metric` over its rounds, or its single value for baselines saved from one run."""
+    runs = baseline.get("runs") or [baseline]
+    values = [run[metric] for run in runs]
+    return min(values) if metric == "qps" else max(values)
+
+
+def compare_benchmark(
+    baseline: dict,
+    current: dict,
+    threshold: float = BENCHMARK_REGRESSION_THRESHOLD,
+    significance: float = BENCHMARK_SIGNIFICANCE,
+    min_delta_ms: float = BENCHMARK_MIN_DELTA_MS,
+    min_delta_mb: float = BENCHMARK_MIN_DELTA_MB,
+) -> dict:
+    """Compare one benchmark's p50, p99, throughput and peak allocation against its baseline.
+
+    A latency metric regresses when it is more than `threshold` worse, its
+    latency grew by more than `min_delta_ms`, and the bootstrap p-value is
+    below `significance`. Peak allocation is a single reading per run, so it
+    regresses on `threshold` and `min_delta_mb` alone; baselines saved
+    before it was recorded skip that check. Thresholds apply to the
+    baseline's worst round, so its run-to-run drift is not counted.
+    """
+    baseline_samples = np.asarray(baseline.get("samples_ms", []))
+    current_samples = np.asarray(current["samples_ms"])
+    checks = {}
+    for metric, statistic in LATENCY_CHECKS.items():
+        before, after = worst_run(baseline, metric), current[metric]
+        if not before or not after:
+            worse = 0.0
+        else:
+            worse = before / after - 1 if metric == "qps" else after / before - 1
+        delta = current[LATENCY_DELTAS[metric]] - worst_run(baseline, LATENCY_DELTAS[metric])
+        p_value = None
+        if len(baseline_samples) and len(current_samples):
+            p_value = bootstrap_p_value(baseline_samples, current_samples, statistic)
+        checks[metric] = {
+            "baseline": before,
+            "current": after,
+            "change": worse,
+            "delta": delta,
+            "p_value": p_value,
+            "regression": worse > threshold and delta > min_delta_ms and p_value is not None and p_value < significance,
+        }
+    if "peak_alloc_mb" not in baseline:
+        return checks
+    before, after = baseline["peak_alloc_mb"], current["peak_alloc_mb"]
+    worse = after / before - 1 if before else 0.0
+    checks["peak_alloc_mb"] = {
+        "baseline": before,
+        "current": after,
+        "change": worse,
+        "delta": after - before,
+        "p_value": None,
+        "regression": worse > threshold and after - before > min_delta_mb,
+    }
+    return checks
+
+
+def compare_command(
+    name: str = DEFAULT_BASELINE_NAME,
+    names: Optional[list[str]] = None,
+    repeat: int = DEFAULT_BENCHMARK_REPEAT,
+    limit: Optional[int] = None,
+    threshold: float = BENCHMARK_REGRESSION_THRESHOLD,
+    significance: float = BENCHMARK_SIGNIFICANCE,
+    min_delta_ms: float = BENCHMARK_MIN_DELTA_MS,
+    min_delta_mb: float = BENCHMARK_MIN_DELTA_MB,
+    rounds: int = BENCHMARK_COMPARE_ROUNDS,
+) -> dict:
+    """Run the suite and check every benchmark in baseline `name` for regressions.
+
+    `change` is the fraction by which a metric got worse (negative when it
+    improved) and `delta` the absolute amount, in ms or MiB. Each round runs
+    in a fresh process; benchmarks with a flagged metric are run again, and
+    a metric is a regression only if it is flagged in all `rounds` rounds,
+    so drift between one run and the next is not mistaken for a slowdown.
+    `significance` is split evenly over the latency checks (Bonferroni).
+    The reported checks are the first round's. Benchmarks missing from the
+    baseline are reported but not checked.
+    """
+    if rounds < 1:
+        raise ValueError("rounds must be at least 1")
+    path = baseline_path(name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"no benchmark baseline at {path}; save one first")
+    with open(path) as f:
+        baseline = json.load(f)
+
+    selected = select_benchmarks(names)
+    unmatched = [benchmark for benchmark in selected if benchmark not in baseline["benchmarks"]]
+    pending = tuple(benchmark for benchmark in selected if benchmark not in unmatched)
+    corrected = significance / max(len(pending) * len(LATENCY_CHECKS), 1)
+
+    comparisons: dict[str, dict] = {}
+    for round_number in range(1, rounds + 1):
+        if not pending:
+            break
+        current = run_benchmarks_isolated(pending, repeat, limit or baseline["limit"])
+        for benchmark in pending:
+            checks = compare_benchmark(
+                baseline["benchmarks"][benchmark], current["benchmarks"][benchmark],
+                threshold, corrected, min_delta_ms, min_delta_mb,
+            )
+            reported = comparisons.setdefault(benchmark, {metric: {**check, "rounds_flagged": 0} for metric, check in checks.items()})
+            for metric, check in checks.items():
+                reported[metric]["rounds_flagged"] += check["regression"]
+        pending = tuple(
+            benchmark for benchmark in pending
+            if any(check["rounds_flagged"] == round_number for check in comparisons[benchmark].values())
+        )
+
+    for checks in comparisons.values():
+        for check in checks.values():
+            check["regression"] = check["rounds_flagged"] == rounds
+
+    regressions = [
+        f"{benchmark}.{metric}"
+        for benchmark, checks in comparisons.items()
+        for metric, check in checks.items()
+        if check["regression"]
+    ]
+    return {
+        "baseline": name,
+        "path": path,
+        "baseline_commit": baseline.get("commit"),
+        "commit": git_commit(),
+        "threshold": threshold,
+        "significance": significance,
+        "corrected_significance": corrected,
+        "min_delta_ms": min_delta_ms,
+        "min_delta_mb": min_delta_mb,
+        "rounds": rounds,
+        "comparisons": comparisons,
+        "unmatched": unmatched,
+        "regressions": regressions,
+    }
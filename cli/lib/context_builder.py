@@ -0,0 +1,96 @@
+import re
+from typing import Optional
+
+from .docstore import load_documents
+from .search_utils import (
+    CHARS_PER_TOKEN,
+    DEFAULT_CHUNK_OVERLAP,
+    DEFAULT_SEARCH_LIMIT,
+    DEFAULT_SEMANTIC_CHUNK_SIZE,
+)
+from .semantic_search import semantic_chunk
+
+
+def count_tokens(text: str) -> int:
+    """Rough Gemini token estimate, good enough for budgeting prompts."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def split_sentences(text: str) -> list[str]:
+    return [sentence.strip() for sentence in re.split(r"(?<=[.!?])\s+", text.strip()) if sentence.strip()]
+
+
+def normalize_sentence(sentence: str) -> str:
+    return " ".join(sentence.lower().split())
+
+
+def pack_context(
+    search_results: list[dict],
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    token_budget: Optional[int] = None,
+) -> tuple[list[dict], dict]:
+    """Replace each result's document with its best chunks, within `token_budget` tokens overall.
+
+    A budget of None or 0 leaves the documents untouched. Chunks are ranked
+    by the chunk scores the semantic search attached to the result; results
+    only found by BM25 keep their chunks in document order.
+    Sentences are handed out round-robin in result order, best chunk first,
+    so every result gets its most relevant sentence before any result gets
+    a second one. Sentences shared by overlapping chunks, or repeated across
+    results, are only included once.
+    """
+    results = search_results[:limit]
+    documents = load_documents()
+    # Result documents may be previews (semantic hits carry 100 characters), so measure the stored descriptions.
+    full_tokens = sum(count_tokens(documents.get(res["id"])["description"]) for res in results)
+    if not token_budget:
+        context_tokens = sum(count_tokens(res["document"]) for res in results)
+        return results, {
+            "full_tokens": full_tokens,
+            "context_tokens": context_tokens,
+            "tokens_saved": full_tokens - context_tokens,
+        }
+
+    candidates = []
+    for res in results:
+        description = documents.get(res["id"])["description"]
+        chunks = semantic_chunk(description, DEFAULT_SEMANTIC_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP)
+        chunk_scores = {int(i): score for i, score in res.get("metadata", {}).get("chunk_scores", {}).items()}
+        order = sorted(range(len(chunks)), key=lambda i: (-chunk_scores.get(i, float("-inf")), i))
+        candidates.append([sentence for i in order for sentence in split_sentences(chunks[i])])
+
+    # Picked sentences per result, keyed by their normalized text.
+    selected: list[dict[str, str]] = [{} for _ in results]
+    seen: set[str] = set()
+    used = 0
+    rank = 0
+    while used < token_budget and any(rank < len(sentences) for sentences in candidates):
+        for i, sentences in enumerate(candidates):
+            if rank >= len(sentences):
+                continue
+            sentence = sentences[rank]
+            key = normalize_sentence(sentence)
+            cost = count_tokens(sentence) + 1
+            if key in seen or used + cost > token_budget:
+                continue
+            seen.add(key)
+            selected[i][key] = sentence
+            used += cost
+        rank += 1
+
+    # Put the picked sentences back in reading order.
+    packed = []
+    for res, picks in zip(results, selected):
+        description = documents.get(res["id"])["description"]
+        ordered = [
+            sentence for sentence in split_sentences(description)
+            if picks.pop(normalize_sentence(sentence), None) is not None
+        ]
+        packed.append({**res, "document": " ".join(ordered)})
+
+    context_tokens = sum(count_tokens(res["document"]) for res in packed)
+    return packed, {
+        "full_tokens": full_tokens,
+        "context_tokens": context_tokens,
+        "tokens_saved": full_tokens - context_tokens,
+    }
@@ -0,0 +1,156 @@
+import json
+import mmap
+import struct
+from collections.abc import Sequence
+from typing import Optional
+
+import numpy as np
+
+from .search_utils import DOCSTORE_ARTIFACT, load_movies
+from .snapshot import Snapshot, SnapshotBuilder, require_artifact
+from .tracing import span
+
+DOCSTORE_MAGIC = b"RAGDOC01"
+HEADER_FORMAT = "<8sQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+
+class DocStore(Sequence):
+    """Read-only, memory-mapped movie store.
+
+    Layout: header, ids in corpus order, ids sorted with their positions
+    (for id -> position lookups), a boundary table with three segments per
+    document (title, description, remaining fields as JSON) and the
+    UTF-8 data. Records are only decoded when a caller asks for them.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.ids: np.ndarray = np.array([], dtype=np.int64)
+        self._sorted_ids: np.ndarray = np.array([], dtype=np.int64)
+        self._sorted_positions: np.ndarray = np.array([], dtype=np.int64)
+        self._bounds: np.ndarray = np.array([0], dtype=np.uint64)
+        self._data_start = 0
+        self._mmap: Optional[mmap.mmap] = None
+
+    def build(self, documents: list[dict]) -> None:
+        ids = np.array([doc["id"] for doc in documents], dtype="<i8")
+        order = np.argsort(ids, kind="stable")
+
+        segments = []
+        for doc in documents:
+            extra = {key: value for key, value in doc.items() if key not in ("id", "title", "description")}
+            segments.append(doc.get("title", "").encode("utf-8"))
+            segments.append(doc.get("description", "").encode("utf-8"))
+            segments.append(json.dumps(extra).encode("utf-8") if extra else b"")
+
+        bounds = np.zeros(len(segments) + 1, dtype="<u8")
+        bounds[1:] = np.cumsum([len(segment) for segment in segments])
+
+        with open(self.path, "wb") as f:
+            f.write(struct.pack(HEADER_FORMAT, DOCSTORE_MAGIC, len(documents)))
+            f.write(ids.tobytes())
+            f.write(ids[order].tobytes())
+            f.write(order.astype("<i8").tobytes())
+            f.write(bounds.tobytes())
+            for segment in segments:
+                f.write(segment)
+        self.load()
+
+    def load(self) -> None:
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count = struct.unpack_from(HEADER_FORMAT, self._mmap, 0)
+        if magic != DOCSTORE_MAGIC:
+            raise ValueError(f"{self.path} is not a document store")
+
+        offset = HEADER_SIZE
+        self.ids = np.frombuffer(self._mmap, dtype="<i8", count=count, offset=offset)
+        offset += 8 * count
+        self._sorted_ids = np.frombuffer(self._mmap, dtype="<i8", count=count, offset=offset)
+        offset += 8 * count
+        self._sorted_positions = np.frombuffer(self._mmap, dtype="<i8", count=count, offset=offset)
+        offset += 8 * count
+        self._bounds = np.frombuffer(self._mmap, dtype="<u8", count=3 * count + 1, offset=offset)
+        self._data_start = offset + 8 * (3 * count + 1)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def mapped_bytes(self) -> int:
+        """Size of the memory-mapped file; the OS pages it in and out, so it is not heap."""
+        return len(self._mmap) if self._mmap is not None else 0
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("document position out of range")
+
+        extra = self._segment(position, 2)
+        doc = {
+            "id": int(self.ids[position]),
+            "title": self.title(position),
+            "description": self.description(position),
+        }
+        if extra:
+            doc.update(json.loads(extra))
+        return doc
+
+    def title(self, position: int) -> str:
+        return self._segment(position, 0)
+
+    def description(self, position: int) -> str:
+        return self._segment(position, 1)
+
+    def position(self, doc_id: int) -> int:
+        i = int(np.searchsorted(self._sorted_ids, doc_id))
+        if i >= len(self._sorted_ids) or self._sorted_ids[i] != doc_id:
+            raise KeyError(doc_id)
+        return int(self._sorted_positions[i])
+
+    def get(self, doc_id: int) -> dict:
+        return self[self.position(doc_id)]
+
+    def _segment(self, position: int, field: int) -> str:
+        i = 3 * position + field
+        start = self._data_start + int(self._bounds[i])
+        end = self._data_start + int(self._bounds[i + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+
+_docstore: Optional[DocStore] = None
+
+
+def load_documents(snapshot: Optional[Snapshot] = None) -> DocStore:
+    """The docstore of `snapshot` (by default the current one), mapped once per snapshot.
+
+    Raises FileNotFoundError when the snapshot has no usable docstore; it is
+    only ever built by the snapshot build, never at query time.
+    """
+    global _docstore
+    path = require_artifact(DOCSTORE_ARTIFACT, snapshot=snapshot)
+    # The artifact path names the snapshot directory, so a new current snapshot maps its own store.
+    if _docstore is None or _docstore.path != path:
+        with span("corpus load", "io"):
+            store = DocStore(path)
+            store.load()
+        _docstore = store
+    return _docstore
+
+
+def build_documents(movies: Optional[list[dict]] = None, snapshot: Optional[SnapshotBuilder] = None) -> DocStore:
+    global _docstore
+    if snapshot is None:
+        with SnapshotBuilder() as snapshot:
+            return build_documents(movies, snapshot)
+
+    store = DocStore(snapshot.artifact_path(DOCSTORE_ARTIFACT))
+    store.build(movies if movies is not None else load_movies())
+    snapshot.record(DOCSTORE_ARTIFACT)
+    _docstore = store
+    return store
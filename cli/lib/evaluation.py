@@ -1,19 +1,12 @@
-import os
 import json
-from dotenv import load_dotenv
-from google import genai
-
-from .search_utils import (
-    load_golden_dataset,
-    load_movies,
-)
-from .semantic_search import SemanticSearch
+import time
+
+from .benchmark import latency_stats
+from .llm_client import api_key, generate_content
+from .search_utils import RRF_K, load_golden_dataset
+from .docstore import load_documents
 from .hybrid_search import HybridSearch
 
-load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
-model = "gemini-2.0-flash"
 
 def precision_at_k(retrieved_docs: list[str], relevant_docs: set[str], k: int=5) -> float:
     top_k = retrieved_docs[:k]
@@ -40,19 +33,29 @@ def f1_score(precision: float, recall: float) -> float:
     return 2 * (precision * recall) / (precision + recall)
 
 def evaluate_command(limit: int=5) -> dict:
-    movies = load_movies()
+    """Run every golden query through one warm hybrid engine, timing each search.
+
+    The indexes are loaded once and all queries are encoded in one batch
+    before the timed searches start.
+    """
+    start = time.perf_counter()
+    movies = load_documents()
     golden_data = load_golden_dataset()
     test_cases = golden_data["test_cases"]
 
-    semantic_search = SemanticSearch()
-    semantic_search.load_or_create_embeddings(movies)
     hybrid_search = HybridSearch(movies)
+    hybrid_search.semantic_search.encode_queries([test_case["query"] for test_case in test_cases])
+    setup_time = time.perf_counter() - start
 
     results_by_query = {}
+    latencies = []
     for test_case in test_cases:
         query = test_case["query"]
         relevant_docs = set(test_case["relevant_docs"])
-        search_results = hybrid_search.rrf_search(query, k=60, limit=limit)
+        search_start = time.perf_counter()
+        search_results = hybrid_search.rrf_search(query, k=RRF_K, limit=limit)
+        latency = time.perf_counter() - search_start
+        latencies.append(latency)
         retrieved_docs = []
         for result in search_results:
             title = result.get("title", "")
@@ -68,15 +71,24 @@ def evaluate_command(limit: int=5) -> dict:
             "f1score": f1score,
             "retrieved": retrieved_docs[:limit],
             "relevant_docs": list(relevant_docs),
+            "latency": latency,
         }
+
+    count = len(results_by_query)
     return {
         "test_cases_count": len(test_cases),
         "limit": limit,
         "results": results_by_query,
+        "mean_precision": sum(res["precision"] for res in results_by_query.values()) / count if count else 0.0,
+        "mean_recall": sum(res["recall"] for res in results_by_query.values()) / count if count else 0.0,
+        "mean_f1score": sum(res["f1score"] for res in results_by_query.values()) / count if count else 0.0,
+        "latency": latency_stats(latencies),
+        "setup_time": setup_time,
+        "total_time": time.perf_counter() - start,
     }
 
 def llm_judge_results(query: str, results: list[dict]) -> list[dict]:
-    if not api_key:
+    if not api_key():
         print("Warning: GEMINI_API_KEY not found. Skipping LLM evaluation.")
         llm_scores = []
         for i, res in enumerate(results):
@@ -109,7 +121,7 @@ Return ONLY the scores in the same order you were given the documents. Return a
 
 [2, 0, 3, 2, 0, 1]"""
     
-    resp = client.models.generate_content(model=model, contents=prompt)
+    resp = generate_content(prompt, "judge")
     score_text = (resp.text or "").strip()
     scores = json.loads(score_text)
     if len(scores) != len(results):
@@ -1,74 +1,102 @@
-import os
 import logging
+import threading
+import time
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
-from .keyword_search import InvertedIndex
+from .keyword_search import InvertedIndex, build_shard_indexes
 from .semantic_search import ChunkedSemanticSearch
-from .search_utils import load_movies, format_search_result, DEFAULT_ALPHA, DEFAULT_SEARCH_LIMIT, RRF_K, SEARCH_MULTIPLIER
-from .query_enhancement import enhance_query
-from .reranking import rerank
+from .docstore import build_documents, load_documents
+from .snapshot import SnapshotBuilder
+from .search_utils import load_movies, format_search_result, CANDIDATE_MULTIPLIER, DEFAULT_ALPHA, DEFAULT_RERANK_CONCURRENCY, DEFAULT_SEARCH_LIMIT, DEFAULT_SHARD_COUNT, MIN_LLM_STAGE_BUDGET, RRF_K, SEARCH_MULTIPLIER
+from .query_enhancement import ENHANCEMENT_METHODS, enhance_query, enhance_within_deadline
+from .rate_limit import time_left
+from .semantic_cache import enhancement_cache
+from .reranking import cascade_rerank, parse_cascade, rerank_within_deadline
+from .tracing import traced
 
 logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
 logger = logging.getLogger(__name__)
 
 class HybridSearch:
-    def __init__(self, documents):
+    def __init__(self, documents, candidate_multiplier=CANDIDATE_MULTIPLIER):
         self.documents = documents
+        self.candidate_multiplier = candidate_multiplier
         self.semantic_search = ChunkedSemanticSearch()
         self.semantic_search.load_or_create_chunk_embeddings(documents)
 
         self.idx = InvertedIndex()
-        if not os.path.exists(self.idx.index_path):
+        if not self.idx.exists():
             self.idx.build()
             self.idx.save()
-        
-    def _bm25_search(self, query, limit):
         self.idx.load()
-        return self.idx.bm25_search(query, limit)
+        
+    def _bm25_search(self, query, limit, filters: Optional[list[str]] = None):
+        return self.idx.bm25_search(query, limit, filters)
+
+    def ranked_lists(self, query: str, limit: int, filters: Optional[list[str]] = None, deadline: Optional[float] = None) -> dict[str, list[dict]]:
+        """BM25 and semantic results for `query`; the semantic list is left out once `deadline` has passed."""
+        lists = {"bm25": self._bm25_search(query, limit, filters)}
+        if time_left(deadline) != 0:
+            lists["semantic"] = self.semantic_search.search_chunks(query, limit, filters)
+        return lists
     
-    def weighted_search(self, query: str, alpha: float, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
-        bm25_results = self._bm25_search(query, limit * 500)
-        semantic_results = self.semantic_search.search_chunks(query, limit * 500)
+    @traced("weighted search")
+    def weighted_search(self, query: str, alpha: float, limit: int = DEFAULT_SEARCH_LIMIT, filters: Optional[list[str]] = None) -> list[dict]:
+        bm25_results = self._bm25_search(query, limit * self.candidate_multiplier, filters)
+        semantic_results = self.semantic_search.search_chunks(query, limit * self.candidate_multiplier, filters)
         combined = combine_search_results(bm25_results, semantic_results, alpha)
         return combined[:limit]
     
-    def rrf_search(self, query, k, limit=10) -> list[dict]:
-        bm25_results = self._bm25_search(query, limit * 500)
-        semantic_results = self.semantic_search.search_chunks(query, limit * 500)
-        fused = reciprocal_rank_fusion(bm25_results, semantic_results, k)
-        return fused[:limit]
+    def rrf_search(self, query, k, limit=10, filters: Optional[list[str]] = None, deadline: Optional[float] = None) -> list[dict]:
+        return self.rrf_search_within_deadline(query, k, limit, filters, deadline)[0]
+
+    @traced("rrf search")
+    def rrf_search_within_deadline(self, query, k, limit=10, filters: Optional[list[str]] = None, deadline: Optional[float] = None) -> tuple[list[dict], Optional[dict]]:
+        """RRF search that falls back to BM25 alone when `deadline` passes before the semantic search."""
+        lists = self.ranked_lists(query, limit * self.candidate_multiplier, filters, deadline)
+        fused = fuse_ranked_lists(lists, k)
+        degraded = None
+        if "semantic" not in lists:
+            degraded = {"stage": "retrieval:semantic", "reason": "deadline exceeded", "fallback": "bm25 only"}
+        return fused[:limit], degraded
 
 
 def reciprocal_rank_fusion(bm25_results: list[dict], semantic_results: list[dict], k: int = RRF_K) -> list[dict]:
+    return fuse_ranked_lists({"bm25": bm25_results, "semantic": semantic_results}, k)
+
+@traced("fusion")
+def fuse_ranked_lists(ranked_lists: dict[str, list[dict]], k: int = RRF_K) -> list[dict]:
+    """RRF over any number of ranked lists.
+
+    Lists are labelled "bm25", "semantic" or "<variant>:bm25" / "<variant>:semantic";
+    a result's bm25_rank and semantic_rank are its best rank over lists of that kind.
+    """
     rrf_scores = {}
 
-    for rank, res in enumerate(bm25_results, 1):
-        doc_id = res["id"]
-        if doc_id not in rrf_scores:
-            rrf_scores[doc_id] = {
-                "title": res["title"],
-                "document": res["document"],
-                "rrf_score": 0.0,
-                "bm25_rank": None,
-                "semantic_rank": None,
-            }
-        if rrf_scores[doc_id]["bm25_rank"] is None:
-            rrf_scores[doc_id]["bm25_rank"] = rank
-            rrf_scores[doc_id]["rrf_score"] += rrf_score(rank, k)
-
-    for rank, res in enumerate(semantic_results, 1):
-        doc_id = res["id"]
-        if doc_id not in rrf_scores:
-            rrf_scores[doc_id] = {
-                "title": res["title"],
-                "document": res["document"],
-                "rrf_score": 0.0,
-                "bm25_rank": None,
-                "semantic_rank": None,
-            }
-        if rrf_scores[doc_id]["semantic_rank"] is None:
-            rrf_scores[doc_id]["semantic_rank"] = rank
-            rrf_scores[doc_id]["rrf_score"] += rrf_score(rank, k)
+    for label, results in ranked_lists.items():
+        kind = label.rsplit(":", 1)[-1]
+        seen = set()
+        for rank, res in enumerate(results, 1):
+            doc_id = res["id"]
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            if doc_id not in rrf_scores:
+                rrf_scores[doc_id] = {
+                    "title": res["title"],
+                    "document": res["document"],
+                    "rrf_score": 0.0,
+                    "bm25_rank": None,
+                    "semantic_rank": None,
+                }
+            data = rrf_scores[doc_id]
+            data["rrf_score"] += rrf_score(rank, k)
+            rank_key = f"{kind}_rank"
+            if data[rank_key] is None or rank < data[rank_key]:
+                data[rank_key] = rank
+            if "chunk_scores" in res["metadata"] and "chunk_scores" not in data:
+                data["chunk_scores"] = res["metadata"]["chunk_scores"]
 
     rrf_results = []
     for doc_id, data in rrf_scores.items():
@@ -78,7 +106,8 @@ def reciprocal_rank_fusion(bm25_results: list[dict], semantic_results: list[dict
             document= data["document"],
             score=data["rrf_score"],
             bm25_rank=data["bm25_rank"],
-            semantic_rank=data["semantic_rank"]
+            semantic_rank=data["semantic_rank"],
+            chunk_scores=data.get("chunk_scores", {}),
         )
         rrf_results.append(result)
     
@@ -117,6 +146,7 @@ def normalize_search_results(results: list[dict]) -> list[dict]:
 def hybrid_score(bm25_score, semantic_score, alpha=0.5):
     return alpha * bm25_score + (1 - alpha) * semantic_score
 
+@traced("fusion")
 def combine_search_results(bm25_results: list[dict], semantic_results: list[dict], alpha: float=DEFAULT_ALPHA) -> list[dict]:
     bm25_normalized = normalize_search_results(bm25_results)
     semantic_normalized = normalize_search_results(semantic_results)
@@ -161,52 +191,184 @@ def combine_search_results(bm25_results: list[dict], semantic_results: list[dict
     
     return sorted(hybrid_results, key=lambda item:item["score"], reverse=True)
 
-def weighted_search_command(query: str, alpha: float=DEFAULT_ALPHA, limit: int=DEFAULT_SEARCH_LIMIT) -> dict:
+def build_snapshot_command(shard_counts: tuple[int, ...] = (DEFAULT_SHARD_COUNT,)) -> dict:
     movies = load_movies()
+    with SnapshotBuilder() as snapshot:
+        documents = build_documents(movies, snapshot)
+
+        idx = InvertedIndex()
+        idx.build(movies)
+        idx.save(snapshot)
+        for n_shards in shard_counts:
+            build_shard_indexes(movies, n_shards, snapshot)
+
+        semantic_search = ChunkedSemanticSearch()
+        semantic_search.build_embeddings(documents, snapshot)
+        semantic_search.build_chunk_embeddings(documents, snapshot)
+
+    return {
+        "snapshot": snapshot.path,
+        "artifacts": sorted(snapshot.artifacts),
+    }
+
+def weighted_search_command(query: str, alpha: float=DEFAULT_ALPHA, limit: int=DEFAULT_SEARCH_LIMIT, filters: Optional[list[str]]=None) -> dict:
+    movies = load_documents()
     searcher = HybridSearch(movies)
     
-    results = searcher.weighted_search(query, alpha, limit)
+    results = searcher.weighted_search(query, alpha, limit, filters)
 
     return {
         "query": query,
         "alpha": alpha,
+        "filters": filters or [],
         "results": results,
     }
 
-def rrf_search_command(query: str, k: int = RRF_K, enhance: Optional[str]=None, rerank_method: Optional[str]=None, limit: int=DEFAULT_SEARCH_LIMIT, evaluate: bool=False) -> dict:
-    movies = load_movies()
-    searcher = HybridSearch(movies)
+def fanout_rrf_search(
+    searcher: HybridSearch,
+    query: str,
+    k: int = RRF_K,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    filters: Optional[list[str]] = None,
+    methods: tuple[str, ...] = ENHANCEMENT_METHODS,
+    deadline: Optional[float] = None,
+) -> dict:
+    """Enhance `query` with every method at once and RRF-fuse the retrievals of all variants.
+
+    Each variant is enhanced and retrieved on its own thread, so the total
+    latency tracks the slowest variant. The original query is retrieved
+    while the enhancements are in flight. Each distinct variant text (ignoring
+    case and whitespace) is retrieved and fused once, whichever methods
+    produced it, so no query counts twice in the fusion. A failed enhancement
+    only drops its variant, so enhancements still running at `deadline` time
+    out without failing the search.
+    """
+    start = time.perf_counter()
+    # The original always retrieves its own text; each enhancement claims its text or skips it.
+    retrieved = {" ".join(query.lower().split())}
+    retrieved_lock = threading.Lock()
+
+    def run_variant(method: Optional[str]) -> tuple[Optional[str], dict[str, list[dict]], float]:
+        variant_start = time.perf_counter()
+        variant = query if method is None else enhance_query(query, method, timeout=time_left(deadline))
+        if method is not None:
+            key = " ".join(variant.lower().split())
+            with retrieved_lock:
+                duplicate = key in retrieved
+                retrieved.add(key)
+            if duplicate:
+                return variant, {}, time.perf_counter() - variant_start
+        return variant, searcher.ranked_lists(variant, limit * searcher.candidate_multiplier, filters, deadline), time.perf_counter() - variant_start
+
+    variants = {}
+    latencies = {}
+    errors = {}
+    ranked_lists = {}
+    with ThreadPoolExecutor(max_workers=len(methods) + 1) as executor:
+        futures = {label: executor.submit(run_variant, method) for label, method in [("original", None), *((m, m) for m in methods)]}
+        for label, future in futures.items():
+            try:
+                variant, lists, latency = future.result()
+            except Exception as e:
+                if label == "original":
+                    raise
+                errors[label] = str(e)
+                logger.warning(f"Enhancement '{label}' failed: {e}")
+                continue
+            variants[label] = variant
+            latencies[label] = latency
+            for kind, results in lists.items():
+                ranked_lists[f"{label}:{kind}"] = results
+
+    fused = fuse_ranked_lists(ranked_lists, k)
+    return {
+        "results": fused[:limit],
+        "variants": variants,
+        "latencies": latencies,
+        "errors": errors,
+        "total_time": time.perf_counter() - start,
+    }
+
+def rrf_search_command(query: str, k: int = RRF_K, enhance: Optional[str]=None, rerank_method: Optional[str]=None, limit: int=DEFAULT_SEARCH_LIMIT, evaluate: bool=False, filters: Optional[list[str]]=None, cascade: Optional[str]=None, timeout: Optional[float]=None, searcher: Optional[HybridSearch]=None, concurrency: int=DEFAULT_RERANK_CONCURRENCY) -> dict:
+    """Enhance, retrieve and rerank `query`, degrading optional stages to finish within `timeout` seconds.
+
+    Pass a warm `searcher` to skip loading the indexes on every call.
+    `concurrency` caps the individual LLM rerank calls in flight.
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    stages = parse_cascade(cascade) if cascade else []
+    if searcher is None:
+        searcher = HybridSearch(load_documents())
     
     original_query = query
     logger.info(f"Original Query: {original_query}")
 
     enhanced_query = None
-    if enhance:
-        enhanced_query = enhance_query(query, method=enhance)
-        query = enhanced_query
-        logger.info(f"Enhanced Query: {enhanced_query}")
+    fanout = None
+    degraded = []
+    if enhance == "fanout" and deadline is not None and time_left(deadline) < MIN_LLM_STAGE_BUDGET:
+        degraded.append({"stage": "enhance:fanout", "reason": f"{time_left(deadline):.2f}s left", "fallback": "original query"})
+        enhance = None
+    if enhance and enhance != "fanout":
+        query, skipped = enhance_within_deadline(query, enhance, deadline)
+        if skipped:
+            degraded.append(skipped)
+        else:
+            enhanced_query = query
+            logger.info(f"Enhanced Query: {enhanced_query}")
 
-    search_limit = limit * SEARCH_MULTIPLIER if rerank_method else limit
+    search_limit = limit * SEARCH_MULTIPLIER if rerank_method or stages else limit
+    if stages and stages[0][0] == "rrf":
+        search_limit = stages.pop(0)[1]
 
-    results = searcher.rrf_search(query, k, search_limit)
+    search_start = time.perf_counter()
+    if enhance == "fanout":
+        fanout = fanout_rrf_search(searcher, query, k, search_limit, filters, deadline=deadline)
+        results = fanout.pop("results")
+        logger.info(f"Query variants: {fanout["variants"]}")
+        for label, error in fanout["errors"].items():
+            degraded.append({"stage": f"enhance:{label}", "reason": error, "fallback": "variant dropped"})
+    else:
+        results, skipped = searcher.rrf_search_within_deadline(query, k, search_limit, filters, deadline)
+        if skipped:
+            degraded.append(skipped)
+    search_time = time.perf_counter() - search_start
     for i, doc in enumerate(results, 1):
         logger.info(f"rrf_search results: {i}. {doc["title"]}")
 
     reranked = False
     if rerank_method:
-        results = rerank(query, results, method=rerank_method, limit=limit)
+        results, skipped = rerank_within_deadline(query, results, rerank_method, limit, deadline, concurrency)
+        if skipped:
+            degraded.append(skipped)
         reranked = True
         for i, doc in enumerate(results, 1):
             logger.info(f"rrf_results reranked: {i}. {doc["title"]}")
 
+    cascade_report = None
+    if stages:
+        rrf_stage = {"method": "rrf", "width": search_limit, "candidates": None, "survivors": len(results), "latency": search_time}
+        results, stage_report = cascade_rerank(query, results, stages, deadline, concurrency)
+        results = results[:limit]
+        degraded.extend(stage["degraded"] for stage in stage_report if stage["degraded"])
+        cascade_report = [rrf_stage, *stage_report]
+        for stage in cascade_report:
+            logger.info(f"cascade {stage["method"]}: {stage["survivors"]} survivors in {stage["latency"]:.3f}s")
+
     return {
         "original_query": original_query,
         "enhanced_query": enhanced_query,
         "enhance_method": enhance,
+        "fanout": fanout,
+        "enhancement_cache": enhancement_cache.stats() if enhance else None,
         "rerank_method": rerank_method,
         "reranked": reranked,
+        "cascade": cascade_report,
+        "timeout": timeout,
+        "degraded": degraded,
         "query": query,
         "k": k,
+        "filters": filters or [],
         "results": results,
     }
 
@@ -3,57 +3,95 @@ import os
 import pickle
 import math
 from collections  import defaultdict, Counter
+from typing import Optional
 
-from nltk.stem import PorterStemmer
 
-from .search_utils import DEFAULT_SEARCH_LIMIT, CACHE_DIR, BM25_K1, BM25_B, load_movies, load_stopwords, format_search_result
+from .search_utils import (
+    DEFAULT_SEARCH_LIMIT,
+    BM25_K1,
+    BM25_B,
+    STOPWORDS_PATH,
+    INDEX_ARTIFACT,
+    TERM_FREQUENCIES_ARTIFACT,
+    DOC_LENGTHS_ARTIFACT,
+    load_movies,
+    load_stopwords,
+    format_search_result,
+)
+from .metadata_filter import BitmapIndex
+from .docstore import DocStore, build_documents, load_documents
+from .snapshot import Snapshot, SnapshotBuilder, current_snapshot, file_sha256, require_artifact, resolve_artifact
+from .tracing import span, traced
+
+INDEX_ARTIFACTS = (INDEX_ARTIFACT, TERM_FREQUENCIES_ARTIFACT, DOC_LENGTHS_ARTIFACT)
 
 class InvertedIndex:
-    def __init__(self) -> None:
+    def __init__(self, artifact_prefix: str = "") -> None:
         self.index = defaultdict(set)
-        self.docmap: dict[int, dict] = {}
         self.term_frequencies = defaultdict(Counter)
-        self.index_path = os.path.join(CACHE_DIR, "index.pkl")
-        self.docmap_path = os.path.join(CACHE_DIR, "docmap.pkl")
-        self.tf_path = os.path.join(CACHE_DIR, "term_frequencies.pkl")
-        self.doc_lengths_path = os.path.join(CACHE_DIR, "doc_lengths.pkl")
         self.doc_lengths = {}
+        self.artifact_prefix = artifact_prefix
+        self.filters = BitmapIndex(artifact_prefix)
         
+    @staticmethod
+    def snapshot_params() -> dict:
+        return {"stemmer": "porter", "stopwords_sha256": file_sha256(STOPWORDS_PATH)}
 
-    def load(self) -> None:
-        with open(self.index_path, "rb") as f:
-            self.index = pickle.load(f)
+    def artifact(self, name: str) -> str:
+        return f"{self.artifact_prefix}{name}"
 
-        with open(self.docmap_path, "rb") as f:
-            self.docmap = pickle.load(f)
+    def exists(self, snapshot: Optional[Snapshot] = None) -> bool:
+        params = self.snapshot_params()
+        for artifact in INDEX_ARTIFACTS:
+            if resolve_artifact(self.artifact(artifact), params, snapshot) is None:
+                return False
+        return self.filters.exists(snapshot)
+
+    @traced("index load", "io")
+    def load(self, snapshot: Optional[Snapshot] = None) -> None:
+        params = self.snapshot_params()
+        if snapshot is None:
+            snapshot = current_snapshot()
+        with open(require_artifact(self.artifact(INDEX_ARTIFACT), params, snapshot), "rb") as f:
+            self.index = pickle.load(f)
 
-        with open(self.tf_path, "rb") as f:
+        with open(require_artifact(self.artifact(TERM_FREQUENCIES_ARTIFACT), params, snapshot), "rb") as f:
             self.term_frequencies = pickle.load(f)
 
-        with open(self.doc_lengths_path, "rb") as f:
+        with open(require_artifact(self.artifact(DOC_LENGTHS_ARTIFACT), params, snapshot), "rb") as f:
             self.doc_lengths = pickle.load(f)
+
+        self.filters.defer_load(snapshot)
     
-    def build(self) -> None:
-        movies = load_movies()
+    def build(self, movies: Optional[list[dict]] = None) -> None:
+        if movies is None:
+            movies = load_movies()
         for movie in movies:
             doc_id = movie["id"]
             doc_description = f"{movie["title"]} {movie["description"]}"
-            self.docmap[doc_id] = movie
             self.__add_document(doc_id, doc_description)
+        self.filters.build(movies)
             
-    def save(self):
-        os.makedirs(CACHE_DIR, exist_ok=True)
-        with open(self.index_path, "wb") as f:   
+    def save(self, snapshot: Optional[SnapshotBuilder] = None):
+        if snapshot is None:
+            with SnapshotBuilder() as snapshot:
+                self.save(snapshot)
+            return
+
+        params = self.snapshot_params()
+        with open(snapshot.artifact_path(self.artifact(INDEX_ARTIFACT)), "wb") as f:   
             pickle.dump(self.index, f)
+        snapshot.record(self.artifact(INDEX_ARTIFACT), params)
         
-        with open(self.docmap_path, "wb") as f:
-            pickle.dump(self.docmap, f)
-
-        with open(self.tf_path, "wb") as f:
+        with open(snapshot.artifact_path(self.artifact(TERM_FREQUENCIES_ARTIFACT)), "wb") as f:
             pickle.dump(self.term_frequencies, f)
+        snapshot.record(self.artifact(TERM_FREQUENCIES_ARTIFACT), params)
 
-        with open(self.doc_lengths_path, "wb") as f:
+        with open(snapshot.artifact_path(self.artifact(DOC_LENGTHS_ARTIFACT)), "wb") as f:
             pickle.dump(self.doc_lengths, f)
+        snapshot.record(self.artifact(DOC_LENGTHS_ARTIFACT), params)
+
+        self.filters.save(snapshot)
 
     def get_documents(self, term: str) -> list[int]:
         term = term.lower()
@@ -61,19 +99,13 @@ class InvertedIndex:
         return sorted(list(doc_ids))
     
     def get_tf(self, doc_id: int, term: str) -> int:        
-        tokens = tokenize_text(term)
-        if len(tokens) != 1:
-            raise ValueError("term must be a single token")
-        token = tokens[0]
+        token = single_token(term)
         return self.term_frequencies[doc_id][token]
 
     def get_idf(self, term: str) -> float:
-        tokens = tokenize_text(term)
-        if len(tokens) != 1:
-            raise ValueError("term must be a single token")
-        token = tokens[0]
-        term_doc_count = len(self.index[token])
-        doc_count = len(self.docmap)
+        token = single_token(term)
+        term_doc_count = self.get_doc_freq(token)
+        doc_count = self.get_doc_count()
         return math.log((doc_count + 1)  / (term_doc_count + 1))
 
     def get_tf_idf(self, doc_id: int, term: str) -> float:
@@ -82,47 +114,55 @@ class InvertedIndex:
         return tf * idf
 
     def get_bm25_idf(self, term: str) -> float:
-        tokens = tokenize_text(term)
-        if len(tokens) != 1:
-            raise ValueError("term must be a single token")
-        token = tokens[0]
-        doc_count = len(self.docmap)
-        term_doc_count = len(self.index[token])
+        token = single_token(term)
+        doc_count = self.get_doc_count()
+        term_doc_count = self.get_doc_freq(token)
         return math.log((doc_count - term_doc_count + 0.5) / (term_doc_count + 0.5) + 1)
     
     def get_bm25_tf(self, doc_id, term, k1 = BM25_K1, b=BM25_B) -> float:
         tf = self.get_tf(doc_id, term)
         doc_length = self.doc_lengths.get(doc_id, 0)
-        avg_doc_length = self.__get_avg_doc_length()
-        if avg_doc_length > 0:
-            length_norm = 1 - b + b * (doc_length / avg_doc_length)
-        else:
-            length_norm = 1
-        return (tf * (k1 + 1)) / (tf + k1 * length_norm)
+        return bm25_tf_score(tf, doc_length, self.get_avg_doc_length(), k1, b)
 
     def bm25(self, doc_id: int, term: str) -> float:
         bm25_tf = self.get_bm25_tf(doc_id, term) #term frequency in each doc
         bm25_idf = self.get_bm25_idf(term) #num of docs the token is in
         return bm25_tf * bm25_idf
     
-    def bm25_search(self, query, limit: int = DEFAULT_SEARCH_LIMIT) -> dict:
-        query_tokens = tokenize_text(query)
+    @traced("bm25 scoring")
+    def bm25_scores(self, query, limit: int = DEFAULT_SEARCH_LIMIT, filters: Optional[list[str]] = None) -> list[tuple[int, float]]:
+        with span("tokenize"):
+            query_tokens = tokenize_text(query)
+        allowed_doc_ids = self.filters.allowed_doc_ids(filters)
+        candidate_doc_ids = self.doc_lengths.keys()
+        if allowed_doc_ids is not None:
+            candidate_doc_ids = [doc_id for doc_id in self.doc_lengths.keys() if doc_id in allowed_doc_ids]
+
+        # The idf and average document length are the same for every
+        # document, so work them out once per query rather than per document.
+        avg_doc_length = self.get_avg_doc_length()
+        terms = [(single_token(token), self.get_bm25_idf(token)) for token in query_tokens]
+
         scores = {}
-        for doc_id in self.docmap.keys():
+        for doc_id in candidate_doc_ids:
             score = 0.0
-            for token in query_tokens:
-                score += self.bm25(doc_id, token)
+            doc_length = self.doc_lengths.get(doc_id, 0)
+            term_frequencies = self.term_frequencies[doc_id]
+            for term, idf in terms:
+                score += bm25_tf_score(term_frequencies[term], doc_length, avg_doc_length) * idf
             scores[doc_id] = score
 
         sorted_scores = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return sorted_scores[:limit]
 
+    def bm25_search(self, query, limit: int = DEFAULT_SEARCH_LIMIT, filters: Optional[list[str]] = None) -> dict:
         results = []
-        for doc_id, score in sorted_scores[:limit]:
-            doc = self.docmap[doc_id]
+        for doc_id, score in self.bm25_scores(query, limit, filters):
+            position = self.docstore.position(doc_id)
             formatted_result = format_search_result(
                 doc_id = doc_id, 
-                title = doc["title"], 
-                document = doc["description"], 
+                title = self.docstore.title(position), 
+                document = self.docstore.description(position), 
                 score = score,
             )
             results.append(formatted_result)
@@ -135,8 +175,18 @@ class InvertedIndex:
         self.term_frequencies[doc_id].update(tokens)
         self.doc_lengths[doc_id] = len(tokens)
 
-    def __get_avg_doc_length(self) -> float:
-        if not self.doc_lengths or len(self.docmap) == 0:
+    @property
+    def docstore(self) -> DocStore:
+        return load_documents()
+
+    def get_doc_count(self) -> int:
+        return len(self.doc_lengths)
+
+    def get_doc_freq(self, token: str) -> int:
+        return len(self.index.get(token, ()))
+
+    def get_avg_doc_length(self) -> float:
+        if not self.doc_lengths:
             return 0.0
         total_length = 0.0
         for length in self.doc_lengths.values():
@@ -144,13 +194,36 @@ class InvertedIndex:
         return total_length / len(self.doc_lengths)
 
 def build_command() -> None:
-    idx = InvertedIndex()
-    idx.build()
-    idx.save()
+    movies = load_movies()
+    with SnapshotBuilder() as snapshot:
+        build_documents(movies, snapshot)
+        idx = InvertedIndex()
+        idx.build(movies)
+        idx.save(snapshot)
 
-def search_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
+def shard_bounds(n_docs: int, n_shards: int) -> list[tuple[int, int]]:
+    """Contiguous [start, end) document positions of each shard, with never more shards than documents."""
+    n_shards = min(n_shards, max(n_docs, 1))
+    edges = [n_docs * i // n_shards for i in range(n_shards + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+def shard_artifact_prefix(shard: int, n_shards: int) -> str:
+    return f"shard{shard}of{n_shards}-"
+
+def build_shard_indexes(movies: list[dict], n_shards: int, snapshot: SnapshotBuilder) -> None:
+    """Save an inverted index and filter index for each of `n_shards` shards, for the sharded search workers to load."""
+    if n_shards < 1:
+        raise ValueError("n_shards must be at least 1")
+    bounds = shard_bounds(len(movies), n_shards)
+    for shard, (start, end) in enumerate(bounds):
+        idx = InvertedIndex(shard_artifact_prefix(shard, len(bounds)))
+        idx.build(movies[start:end])
+        idx.save(snapshot)
+
+def search_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT, filters: Optional[list[str]] = None) -> list[dict]:
     idx = InvertedIndex()
     idx.load()
+    allowed_doc_ids = idx.filters.allowed_doc_ids(filters)
     query_tokens = tokenize_text(query)
     seen, results = set(), []
     for query_token in query_tokens:
@@ -158,8 +231,10 @@ def search_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
         for doc_id in matching_doc_ids:
             if doc_id in seen:
                 continue
+            if allowed_doc_ids is not None and doc_id not in allowed_doc_ids:
+                continue
             seen.add(doc_id)
-            doc = idx.docmap[doc_id]
+            doc = idx.docstore.get(doc_id)
             results.append(doc)
             if len(results) >= limit:
                 return results
@@ -190,10 +265,25 @@ def bm25_tf_command(doc_id: int, term: str, k1=BM25_K1) -> float:
     idx.load()
     return idx.get_bm25_tf(doc_id, term, k1)
 
-def bm25search_command(query: str, limit=DEFAULT_SEARCH_LIMIT) -> list:
+def bm25search_command(query: str, limit=DEFAULT_SEARCH_LIMIT, filters: Optional[list[str]] = None) -> list:
     idx = InvertedIndex()
     idx.load()
-    return idx.bm25_search(query, limit)
+    return idx.bm25_search(query, limit, filters)
+
+
+def single_token(term: str) -> str:
+    tokens = tokenize_text(term)
+    if len(tokens) != 1:
+        raise ValueError("term must be a single token")
+    return tokens[0]
+
+
+def bm25_tf_score(tf: int, doc_length: int, avg_doc_length: float, k1: float = BM25_K1, b: float = BM25_B) -> float:
+    if avg_doc_length > 0:
+        length_norm = 1 - b + b * (doc_length / avg_doc_length)
+    else:
+        length_norm = 1
+    return (tf * (k1 + 1)) / (tf + k1 * length_norm)
 
 
 def has_matching_token(query_tokens: list[str], title_tokens: list[str]) -> bool:
@@ -208,6 +298,19 @@ def preprocess_text(text: str) -> str:
     text = text.translate(str.maketrans("", "", string.punctuation))
     return text
 
+_stemmer = None
+
+
+def get_stemmer():
+    """The Porter stemmer, built once; nltk is imported on first use so commands that never tokenize skip it."""
+    global _stemmer
+    if _stemmer is None:
+        from nltk.stem import PorterStemmer
+
+        _stemmer = PorterStemmer()
+    return _stemmer
+
+
 def tokenize_text(text: str) -> list[str]:
     text = preprocess_text(text)
     tokens = text.split(" ")
@@ -222,7 +325,7 @@ def tokenize_text(text: str) -> list[str]:
         if word not in stop_words:
             filtered_words.append(word)
     
-    stemmer = PorterStemmer()
+    stemmer = get_stemmer()
     stemmed_words = []
     for word in filtered_words:
         stemmed_words.append(stemmer.stem(word))
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Optional
+
+from .search_utils import LLM_CACHE_MAX_BYTES, LLM_CACHE_MODE, LLM_CACHE_PATH, LLM_CACHE_TTL
+
+if TYPE_CHECKING:
+    from google.genai import types
+
+CACHE_MODES = ("readwrite", "replay", "off")
+
+
+class CacheMissError(Exception):
+    pass
+
+
+def serialize_contents(contents: Any) -> Any:
+    if isinstance(contents, (str, int, float, bool)) or contents is None:
+        return contents
+    if isinstance(contents, (list, tuple)):
+        return [serialize_contents(item) for item in contents]
+    if isinstance(contents, dict):
+        return {key: serialize_contents(value) for key, value in contents.items()}
+    if hasattr(contents, "model_dump"):
+        return contents.model_dump(mode="json", exclude_none=True)
+    raise TypeError(f"cannot build a cache key for {type(contents).__name__}")
+
+
+def cache_key(model: str, contents: Any, config: Any = None) -> str:
+    payload = json.dumps(
+        {
+            "model": model,
+            "contents": serialize_contents(contents),
+            "config": serialize_contents(config),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Content-addressed SQLite store of Gemini responses.
+
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted once the stored responses exceed `max_bytes`. In "replay" mode a
+    miss raises CacheMissError instead of calling the API; "off" bypasses
+    the cache entirely.
+    """
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        ttl: float = LLM_CACHE_TTL,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+        mode: str = LLM_CACHE_MODE,
+    ) -> None:
+        if mode not in CACHE_MODES:
+            raise ValueError(f"unknown LLM cache mode '{mode}', expected one of {', '.join(CACHE_MODES)}")
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[types.GenerateContentResponse]:
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+        from google.genai import types
+
+        return types.GenerateContentResponse.model_validate(json.loads(row[0]))
+
+    def put(self, key: str, model: str, response: types.GenerateContentResponse) -> None:
+        data = json.dumps(response.model_dump(mode="json", exclude_none=True))
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, data, len(data), now, now),
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self) -> int:
+        removed = self.conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)).rowcount
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return removed
+
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            removed += 1
+        return removed
+
+    def evict(self) -> int:
+        with self._lock:
+            removed = self._evict()
+            self.conn.commit()
+        return removed
+
+    def clear(self) -> int:
+        with self._lock:
+            removed = self.conn.execute("DELETE FROM responses").rowcount
+            self.conn.commit()
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            "path": self.path,
+            "mode": self.mode,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+llm_cache = LLMCache()
+
+
+def cached_response(
+    model: str,
+    contents: Any,
+    fetch: Callable[[], types.GenerateContentResponse],
+    config: Any = None,
+    cache: Optional[LLMCache] = None,
+) -> types.GenerateContentResponse:
+    cache = cache or llm_cache
+    if cache.mode == "off":
+        return fetch()
+
+    key = cache_key(model, contents, config)
+    resp = cache.get(key)
+    if resp is not None:
+        return resp
+    if cache.mode == "replay":
+        raise CacheMissError(f"no cached response for key {key[:12]} in replay mode")
+
+    resp = fetch()
+    cache.put(key, model, resp)
+    return resp
+
+
+async def cached_response_async(
+    model: str,
+    contents: Any,
+    fetch: Callable[[], Awaitable[types.GenerateContentResponse]],
+    config: Any = None,
+    cache: Optional[LLMCache] = None,
+) -> types.GenerateContentResponse:
+    cache = cache or llm_cache
+    if cache.mode == "off":
+        return await fetch()
+
+    key = cache_key(model, contents, config)
+    resp = cache.get(key)
+    if resp is not None:
+        return resp
+    if cache.mode == "replay":
+        raise CacheMissError(f"no cached response for key {key[:12]} in replay mode")
+
+    resp = await fetch()
+    cache.put(key, model, resp)
+    return resp
+
+
+def cache_stats_command() -> dict:
+    return llm_cache.stats()
+
+
+def cache_evict_command() -> dict:
+    return {"removed": llm_cache.evict(), **llm_cache.stats()}
+
+
+def cache_clear_command() -> dict:
+    return {"removed": llm_cache.clear(), **llm_cache.stats()}
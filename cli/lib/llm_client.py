@@ -0,0 +1,337 @@
+from __future__ import annotations
+
+import itertools
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Optional
+
+from dotenv import load_dotenv
+
+from .llm_cache import cached_response, cached_response_async
+from .llm_stub import build_response, build_stream, default_responder, extract_prompt
+from .rate_limit import TokenBucket, retry, retry_async
+from .search_utils import LLM_MAX_CONNECTIONS, LLM_MODEL, LLM_RPS, LLM_TIMEOUT
+from .tracing import span
+
+if TYPE_CHECKING:
+    from google import genai
+    from google.genai import types
+
+_client = None
+_client_lock = threading.Lock()
+# Every request made through the shared client, from any stage, thread or event loop, takes a token here.
+rate_limiter = TokenBucket(LLM_RPS)
+
+
+def api_key() -> Optional[str]:
+    load_dotenv()
+    return os.environ.get("GEMINI_API_KEY") or os.environ.get("gemini_api_key")
+
+
+def create_client() -> genai.Client:
+    import httpx
+    from google import genai
+    from google.genai import types
+
+    key = api_key()
+    if not key:
+        raise RuntimeError("GEMINI_API_KEY not set")
+
+    limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+    return genai.Client(
+        api_key=key,
+        http_options=types.HttpOptions(
+            base_url=os.environ.get("GEMINI_BASE_URL"),
+            timeout=int(LLM_TIMEOUT * 1000),
+            client_args={"limits": limits},
+            async_client_args={"limits": limits},
+        ),
+    )
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_client()
+    return _client
+
+
+def set_client(client):
+    """Replace the shared client, e.g. with a FakeClient; None rebuilds it on next use. Returns the replaced client."""
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+    return previous
+
+
+def set_rate_limit(rps: Optional[float]) -> Optional[float]:
+    """Cap this process's Gemini requests at `rps` per second, or lift the cap with None. Returns the previous cap."""
+    previous = rate_limiter.rate
+    rate_limiter.configure(rps)
+    return previous
+
+
+class FakeModels:
+    def __init__(self, responder: Callable[[str], str]) -> None:
+        self.responder = responder
+        self.prompts: list[str] = []
+
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> types.GenerateContentResponse:
+        from google.genai import types
+
+        prompt = extract_prompt({"contents": [{"parts": [{"text": part} for part in _text_parts(contents)]}]})
+        self.prompts.append(prompt)
+        return types.GenerateContentResponse.model_validate(build_response(self.responder(prompt), prompt))
+
+    def generate_content_stream(
+        self, model: str, contents: Any, config: Any = None
+    ) -> Iterator[types.GenerateContentResponse]:
+        from google.genai import types
+
+        prompt = extract_prompt({"contents": [{"parts": [{"text": part} for part in _text_parts(contents)]}]})
+        self.prompts.append(prompt)
+        for chunk in build_stream(self.responder(prompt), prompt):
+            yield types.GenerateContentResponse.model_validate(chunk)
+
+
+class FakeAsyncModels:
+    def __init__(self, models: FakeModels) -> None:
+        self.models = models
+
+    async def generate_content(self, model: str, contents: Any, config: Any = None) -> types.GenerateContentResponse:
+        return self.models.generate_content(model, contents, config)
+
+
+class FakeAio:
+    def __init__(self, models: FakeModels) -> None:
+        self.models = FakeAsyncModels(models)
+
+
+class FakeClient:
+    """In-process stand-in for genai.Client that answers with the stub server's responder."""
+
+    def __init__(self, responder: Callable[[str], str] = default_responder) -> None:
+        self.models = FakeModels(responder)
+        self.aio = FakeAio(self.models)
+
+
+def _text_parts(contents: Any) -> list[str]:
+    if isinstance(contents, str):
+        return [contents]
+    if isinstance(contents, (list, tuple)):
+        return [part for item in contents for part in _text_parts(item)]
+    return []
+
+
+class UsageTracker:
+    """Per-stage call counts, token usage and latency, from `usage_metadata`."""
+
+    def __init__(self) -> None:
+        self.stages: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        stage: str,
+        resp: types.GenerateContentResponse,
+        latency: float,
+        cached: bool,
+        ttft: Optional[float] = None,
+    ) -> None:
+        usage = resp.usage_metadata
+        with self._lock:
+            stats = self.stages.setdefault(
+                stage,
+                {
+                    "calls": 0,
+                    "cached": 0,
+                    "prompt_tokens": 0,
+                    "response_tokens": 0,
+                    "total_tokens": 0,
+                    "latency": 0.0,
+                    "streams": 0,
+                    "ttft": 0.0,
+                },
+            )
+            stats["calls"] += 1
+            stats["cached"] += int(cached)
+            stats["latency"] += latency
+            if ttft is not None:
+                stats["streams"] += 1
+                stats["ttft"] += ttft
+            if usage is not None and not cached:
+                stats["prompt_tokens"] += usage.prompt_token_count or 0
+                stats["response_tokens"] += usage.candidates_token_count or 0
+                stats["total_tokens"] += usage.total_token_count or 0
+
+    def report(self) -> dict[str, dict]:
+        with self._lock:
+            return {
+                stage: {
+                    **stats,
+                    "avg_latency": stats["latency"] / stats["calls"] if stats["calls"] else 0.0,
+                    "avg_ttft": stats["ttft"] / stats["streams"] if stats["streams"] else None,
+                }
+                for stage, stats in self.stages.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages = {}
+
+
+usage = UsageTracker()
+
+
+def request_config(config: Any, deadline: Optional[float]) -> Any:
+    if deadline is None:
+        return config
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("LLM deadline exceeded before the request was sent")
+    from google.genai import types
+
+    http_options = types.HttpOptions(timeout=max(1, int(remaining * 1000)))
+    if config is None:
+        return types.GenerateContentConfig(http_options=http_options)
+    return config.model_copy(update={"http_options": http_options})
+
+
+def generate_content(
+    contents: Any,
+    stage: str,
+    model: str = LLM_MODEL,
+    config: Optional[types.GenerateContentConfig] = None,
+    timeout: Optional[float] = None,
+) -> types.GenerateContentResponse:
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    fetched = False
+
+    def call() -> types.GenerateContentResponse:
+        rate_limiter.wait(deadline)
+        return get_client().models.generate_content(
+            model=model, contents=contents, config=request_config(config, deadline)
+        )
+
+    def fetch() -> types.GenerateContentResponse:
+        nonlocal fetched
+        fetched = True
+        return retry(call, deadline=deadline)
+
+    start = time.perf_counter()
+    with span("llm generate", "llm", stage=stage):
+        resp = cached_response(model, contents, fetch, config)
+    usage.record(stage, resp, time.perf_counter() - start, cached=not fetched)
+    return resp
+
+
+async def generate_content_async(
+    contents: Any,
+    stage: str,
+    model: str = LLM_MODEL,
+    config: Optional[types.GenerateContentConfig] = None,
+    timeout: Optional[float] = None,
+) -> types.GenerateContentResponse:
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    fetched = False
+
+    async def call() -> types.GenerateContentResponse:
+        await rate_limiter.acquire(deadline)
+        return await get_client().aio.models.generate_content(
+            model=model, contents=contents, config=request_config(config, deadline)
+        )
+
+    async def fetch() -> types.GenerateContentResponse:
+        nonlocal fetched
+        fetched = True
+        return await retry_async(call, deadline=deadline)
+
+    start = time.perf_counter()
+    with span("llm generate", "llm", stage=stage):
+        resp = await cached_response_async(model, contents, fetch, config)
+    usage.record(stage, resp, time.perf_counter() - start, cached=not fetched)
+    return resp
+
+
+def stream_response(text: str, last: Optional[types.GenerateContentResponse]) -> types.GenerateContentResponse:
+    """Collapse a finished stream into one response, for the cache and usage accounting."""
+    from google.genai import types
+
+    finish_reason = None
+    if last is not None and last.candidates:
+        finish_reason = last.candidates[0].finish_reason
+    return types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(
+                content=types.Content(role="model", parts=[types.Part(text=text)]),
+                finish_reason=finish_reason,
+            )
+        ],
+        usage_metadata=last.usage_metadata if last is not None else None,
+    )
+
+
+def stream_content(
+    contents: Any,
+    stage: str,
+    on_token: Callable[[str], None],
+    model: str = LLM_MODEL,
+    config: Optional[types.GenerateContentConfig] = None,
+    timeout: Optional[float] = None,
+) -> dict:
+    """Stream a response through `on_token` and return its text with time-to-first-token and total time.
+
+    A cached response is delivered as a single token.
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    fetched = False
+    ttft = None
+    start = time.perf_counter()
+
+    def open_stream() -> tuple[Optional[types.GenerateContentResponse], Iterator[types.GenerateContentResponse]]:
+        rate_limiter.wait(deadline)
+        chunks = iter(
+            get_client().models.generate_content_stream(
+                model=model, contents=contents, config=request_config(config, deadline)
+            )
+        )
+        return next(chunks, None), chunks
+
+    def fetch() -> types.GenerateContentResponse:
+        nonlocal fetched, ttft
+        fetched = True
+        first, chunks = retry(open_stream, deadline=deadline)
+
+        texts = []
+        last = None
+        for chunk in itertools.chain([first] if first is not None else [], chunks):
+            text = chunk.text or ""
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            texts.append(text)
+            on_token(text)
+            last = chunk
+        return stream_response("".join(texts), last)
+
+    with span("llm generate", "llm", stage=stage, stream=True):
+        resp = cached_response(model, contents, fetch, config)
+    total = time.perf_counter() - start
+    if not fetched:
+        on_token(resp.text or "")
+    if ttft is None:
+        ttft = total
+    usage.record(stage, resp, total, cached=not fetched, ttft=ttft)
+    return {"text": (resp.text or "").strip(), "ttft": ttft, "total": total, "cached": not fetched}
+
+
+def generate_text(prompt: Any, stage: str, timeout: Optional[float] = None) -> str:
+    resp = generate_content(prompt, stage, timeout=timeout)
+    return (resp.text or "").strip()
+
+
+async def generate_text_async(prompt: Any, stage: str, timeout: Optional[float] = None) -> str:
+    resp = await generate_content_async(prompt, stage, timeout=timeout)
+    return (resp.text or "").strip()
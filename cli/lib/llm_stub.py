@@ -0,0 +1,171 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+STUB_HOST = "127.0.0.1"
+STUB_PORT = 8765
+
+MODEL_PATH_PATTERN = re.compile(r"/models/(?P<model>[^/:]+):(?P<action>\w+)")
+
+
+def default_responder(prompt: str) -> str:
+    if "Rate 0-10" in prompt:
+        return "7"
+
+    if "Return ONLY the IDs in order of relevance" in prompt:
+        doc_ids = re.findall(r"^(\d+):", prompt, flags=re.MULTILINE)
+        return json.dumps([int(doc_id) for doc_id in doc_ids])
+
+    if "Rate how relevant each result is" in prompt:
+        results = re.findall(r"^\d+\. ", prompt, flags=re.MULTILINE)
+        return json.dumps([2] * len(results))
+
+    match = re.search(r'(?:Query|Question|Original): "?(.+?)"?$', prompt, flags=re.MULTILINE)
+    query = match.group(1) if match else "your request"
+    return f"Stub response for: {query}"
+
+
+def extract_prompt(body: dict) -> str:
+    texts = []
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                texts.append(part["text"])
+    return "\n".join(texts)
+
+
+def split_stream(text: str) -> list[str]:
+    """Split `text` into word-sized pieces that concatenate back to it."""
+    return re.findall(r"\S+\s*|\s+", text) or [""]
+
+
+def build_stream(text: str, prompt: str) -> list[dict]:
+    """Streamed chunks of `text`; only the last carries the finish reason and usage."""
+    pieces = split_stream(text)
+    chunks = []
+    for i, piece in enumerate(pieces):
+        chunk = build_response(piece, prompt)
+        if i < len(pieces) - 1:
+            del chunk["usageMetadata"]
+            del chunk["candidates"][0]["finishReason"]
+        else:
+            chunk["usageMetadata"] = build_response(text, prompt)["usageMetadata"]
+        chunks.append(chunk)
+    return chunks
+
+
+def build_response(text: str, prompt: str) -> dict:
+    prompt_tokens = len(prompt.split())
+    response_tokens = len(text.split())
+    return {
+        "candidates": [
+            {
+                "content": {"role": "model", "parts": [{"text": text}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }
+        ],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": response_tokens,
+            "totalTokenCount": prompt_tokens + response_tokens,
+        },
+    }
+
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    server: "StubGeminiServer"
+
+    def do_POST(self) -> None:
+        match = MODEL_PATH_PATTERN.search(self.path)
+        if not match:
+            self.send_error(404, f"Unknown endpoint: {self.path}")
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        prompt = extract_prompt(body)
+
+        self.server.record_request(match.group("model"), prompt)
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+
+        if random.random() < self.server.error_rate:
+            self.send_json(429, {"error": {"code": 429, "message": "Stub rate limit", "status": "RESOURCE_EXHAUSTED"}})
+            return
+
+        text = self.server.responder(prompt)
+        if match.group("action") == "streamGenerateContent":
+            self.send_stream(text, prompt)
+            return
+        self.send_json(200, build_response(text, prompt))
+
+    def send_stream(self, text: str, prompt: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        for i, chunk in enumerate(build_stream(text, prompt)):
+            if i > 0 and self.server.chunk_delay > 0:
+                time.sleep(self.server.chunk_delay)
+            self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode("utf-8"))
+            self.wfile.flush()
+
+    def send_json(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class StubGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = STUB_HOST,
+        port: int = STUB_PORT,
+        latency: float = 0.0,
+        responder: Callable[[str], str] = default_responder,
+        error_rate: float = 0.0,
+        chunk_delay: float = 0.0,
+    ) -> None:
+        super().__init__((host, port), StubGeminiHandler)
+        self.latency = latency
+        self.responder = responder
+        self.error_rate = error_rate
+        self.chunk_delay = chunk_delay
+        self.requests: list[dict] = []
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_request(self, model: str, prompt: str) -> None:
+        with self._lock:
+            self.requests.append({"model": model, "prompt": prompt})
+
+
+def start_stub_server(
+    host: str = STUB_HOST,
+    port: int = 0,
+    latency: float = 0.0,
+    responder: Optional[Callable[[str], str]] = None,
+    error_rate: float = 0.0,
+    chunk_delay: float = 0.0,
+) -> StubGeminiServer:
+    server = StubGeminiServer(host, port, latency, responder or default_responder, error_rate, chunk_delay)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,315 @@
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+import numpy as np
+
+from .benchmark import latency_stats
+from .docstore import load_documents
+from .hybrid_search import HybridSearch, rrf_search_command
+from .llm_cache import llm_cache
+from .llm_client import set_client, set_rate_limit
+from .llm_stub import StubGeminiServer, start_stub_server
+from .rate_limit import describe_error
+from .search_utils import (
+    DEFAULT_ALPHA,
+    DEFAULT_LOAD_CONCURRENCY,
+    DEFAULT_SEARCH_LIMIT,
+    LLM_TIMEOUT,
+    LOAD_LATENCY_BUCKETS_MS,
+    LOAD_MAX_WORKERS,
+    RRF_K,
+    load_golden_dataset,
+)
+from .semantic_cache import enhancement_cache
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8766
+
+LOAD_MODES = ("keyword", "semantic", "weighted", "rrf")
+
+
+def read_query_log(path: str) -> list[dict]:
+    """Requests from a JSONL query log, one {"query", "mode", "params"} object per line; mode defaults to rrf."""
+    requests = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "query" not in entry:
+                raise ValueError(f"{path}:{line_number}: missing 'query'")
+            mode = entry.get("mode", "rrf")
+            if mode not in LOAD_MODES:
+                raise ValueError(f"{path}:{line_number}: unknown mode '{mode}'")
+            requests.append({"query": entry["query"], "mode": mode, "params": entry.get("params", {})})
+    if not requests:
+        raise ValueError(f"{path}: no requests")
+    return requests
+
+
+def write_sample_log(path: str, modes: tuple[str, ...] = LOAD_MODES, limit: int = DEFAULT_SEARCH_LIMIT) -> int:
+    """Write a query log with every golden-dataset query in each of `modes`, for replaying without real traffic."""
+    entries = [
+        {"query": test_case["query"], "mode": mode, "params": {"limit": limit}}
+        for test_case in load_golden_dataset()["test_cases"]
+        for mode in modes
+    ]
+    with open(path, "w") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+    return len(entries)
+
+
+def execute_request(searcher: HybridSearch, request: dict) -> int:
+    """Run one logged request on a warm `searcher` and return the number of results."""
+    query = request["query"]
+    mode = request.get("mode", "rrf")
+    params = request.get("params", {})
+    limit = params.get("limit", DEFAULT_SEARCH_LIMIT)
+    filters = params.get("filters")
+
+    if mode == "keyword":
+        results = searcher.idx.bm25_search(query, limit, filters)
+    elif mode == "semantic":
+        results = searcher.semantic_search.search_chunks(query, limit, filters)
+    elif mode == "weighted":
+        results = searcher.weighted_search(query, params.get("alpha", DEFAULT_ALPHA), limit, filters)
+    elif mode == "rrf":
+        results = rrf_search_command(
+            query,
+            params.get("k", RRF_K),
+            params.get("enhance"),
+            params.get("rerank_method"),
+            limit,
+            filters=filters,
+            cascade=params.get("cascade"),
+            timeout=params.get("timeout"),
+            searcher=searcher,
+        )["results"]
+    else:
+        raise ValueError(f"unknown mode: {mode}")
+    return len(results)
+
+
+def point_llm_at_stub(latency: float = 0.0, error_rate: float = 0.0) -> StubGeminiServer:
+    """Start an in-process stub Gemini server and send every LLM stage of this process to it.
+
+    The response cache and the Gemini rate limit are turned off so each
+    request reaches the stub as soon as it is made, and enhancements are
+    cached in a scratch file so stub answers never land in the real
+    enhancement cache.
+    """
+    server = start_stub_server(latency=latency, error_rate=error_rate)
+    os.environ["GEMINI_BASE_URL"] = server.base_url
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+    set_client(None)
+    set_rate_limit(None)
+    llm_cache.mode = "off"
+    enhancement_cache.path = os.path.join(tempfile.mkdtemp(prefix="load-"), "enhancement_cache.pkl")
+    enhancement_cache.namespaces = {}
+    enhancement_cache.appended = 0
+    return server
+
+
+class InProcessTarget:
+    """Replays requests straight against one warm engine in this process."""
+
+    def __init__(self) -> None:
+        self.searcher = HybridSearch(load_documents())
+        self.name = "in-process"
+
+    def __call__(self, request: dict) -> int:
+        return execute_request(self.searcher, request)
+
+
+class HttpTarget:
+    """Replays requests against a search server started with `load_cli.py serve`."""
+
+    def __init__(self, url: str, timeout: float = LLM_TIMEOUT) -> None:
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.name = self.url
+
+    def __call__(self, request: dict) -> int:
+        http_request = urllib.request.Request(
+            f"{self.url}/search",
+            data=json.dumps(request).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+            return json.load(response)["results"]
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    server: "SearchServer"
+
+    def do_POST(self) -> None:
+        if self.path != "/search":
+            self.send_error(404, f"Unknown endpoint: {self.path}")
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+            results = execute_request(self.server.searcher, request)
+        except (ValueError, KeyError) as e:
+            self.send_json(400, {"error": describe_error(e)})
+            return
+        except Exception as e:
+            self.send_json(500, {"error": describe_error(e)})
+            return
+        self.send_json(200, {"results": results})
+
+    def send_json(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class SearchServer(ThreadingHTTPServer):
+    """Serves POST /search with a query-log request as the JSON body, on one warm engine."""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = SERVER_HOST, port: int = SERVER_PORT) -> None:
+        super().__init__((host, port), SearchHandler)
+        self.searcher = HybridSearch(load_documents())
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def latency_histogram(latencies: list[float], bounds_ms: tuple[float, ...] = LOAD_LATENCY_BUCKETS_MS) -> list[dict]:
+    """Request counts per latency bucket; each bucket holds latencies up to `le_ms`, the last (None) the rest."""
+    counts, _ = np.histogram(np.array(latencies) * 1000, bins=[0.0, *bounds_ms, np.inf])
+    return [{"le_ms": bound, "count": int(count)} for bound, count in zip([*bounds_ms, None], counts)]
+
+
+def replay(
+    target: Callable[[dict], int],
+    requests: list[dict],
+    total: int,
+    qps: Optional[float] = None,
+    concurrency: int = DEFAULT_LOAD_CONCURRENCY,
+) -> dict:
+    """Send `total` requests, cycling through `requests`, and measure what the target sustains.
+
+    With `qps` the load is open-loop: request i is due at i / qps seconds
+    whatever the target does, and its latency counts from when it was due,
+    so queueing behind a saturated target shows up in the latencies. Without
+    it, `concurrency` workers each send their next request as soon as the
+    last one returns.
+    """
+    outcomes: list[Optional[tuple[str, float, Optional[str]]]] = [None] * total
+
+    def send(i: int, due: float) -> None:
+        request = requests[i % len(requests)]
+        error = None
+        try:
+            target(request)
+        except Exception as e:
+            error = type(e).__name__
+        outcomes[i] = (request.get("mode", "rrf"), time.perf_counter() - due, error)
+
+    start = time.perf_counter()
+    if qps:
+        with ThreadPoolExecutor(max_workers=LOAD_MAX_WORKERS) as pool:
+            for i in range(total):
+                due = start + i / qps
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(send, i, due)
+    else:
+        next_index = itertools.count()
+
+        def worker() -> None:
+            while (i := next(next_index)) < total:
+                send(i, time.perf_counter())
+
+        workers = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    elapsed = time.perf_counter() - start
+
+    succeeded = [(mode, latency) for mode, latency, error in outcomes if error is None]
+    errors = Counter(error for _, _, error in outcomes if error is not None)
+    latencies = [latency for _, latency in succeeded]
+    return {
+        "requests": total,
+        "succeeded": len(succeeded),
+        "errors": dict(errors),
+        "error_rate": sum(errors.values()) / total if total else 0.0,
+        "elapsed": elapsed,
+        "throughput": total / elapsed if elapsed > 0 else 0.0,
+        "target_qps": qps,
+        "concurrency": None if qps else concurrency,
+        "latency": latency_stats(latencies),
+        "histogram": latency_histogram(latencies),
+        "by_mode": {
+            mode: latency_stats([latency for request_mode, latency in succeeded if request_mode == mode])
+            for mode in sorted({mode for mode, _ in succeeded})
+        },
+    }
+
+
+def replay_command(
+    log_path: str,
+    total: Optional[int] = None,
+    qps: Optional[float] = None,
+    concurrency: int = DEFAULT_LOAD_CONCURRENCY,
+    url: Optional[str] = None,
+    stub: bool = True,
+    stub_latency: float = 0.0,
+    stub_error_rate: float = 0.0,
+) -> dict:
+    """Replay a query log in-process, or against the search server at `url`.
+
+    With `stub`, LLM stages of an in-process replay go to a local stub
+    Gemini server; a remote server decides that for itself.
+    """
+    if qps is not None and qps <= 0:
+        raise ValueError("qps must be positive")
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    requests = read_query_log(log_path)
+    total = total or len(requests)
+
+    stub_server = point_llm_at_stub(stub_latency, stub_error_rate) if stub and url is None else None
+    target = HttpTarget(url) if url else InProcessTarget()
+    # One untimed request so the first timed one does not pay for lazy loads.
+    try:
+        target(requests[0])
+    except Exception:
+        pass
+    try:
+        result = replay(target, requests, total, qps, concurrency)
+    finally:
+        if stub_server is not None:
+            stub_server.shutdown()
+    return {
+        "log": log_path,
+        "target": target.name,
+        "stub": stub_server.base_url if stub_server is not None else None,
+        "llm_requests": len(stub_server.requests) if stub_server is not None else None,
+        **result,
+    }
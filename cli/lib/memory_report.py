@@ -0,0 +1,156 @@
+import gc
+import os
+import sys
+from typing import Any, Optional
+
+import numpy as np
+
+from .benchmark import peak_rss_mb
+from .docstore import load_documents
+from .keyword_search import InvertedIndex
+from .reranking import cross_encoder
+from .search_utils import MEMORY_REPORT_SCALES
+from .semantic_search import ChunkedSemanticSearch
+
+MIB = 1024 * 1024
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process right now, in MiB (the peak where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except OSError:
+        return peak_rss_mb()
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / MIB
+
+
+def model_sizeof(model: Any, seen: set[int]) -> int:
+    """Parameter and buffer bytes of a torch model (or the one it wraps as `.model`), else its deep size."""
+    for module in (model, getattr(model, "model", None)):
+        if callable(getattr(module, "parameters", None)) and callable(getattr(module, "buffers", None)):
+            seen.add(id(model))
+            tensors = list(module.parameters()) + list(module.buffers())
+            return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    return deep_sizeof(model, seen)
+
+
+def deep_sizeof(obj: Any, seen: Optional[set[int]] = None) -> int:
+    """Bytes held by `obj` and everything reachable from it through containers and attributes.
+
+    Objects whose ids are already in `seen` are not counted again, so
+    sharing one `seen` across calls splits shared objects between them
+    instead of counting them twice. A numpy view is followed to the array
+    or buffer it views; a memory map counts only its header.
+    """
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+
+        total += sys.getsizeof(current)
+        if isinstance(current, np.ndarray):
+            # getsizeof includes the data only when the array owns it; otherwise follow it to its base.
+            if current.base is not None:
+                stack.append(current.base)
+            continue
+        if isinstance(current, (str, bytes, bytearray, int, float, bool, type(None))):
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        else:
+            if hasattr(current, "__dict__"):
+                stack.append(current.__dict__)
+            for slot in getattr(type(current), "__slots__", ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return total
+
+
+def memory_report_command(scales: Optional[list[float]] = None) -> dict:
+    """Load the hybrid stack one piece at a time and account for the memory of each structure.
+
+    `steps` records the process RSS after each load. `structures` gives the
+    deep size of each structure, counting objects shared between them once.
+    Projections scale the corpus-sized structures linearly and keep the
+    models fixed; the vocabulary grows slower than the corpus, so the
+    index projections are an upper bound.
+    """
+    gc.collect()
+    steps = []
+    previous = current_rss_mb()
+    start = previous
+
+    def record(step: str) -> None:
+        nonlocal previous
+        gc.collect()
+        rss = current_rss_mb()
+        steps.append({"step": step, "rss_mb": rss, "delta_mb": rss - previous})
+        previous = rss
+
+    documents = load_documents()
+    record("documents")
+    index = InvertedIndex()
+    index.load()
+    index.filters.ensure_loaded()
+    record("inverted index")
+    semantic_search = ChunkedSemanticSearch()
+    semantic_search.load_or_create_chunk_embeddings(documents)
+    record("chunk embeddings")
+    embedding_model = semantic_search.model
+    record("embedding model")
+    reranker_model = cross_encoder.model
+    record("cross-encoder model")
+
+    seen: set[int] = set()
+    structures = [
+        ("docstore", documents, True),
+        ("index.index", index.index, True),
+        ("index.term_frequencies", index.term_frequencies, True),
+        ("index.doc_lengths", index.doc_lengths, True),
+        ("index.filters", index.filters, True),
+        ("chunk_embeddings", semantic_search.chunk_embeddings, True),
+        ("chunk_metadata", semantic_search.chunk_metadata, True),
+        ("chunk_movie_idxs", semantic_search.chunk_movie_idxs, True),
+        (f"embedding model ({semantic_search.model_name})", embedding_model, False),
+        (f"cross-encoder model ({cross_encoder.model_name})", reranker_model, False),
+    ]
+    sizes = [
+        {
+            "name": name,
+            "mb": (deep_sizeof(structure, seen) if scales_with_corpus else model_sizeof(structure, seen)) / MIB,
+            "scales_with_corpus": scales_with_corpus,
+        }
+        for name, structure, scales_with_corpus in structures
+    ]
+    mapped_mb = documents.mapped_bytes / MIB
+
+    corpus_mb = sum(size["mb"] for size in sizes if size["scales_with_corpus"])
+    fixed_mb = sum(size["mb"] for size in sizes if not size["scales_with_corpus"])
+    projections = [
+        {"scale": scale, "documents": int(len(documents) * scale), "mb": corpus_mb * scale + fixed_mb, "mapped_mb": mapped_mb * scale}
+        for scale in (scales or MEMORY_REPORT_SCALES)
+    ]
+
+    return {
+        "documents": len(documents),
+        "chunks": len(semantic_search.chunk_metadata or []),
+        "terms": len(index.index),
+        "start_rss_mb": start,
+        "rss_mb": current_rss_mb(),
+        "peak_rss_mb": peak_rss_mb(),
+        "steps": steps,
+        "structures": sizes,
+        "mapped_mb": mapped_mb,
+        "corpus_mb": corpus_mb,
+        "fixed_mb": fixed_mb,
+        "projections": projections,
+    }
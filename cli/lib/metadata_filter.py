@@ -0,0 +1,223 @@
+import pickle
+import re
+from typing import Any, Optional
+
+import numpy as np
+
+from .search_utils import FILTER_BITSET_MAX_VALUES, FILTERS_ARTIFACT
+from .snapshot import Snapshot, SnapshotBuilder, require_artifact, resolve_artifact
+
+FILTER_TEXT_FIELDS = {"title", "description"}
+FILTER_PATTERN = re.compile(r"^\s*(?P<field>[\w.-]+)\s*(?P<op><=|>=|!=|=|<|>)\s*(?P<value>.+?)\s*$")
+
+
+def parse_filter(expr: str) -> tuple[str, str, str]:
+    match = FILTER_PATTERN.match(expr)
+    if not match:
+        raise ValueError(f"invalid filter '{expr}', expected FIELD=VALUE, FIELD>=VALUE, ...")
+    return match.group("field"), match.group("op"), match.group("value")
+
+
+def normalize_value(value: Any) -> Any:
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, str):
+        return value.strip().lower()
+    return value
+
+
+class BitmapIndex:
+    """Per-field bitsets over document positions, packed 8 documents per byte.
+
+    Position i is the i-th movie in `movies.json`, which is also the
+    `movie_idx` used by the chunk metadata. Only string fields with at most
+    FILTER_BITSET_MAX_VALUES distinct values get a bitset per value; other
+    string fields keep a sorted position array per value, numeric fields
+    keep one column of values, and `id` is looked up in `positions`, so the
+    index grows linearly with the corpus.
+    """
+
+    def __init__(self, artifact_prefix: str = "") -> None:
+        self.artifact_name = f"{artifact_prefix}{FILTERS_ARTIFACT}"
+        self.doc_ids: np.ndarray = np.array([], dtype=np.int64)
+        self.positions: dict[int, int] = {}
+        self.bitsets: dict[str, dict[Any, np.ndarray]] = {}
+        self.postings: dict[str, dict[Any, np.ndarray]] = {}
+        self.numeric_values: dict[str, np.ndarray] = {}
+        # Fields found elsewhere in the corpus (by other shards) but in none of these documents.
+        self.known_fields: set[str] = set()
+        self.deferred = False
+        self.deferred_snapshot: Optional[Snapshot] = None
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @property
+    def fields(self) -> list[str]:
+        return sorted(set(self.bitsets) | set(self.postings) | set(self.numeric_values))
+
+    def build(self, documents: list[dict]) -> None:
+        self.deferred = False
+        n_docs = len(documents)
+        self.doc_ids = np.array([doc["id"] for doc in documents], dtype=np.int64)
+        self.positions = {int(doc_id): i for i, doc_id in enumerate(self.doc_ids)}
+
+        members: dict[str, dict[Any, list[int]]] = {}
+        numeric_lists: dict[str, dict[int, list[float]]] = {}
+        for i, doc in enumerate(documents):
+            for field, value in doc.items():
+                if field in FILTER_TEXT_FIELDS:
+                    continue
+                values = value if isinstance(value, list) else [value]
+                for v in values:
+                    if isinstance(v, (int, float)) and not isinstance(v, bool):
+                        numeric_lists.setdefault(field, {}).setdefault(i, []).append(v)
+                    elif isinstance(v, (str, bool)):
+                        members.setdefault(field, {}).setdefault(normalize_value(v), []).append(i)
+
+        self.bitsets = {}
+        self.postings = {}
+        for field, value_positions in members.items():
+            if len(value_positions) > FILTER_BITSET_MAX_VALUES:
+                self.postings[field] = {
+                    value: np.unique(np.array(value_idxs, dtype=np.int32))
+                    for value, value_idxs in value_positions.items()
+                }
+                continue
+            self.bitsets[field] = {}
+            for value, value_idxs in value_positions.items():
+                bits = np.zeros(n_docs, dtype=bool)
+                bits[value_idxs] = True
+                self.bitsets[field][value] = np.packbits(bits)
+
+        # One row per document and one column per value, NaN-padded, so a
+        # multi-valued field matches a range if any of its values does.
+        self.numeric_values = {}
+        for field, doc_values in numeric_lists.items():
+            values = np.full((n_docs, max(len(v) for v in doc_values.values())), np.nan)
+            for i, v in doc_values.items():
+                values[i, : len(v)] = v
+            self.numeric_values[field] = values
+
+    def exists(self, snapshot: Optional[Snapshot] = None) -> bool:
+        return resolve_artifact(self.artifact_name, snapshot=snapshot) is not None
+
+    def save(self, snapshot: Optional[SnapshotBuilder] = None) -> None:
+        if snapshot is None:
+            with SnapshotBuilder() as snapshot:
+                self.save(snapshot)
+            return
+
+        with open(snapshot.artifact_path(self.artifact_name), "wb") as f:
+            pickle.dump(
+                {
+                    "doc_ids": self.doc_ids,
+                    "bitsets": self.bitsets,
+                    "postings": self.postings,
+                    "numeric_values": self.numeric_values,
+                },
+                f,
+            )
+        snapshot.record(self.artifact_name)
+
+    def load(self, snapshot: Optional[Snapshot] = None) -> None:
+        self.deferred = False
+        with open(require_artifact(self.artifact_name, snapshot=snapshot), "rb") as f:
+            data = pickle.load(f)
+        self.doc_ids = data["doc_ids"]
+        self.positions = {int(doc_id): i for i, doc_id in enumerate(self.doc_ids)}
+        self.bitsets = data["bitsets"]
+        self.postings = data.get("postings", {})
+        self.numeric_values = data["numeric_values"]
+
+    def defer_load(self, snapshot: Optional[Snapshot] = None) -> None:
+        """Load from `snapshot` the first time a filter is applied, so unfiltered searches never read the bitsets."""
+        self.deferred = True
+        self.deferred_snapshot = snapshot
+
+    def ensure_loaded(self) -> None:
+        if self.deferred:
+            self.load(self.deferred_snapshot)
+
+    def match(self, expr: str) -> np.ndarray:
+        field, op, raw_value = parse_filter(expr)
+        if field not in self.fields and field in self.known_fields:
+            # No document here has the field, so = and ranges match none and != matches all.
+            return np.packbits(np.full(len(self.doc_ids), op == "!="))
+        if field not in self.fields:
+            raise ValueError(
+                f"unknown filter field '{field}', available fields: {', '.join(self.fields) or 'none'}"
+            )
+
+        if op in ("=", "!="):
+            bits = self._equal(field, raw_value)
+            return np.bitwise_not(bits) if op == "!=" else bits
+
+        if field not in self.numeric_values:
+            raise ValueError(f"filter field '{field}' is not numeric, only = and != are supported")
+
+        values = self.numeric_values[field]
+        number = self._parse_number(raw_value)
+        with np.errstate(invalid="ignore"):
+            match op:
+                case "<":
+                    bits = values < number
+                case "<=":
+                    bits = values <= number
+                case ">":
+                    bits = values > number
+                case _:
+                    bits = values >= number
+        if bits.ndim > 1:
+            bits = bits.any(axis=1)
+        return np.packbits(bits)
+
+    def mask(self, filters: Optional[list[str]]) -> Optional[np.ndarray]:
+        if not filters:
+            return None
+        self.ensure_loaded()
+        bits = np.packbits(np.ones(len(self.doc_ids), dtype=bool))
+        for expr in filters:
+            bits = np.bitwise_and(bits, self.match(expr))
+        return np.unpackbits(bits, count=len(self.doc_ids)).astype(bool)
+
+    def allowed_doc_ids(self, filters: Optional[list[str]]) -> Optional[set[int]]:
+        mask = self.mask(filters)
+        if mask is None:
+            return None
+        return set(int(doc_id) for doc_id in self.doc_ids[mask])
+
+    def _equal(self, field: str, raw_value: str) -> np.ndarray:
+        """Packed bits of the documents where `field` has the value `raw_value`."""
+        equal = np.zeros(len(self.doc_ids), dtype=bool)
+        if field == "id":
+            number = self._parse_number(raw_value)
+            position = self.positions.get(int(number)) if number.is_integer() else None
+            if position is not None:
+                equal[position] = True
+            return np.packbits(equal)
+
+        value = normalize_value(raw_value)
+        if value in self.postings.get(field, {}):
+            equal[self.postings[field][value]] = True
+        if field in self.numeric_values:
+            textual = field in self.bitsets or field in self.postings
+            try:
+                number = self._parse_number(raw_value)
+            except ValueError:
+                if not textual:
+                    raise
+            else:
+                values = self.numeric_values[field]
+                equal |= (values == number).any(axis=1) if values.ndim > 1 else values == number
+        bits = np.packbits(equal)
+        if value in self.bitsets.get(field, {}):
+            bits = np.bitwise_or(bits, self.bitsets[field][value])
+        return bits
+
+    @staticmethod
+    def _parse_number(raw_value: str) -> float:
+        try:
+            return float(raw_value)
+        except ValueError:
+            raise ValueError(f"filter value '{raw_value}' is not a number")
@@ -1,9 +1,7 @@
 import os
 import numpy as np
 
-from .search_utils import load_movies
-from PIL import Image
-from sentence_transformers import SentenceTransformer
+from .docstore import load_documents
 
 model_name = "clip-ViT-B-32"
 
@@ -11,12 +9,16 @@ class MultimodalSearch:
     def __init__(self, documents, model_name=model_name):
         self.documents = documents
         self.texts = [f"{doc['title']}: {doc['description']}" for doc in documents]
+        from sentence_transformers import SentenceTransformer
+
         self.model = SentenceTransformer(model_name)
         self.text_embeddings = self.model.encode(self.texts, show_progress_bar=True)
 
     def embed_image(self, image_path):
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"Image file not found: {image_path}")
+        from PIL import Image
+
         img = Image.open(image_path)
         image_embedding = self.model.encode([img])
         return image_embedding[0]
@@ -27,16 +29,21 @@ class MultimodalSearch:
         similarities = []
         for i, text_embedding in enumerate(self.text_embeddings):
             similarity = cosine_similarity(text_embedding, image_embedding)
-            similarities.append(
+            similarities.append((similarity, i))
+        similarities.sort(key=lambda item:item[0], reverse=True)
+
+        results = []
+        for similarity, i in similarities[:5]:
+            doc = self.documents[i]
+            results.append(
                 {
-                    "doc_id": self.documents[i]["id"],
-                    "title": self.documents[i]["title"],
-                    "description": self.documents[i]["description"],
+                    "doc_id": doc["id"],
+                    "title": doc["title"],
+                    "description": doc["description"],
                     "similarity_score": similarity,
                 }
             )
-        similarities.sort(key=lambda item:item["similarity_score"], reverse=True)
-        return similarities[:5]
+        return results
 
        
 def cosine_similarity(vec1, vec2):
@@ -57,7 +64,7 @@ def verify_image_embedding(image_path):
 
 
 def image_search_command(image_path:str):
-    movies = load_movies()
+    movies = load_documents()
     searcher = MultimodalSearch(movies)
     return searcher.search_with_image(image_path)
 
@@ -0,0 +1,103 @@
+import atexit
+import os
+import sys
+import threading
+from collections import Counter
+from types import FrameType
+from typing import Optional, TextIO
+
+from .search_utils import PROFILE_INTERVAL, PROFILE_TOP
+
+
+def frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Wall-clock sampling profiler: a background thread records every other thread's stack every `interval` seconds.
+
+    Stacks are kept in collapsed form, root first and rooted at the thread
+    name, which is what flamegraph.pl, speedscope and inferno read. Threads
+    waiting on I/O or locks are sampled too, so time spent waiting on
+    Gemini shows up next to time spent computing.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL) -> None:
+        self.interval = interval
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def save(self, path: str) -> str:
+        """Write one "root;...;leaf count" line per distinct stack."""
+        with open(path, "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{";".join(stack)} {count}\n")
+        return path
+
+    def top(self, n: int = PROFILE_TOP) -> list[dict]:
+        """The `n` functions with the most samples at the top of the stack, with their inclusive counts."""
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack[1:]):
+                total[label] += count
+        return [
+            {"function": label, "self": count, "total": total[label]}
+            for label, count in own.most_common(n)
+        ]
+
+    def report(self, out: TextIO, n: int = PROFILE_TOP) -> None:
+        stack_samples = sum(self.stacks.values())
+        if not stack_samples:
+            print("Profile: no samples", file=out)
+            return
+        print(f"Profile: {self.samples} samples every {self.interval * 1000:g} ms, top {n} functions by self time", file=out)
+        print(f"  {"self":>6} {"total":>6}  function", file=out)
+        for row in self.top(n):
+            print(f"  {row["self"] / stack_samples:>6.1%} {row["total"] / stack_samples:>6.1%}  {row["function"]}", file=out)
+
+
+profiler = SamplingProfiler()
+
+
+def enable_profiling(path: str, top: int = PROFILE_TOP) -> None:
+    """Sample stacks for the rest of the process; on exit write collapsed stacks to `path` and a summary to stderr."""
+
+    def finish() -> None:
+        profiler.stop()
+        profiler.save(path)
+        profiler.report(sys.stderr, top)
+        print(f"Collapsed stacks written to {path}", file=sys.stderr)
+
+    profiler.start()
+    atexit.register(finish)
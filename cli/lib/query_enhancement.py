@@ -1,16 +1,13 @@
-import os
 from typing import Optional
 
-from dotenv import load_dotenv
-from google import genai
+from .llm_client import generate_content
+from .rate_limit import describe_error, is_retryable, time_left
+from .search_utils import MIN_LLM_STAGE_BUDGET
+from .semantic_cache import enhancement_cache
+from .tracing import span
 
-load_dotenv()
-api_key = os.getenv("gemini_api_key")
-client = genai.Client(api_key=api_key)
-model = "gemini-2.0-flash"
 
-
-def spell_correct(query: str) -> str:
+def spell_correct(query: str, timeout: Optional[float]=None) -> str:
     prompt = f"""Fix any spelling errors in this movie search query.
 
 Only correct obvious typos. Don't change correctly spelled words.
@@ -20,11 +17,11 @@ Query: "{query}"
 If no errors, return the original query.
 Corrected:"""
     
-    resp = client.models.generate_content(model=model, contents=prompt)
+    resp = generate_content(prompt, "enhance", timeout=timeout)
     corrected = (resp.text or "").strip().strip('"')
     return corrected if corrected else query
 
-def rewrite_query(query: str) -> str:
+def rewrite_query(query: str, timeout: Optional[float]=None) -> str:
     prompt = f"""Rewrite this movie search query to be more specific and searchable.
 
 Original: "{query}"
@@ -44,12 +41,12 @@ Examples:
 
 Rewritten query:"""
     
-    resp = client.models.generate_content(model=model, contents=prompt)
+    resp = generate_content(prompt, "enhance", timeout=timeout)
     corrected = (resp.text or "").strip().strip('"')
     return corrected if corrected else query
 
 
-def expand_query(query: str) -> str:
+def expand_query(query: str, timeout: Optional[float]=None) -> str:
     prompt = f"""Expand this movie search query with related terms.
 
 Add synonyms and related concepts that might appear in movie descriptions.
@@ -64,18 +61,58 @@ Examples:
 
 Query: "{query}"
 """
-    resp = client.models.generate_content(model=model, contents=prompt)
+    resp = generate_content(prompt, "enhance", timeout=timeout)
     corrected = (resp.text or "").strip().strip('"')
     return corrected if corrected else query
 
 
-def enhance_query(query: str, method: Optional[str]=None) -> str:
+ENHANCEMENT_METHODS = ("spell", "rewrite", "expand")
+
+
+def enhance_query(query: str, method: Optional[str]=None, use_cache: bool=True, timeout: Optional[float]=None) -> str:
     match method:
         case "spell":
-            return spell_correct(query)
+            enhance = spell_correct
         case "rewrite":
-            return rewrite_query(query)
+            enhance = rewrite_query
         case "expand":
-            return expand_query(query)
+            enhance = expand_query
         case _:
-            return query
\ No newline at end of file
+            return query
+
+    with span("enhance", "llm", method=method):
+        if use_cache:
+            cached = enhancement_cache.get(method, query)
+            if cached is not None:
+                return cached
+
+        enhanced = enhance(query, timeout)
+        if use_cache:
+            enhancement_cache.put(method, query, enhanced)
+        return enhanced
+
+
+def enhance_within_deadline(query: str, method: str, deadline: Optional[float]=None) -> tuple[str, Optional[dict]]:
+    """Enhance `query` unless the time.monotonic() `deadline` gets in the way.
+
+    With less than MIN_LLM_STAGE_BUDGET left only a cached enhancement is
+    used, and a call that times out or keeps failing falls back to the
+    original query. Returns the query and, if the stage was degraded, why.
+    """
+    left = time_left(deadline)
+    if left is None:
+        return enhance_query(query, method), None
+
+    if left < MIN_LLM_STAGE_BUDGET:
+        cached = enhancement_cache.get(method, query)
+        if cached is not None:
+            return cached, None
+        reason = f"{left:.2f}s left"
+    else:
+        try:
+            return enhance_query(query, method, timeout=left), None
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            reason = describe_error(e)
+    return query, {"stage": f"enhance:{method}", "reason": reason, "fallback": "original query"}
\ No newline at end of file
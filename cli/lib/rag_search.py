@@ -1,17 +1,35 @@
-import os
+import asyncio
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Optional
 
-from lib.search_utils import load_movies, RRF_K, DEFAULT_SEARCH_LIMIT, SEARCH_MULTIPLIER
+from lib.search_utils import RRF_K, DEFAULT_SEARCH_LIMIT, SEARCH_MULTIPLIER, DEFAULT_RAG_CONCURRENCY, DEFAULT_CONTEXT_TOKEN_BUDGET
+from lib.context_builder import pack_context
 from lib.hybrid_search import HybridSearch
-from google import genai
-from dotenv import load_dotenv
+from lib.docstore import load_documents
+from lib.llm_client import generate_text, generate_text_async, stream_content
 
-load_dotenv()
-api_key = os.environ.get("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
-model = "gemini-2.0-flash"
 
+def generate(prompt: str) -> str:
+    return generate_text(prompt, "rag")
 
-def generate_answer(search_results, query, limit=DEFAULT_SEARCH_LIMIT) -> str:
+
+async def generate_async(prompt: str) -> str:
+    return await generate_text_async(prompt, "rag")
+
+
+def generate_timed(prompt: str, on_token: Optional[Callable[[str], None]] = None) -> tuple[str, dict]:
+    """Generate a response, streaming it through `on_token` when given, and time it."""
+    if on_token is None:
+        start = time.perf_counter()
+        text = generate(prompt)
+        return text, {"streamed": False, "ttft": None, "total": time.perf_counter() - start}
+
+    result = stream_content(prompt, "rag", on_token)
+    return result["text"], {"streamed": True, "ttft": result["ttft"], "total": result["total"]}
+
+
+def answer_prompt(search_results, query, limit=DEFAULT_SEARCH_LIMIT) -> str:
     context = ""
 
     for result in search_results[:limit]:
@@ -27,12 +45,14 @@ Query: {query}
 Documents:
 {context}
 """
-    
-    resp = client.models.generate_content(model=model, contents=prompt)
-    return (resp.text or "").strip()
+    return prompt
 
 
-def multi_document_summary(query: str, search_results: list[dict], limit: int = DEFAULT_SEARCH_LIMIT) -> str:
+def generate_answer(search_results, query, limit=DEFAULT_SEARCH_LIMIT) -> str:
+    return generate(answer_prompt(search_results, query, limit))
+
+
+def summary_prompt(query: str, search_results: list[dict], limit: int = DEFAULT_SEARCH_LIMIT) -> str:
     docs_text = ""
 
     for i, res in enumerate(search_results[:limit], 1):
@@ -48,11 +68,12 @@ Search Results:
 {docs_text}
 Provide a comprehensive 3-4 sentence answer that combines information from multiple sources:
 """
-    
-    resp = client.models.generate_content(model=model, contents=prompt)
-    return (resp.text or "").strip()
+    return prompt
 
-def multi_document_summary_citations(query: str, search_results: list[dict], limit: int=DEFAULT_SEARCH_LIMIT) -> str:
+def multi_document_summary(query: str, search_results: list[dict], limit: int = DEFAULT_SEARCH_LIMIT) -> str:
+    return generate(summary_prompt(query, search_results, limit))
+
+def citations_prompt(query: str, search_results: list[dict], limit: int=DEFAULT_SEARCH_LIMIT) -> str:
     docs_text = ""
 
     for i, res in enumerate(search_results[:limit], 1):
@@ -77,11 +98,12 @@ Instructions:
 - Be direct and informative
 
 Answer:"""
-    
-    resp = client.models.generate_content(model=model, contents=prompt)
-    return (resp.text or "").strip()
+    return prompt
 
-def multi_document_answer(question: str, search_results: list[dict], limit: int=DEFAULT_SEARCH_LIMIT) -> str:
+def multi_document_summary_citations(query: str, search_results: list[dict], limit: int=DEFAULT_SEARCH_LIMIT) -> str:
+    return generate(citations_prompt(query, search_results, limit))
+
+def question_prompt(question: str, search_results: list[dict], limit: int=DEFAULT_SEARCH_LIMIT) -> str:
     docs_text = ""
 
     for i, res in enumerate(search_results[:limit], 1):
@@ -103,13 +125,14 @@ Instructions:
 - Talk like a normal person would in a chat conversation
 
 Answer:"""
-    
-    resp = client.models.generate_content(model=model, contents=prompt)
-    return (resp.text or "").strip()
+    return prompt
+
+def multi_document_answer(question: str, search_results: list[dict], limit: int=DEFAULT_SEARCH_LIMIT) -> str:
+    return generate(question_prompt(question, search_results, limit))
 
 
-def rag(query: str, limit=DEFAULT_SEARCH_LIMIT) -> dict:
-    movies = load_movies()
+def rag(query: str, limit=DEFAULT_SEARCH_LIMIT, token_budget: Optional[int]=DEFAULT_CONTEXT_TOKEN_BUDGET, on_token: Optional[Callable[[str], None]]=None) -> dict:
+    movies = load_documents()
     searcher = HybridSearch(movies)
     search_results = searcher.rrf_search(query, RRF_K, limit * SEARCH_MULTIPLIER)
     
@@ -120,35 +143,41 @@ def rag(query: str, limit=DEFAULT_SEARCH_LIMIT) -> dict:
             "error": "No results found"
         }
     
-    answer = generate_answer(search_results, query, DEFAULT_SEARCH_LIMIT)
+    context_results, context = pack_context(search_results, DEFAULT_SEARCH_LIMIT, token_budget)
+    answer, generation = generate_timed(answer_prompt(context_results, query, DEFAULT_SEARCH_LIMIT), on_token)
 
     return {
         "query": query,
         "search_results": search_results,
         "answer": answer,
+        "context": context,
+        "generation": generation,
     }
 
-def rag_command(query):
-    return rag(query)
+def rag_command(query, token_budget: Optional[int]=DEFAULT_CONTEXT_TOKEN_BUDGET, on_token: Optional[Callable[[str], None]]=None):
+    return rag(query, token_budget=token_budget, on_token=on_token)
 
-def summarize_command(query: str, limit: int=DEFAULT_SEARCH_LIMIT) -> dict:
-    movies = load_movies()
+def summarize_command(query: str, limit: int=DEFAULT_SEARCH_LIMIT, token_budget: Optional[int]=DEFAULT_CONTEXT_TOKEN_BUDGET, on_token: Optional[Callable[[str], None]]=None) -> dict:
+    movies = load_documents()
     searcher = HybridSearch(movies)
     search_results = searcher.rrf_search(query, RRF_K, limit * SEARCH_MULTIPLIER)
 
     if not search_results:
         return {"query": query, "error": "No results found"}
 
-    summary = multi_document_summary(query, search_results, limit)
+    context_results, context = pack_context(search_results, limit, token_budget)
+    summary, generation = generate_timed(summary_prompt(query, context_results, limit), on_token)
 
     return {
         "query": query,
         "search_results": search_results[:limit],
         "summary": summary,
+        "context": context,
+        "generation": generation,
     }
 
-def citations_command(query: str, limit: int=DEFAULT_SEARCH_LIMIT) -> dict:
-    movies = load_movies()
+def citations_command(query: str, limit: int=DEFAULT_SEARCH_LIMIT, token_budget: Optional[int]=DEFAULT_CONTEXT_TOKEN_BUDGET, on_token: Optional[Callable[[str], None]]=None) -> dict:
+    movies = load_documents()
     searcher = HybridSearch(movies)
 
     search_results = searcher.rrf_search(query, RRF_K, limit * SEARCH_MULTIPLIER)
@@ -156,16 +185,19 @@ def citations_command(query: str, limit: int=DEFAULT_SEARCH_LIMIT) -> dict:
     if not search_results:
         return {"query": query, "error": "No results found"}
 
-    summary_wt_citations = multi_document_summary_citations(query, search_results, limit)
+    context_results, context = pack_context(search_results, limit, token_budget)
+    summary_wt_citations, generation = generate_timed(citations_prompt(query, context_results, limit), on_token)
 
     return {
         "query": query,
         "search_results": search_results[:limit],
         "summary": summary_wt_citations,
+        "context": context,
+        "generation": generation,
     }
 
-def question_command(question: str, limit: int=DEFAULT_SEARCH_LIMIT) -> dict:
-    movies = load_movies()
+def question_command(question: str, limit: int=DEFAULT_SEARCH_LIMIT, token_budget: Optional[int]=DEFAULT_CONTEXT_TOKEN_BUDGET, on_token: Optional[Callable[[str], None]]=None) -> dict:
+    movies = load_documents()
     searcher = HybridSearch(movies)
 
     search_results = searcher.rrf_search(question, RRF_K, limit * SEARCH_MULTIPLIER)
@@ -173,12 +205,122 @@ def question_command(question: str, limit: int=DEFAULT_SEARCH_LIMIT) -> dict:
     if not search_results:
         return {"question": question, "error": "No results found"}
 
-    answer = multi_document_answer(question, search_results, limit)
+    context_results, context = pack_context(search_results, limit, token_budget)
+    answer, generation = generate_timed(question_prompt(question, context_results, limit), on_token)
+
+    return {
+        "question": question,
+        "search_results": search_results[:limit],
+        "answer": answer,
+        "context": context,
+        "generation": generation,
+    }
+
+
+async def retrieve_async(searcher: HybridSearch, query: str, limit: int, executor: Optional[Executor] = None) -> list[dict]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, searcher.rrf_search, query, RRF_K, limit * SEARCH_MULTIPLIER)
+
+async def load_searcher_async(executor: Optional[Executor] = None) -> HybridSearch:
+    loop = asyncio.get_running_loop()
+    movies = await loop.run_in_executor(executor, load_documents)
+    return await loop.run_in_executor(executor, HybridSearch, movies)
+
+async def rag_async(query: str, searcher: HybridSearch, limit: int=DEFAULT_SEARCH_LIMIT, executor: Optional[Executor] = None, token_budget: Optional[int] = DEFAULT_CONTEXT_TOKEN_BUDGET) -> dict:
+    search_results = await retrieve_async(searcher, query, limit, executor)
+
+    if not search_results:
+        return {
+            "query": query,
+            "search_results": [],
+            "error": "No results found"
+        }
+
+    context_results, context = pack_context(search_results, DEFAULT_SEARCH_LIMIT, token_budget)
+    answer = await generate_async(answer_prompt(context_results, query, DEFAULT_SEARCH_LIMIT))
+
+    return {
+        "query": query,
+        "search_results": search_results,
+        "answer": answer,
+        "context": context,
+    }
+
+async def summarize_async(query: str, searcher: HybridSearch, limit: int=DEFAULT_SEARCH_LIMIT, executor: Optional[Executor] = None, token_budget: Optional[int] = DEFAULT_CONTEXT_TOKEN_BUDGET) -> dict:
+    search_results = await retrieve_async(searcher, query, limit, executor)
+
+    if not search_results:
+        return {"query": query, "error": "No results found"}
+
+    context_results, context = pack_context(search_results, limit, token_budget)
+    summary = await generate_async(summary_prompt(query, context_results, limit))
+
+    return {
+        "query": query,
+        "search_results": search_results[:limit],
+        "summary": summary,
+        "context": context,
+    }
+
+async def citations_async(query: str, searcher: HybridSearch, limit: int=DEFAULT_SEARCH_LIMIT, executor: Optional[Executor] = None, token_budget: Optional[int] = DEFAULT_CONTEXT_TOKEN_BUDGET) -> dict:
+    search_results = await retrieve_async(searcher, query, limit, executor)
+
+    if not search_results:
+        return {"query": query, "error": "No results found"}
+
+    context_results, context = pack_context(search_results, limit, token_budget)
+    summary_wt_citations = await generate_async(citations_prompt(query, context_results, limit))
+
+    return {
+        "query": query,
+        "search_results": search_results[:limit],
+        "summary": summary_wt_citations,
+        "context": context,
+    }
+
+async def question_async(question: str, searcher: HybridSearch, limit: int=DEFAULT_SEARCH_LIMIT, executor: Optional[Executor] = None, token_budget: Optional[int] = DEFAULT_CONTEXT_TOKEN_BUDGET) -> dict:
+    search_results = await retrieve_async(searcher, question, limit, executor)
+
+    if not search_results:
+        return {"question": question, "error": "No results found"}
+
+    context_results, context = pack_context(search_results, limit, token_budget)
+    answer = await generate_async(question_prompt(question, context_results, limit))
 
     return {
         "question": question,
         "search_results": search_results[:limit],
-        "answer": answer
+        "answer": answer,
+        "context": context,
     }
 
+RAG_PIPELINES = {
+    "rag": rag_async,
+    "summarize": summarize_async,
+    "citations": citations_async,
+    "question": question_async,
+}
+
+async def batch_rag_async(queries: list[str], mode: str = "rag", limit: int=DEFAULT_SEARCH_LIMIT, max_concurrency: int=DEFAULT_RAG_CONCURRENCY, token_budget: Optional[int] = DEFAULT_CONTEXT_TOKEN_BUDGET) -> list[dict]:
+    if mode not in RAG_PIPELINES:
+        raise ValueError(f"Unknown RAG mode: {mode}")
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+
+    pipeline = RAG_PIPELINES[mode]
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        searcher = await load_searcher_async(executor)
+
+        async def run_one(query: str) -> dict:
+            async with semaphore:
+                try:
+                    return await pipeline(query, searcher, limit, executor, token_budget)
+                except Exception as e:
+                    return {"query": query, "search_results": [], "error": str(e)}
+
+        return await asyncio.gather(*(run_one(query) for query in queries))
 
+def batch_rag_command(queries: list[str], mode: str = "rag", limit: int=DEFAULT_SEARCH_LIMIT, max_concurrency: int=DEFAULT_RAG_CONCURRENCY, token_budget: Optional[int] = DEFAULT_CONTEXT_TOKEN_BUDGET) -> list[dict]:
+    return asyncio.run(batch_rag_async(queries, mode, limit, max_concurrency, token_budget))
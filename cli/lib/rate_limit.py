@@ -0,0 +1,134 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from .search_utils import LLM_BACKOFF_BASE, LLM_BACKOFF_MAX, LLM_MAX_RETRIES
+
+T = TypeVar("T")
+
+
+class RateLimitTimeout(TimeoutError):
+    """Waiting for a rate-limit token would run past the caller's deadline; retrying cannot help."""
+
+
+class TokenBucket:
+    """Token bucket that refills `rate` tokens per second up to `capacity`; a `rate` of None never waits.
+
+    Safe to share between threads and event loops. A caller takes its token
+    at once, running the bucket into debt when it is empty, and then sleeps
+    until that debt is refilled, so concurrent callers are spaced `1 / rate`
+    apart without holding the lock while they wait.
+    """
+
+    def __init__(self, rate: Optional[float], capacity: Optional[float] = None) -> None:
+        self._lock = threading.Lock()
+        self.configure(rate, capacity)
+
+    def configure(self, rate: Optional[float], capacity: Optional[float] = None) -> None:
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive")
+        with self._lock:
+            self.rate = rate
+            self.capacity = capacity if capacity is not None else max(1.0, rate or 1.0)
+            self.tokens = self.capacity
+            self.updated_at = time.monotonic()
+
+    def reserve(self, deadline: Optional[float] = None) -> float:
+        """Take a token and return how long to wait before using it.
+
+        Raises RateLimitTimeout, without taking the token, if the wait would
+        run past the time.monotonic() `deadline`.
+        """
+        with self._lock:
+            if self.rate is None:
+                return 0.0
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            delay = max(0.0, (1 - self.tokens) / self.rate)
+            if deadline is not None and now + delay >= deadline:
+                raise RateLimitTimeout("LLM deadline would pass waiting for the rate limit")
+            self.tokens -= 1
+            return delay
+
+    def wait(self, deadline: Optional[float] = None) -> None:
+        delay = self.reserve(deadline)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire(self, deadline: Optional[float] = None) -> None:
+        delay = self.reserve(deadline)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def is_retryable(error: Exception) -> bool:
+    import httpx
+    from google.genai import errors
+
+    if isinstance(error, RateLimitTimeout):
+        return False
+    if isinstance(error, errors.APIError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (httpx.TransportError, TimeoutError, ConnectionError))
+
+
+def backoff_delay(attempt: int, base: float = LLM_BACKOFF_BASE, cap: float = LLM_BACKOFF_MAX) -> float:
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def time_left(deadline: Optional[float]) -> Optional[float]:
+    """Seconds until the time.monotonic() `deadline`, never negative; None without a deadline."""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def describe_error(error: Exception) -> str:
+    return f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+
+
+def retry_delay(error: Exception, attempt: int, max_retries: int, deadline: Optional[float]) -> Optional[float]:
+    """Seconds to wait before retrying after `error`, or None to give up."""
+    if attempt >= max_retries or not is_retryable(error):
+        return None
+    delay = backoff_delay(attempt)
+    if deadline is not None and time.monotonic() + delay >= deadline:
+        return None
+    return delay
+
+
+def retry(
+    call: Callable[[], T],
+    max_retries: int = LLM_MAX_RETRIES,
+    deadline: Optional[float] = None,
+) -> T:
+    attempt = 0
+    while True:
+        try:
+            return call()
+        except Exception as e:
+            delay = retry_delay(e, attempt, max_retries, deadline)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+
+
+async def retry_async(
+    call: Callable[[], Awaitable[T]],
+    max_retries: int = LLM_MAX_RETRIES,
+    deadline: Optional[float] = None,
+) -> T:
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except Exception as e:
+            delay = retry_delay(e, attempt, max_retries, deadline)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
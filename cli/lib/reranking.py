@@ -1,22 +1,44 @@
-import os
+from __future__ import annotations
+
+import re
 import json
+import time
+import heapq
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional
 
-from dotenv import load_dotenv
-from google import genai
-from time import sleep
-from sentence_transformers import CrossEncoder
+from .llm_client import generate_content, generate_content_async
+from .rate_limit import describe_error, is_retryable, time_left
+from .search_utils import (
+    CROSS_ENCODER_BATCH_SIZE,
+    CROSS_ENCODER_CACHE_SIZE,
+    CROSS_ENCODER_MAX_LENGTH,
+    CROSS_ENCODER_MODEL,
+    CROSS_ENCODER_RESERVE,
+    DEFAULT_RERANK_CONCURRENCY,
+    MIN_LLM_STAGE_BUDGET,
+)
+from .tracing import span
 
-load_dotenv()
-api_key =  os.environ.get("gemini_api_key")
-client = genai.Client(api_key=api_key)
-model = "gemini-2.0-flash"
-cross_encoder = CrossEncoder("cross-encoder/ms-marco-TinyBERT-L2-v2")
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder
 
+SCORE_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+RERANK_METHODS = ("individual", "batch", "cross_encoder")
+LLM_RERANK_METHODS = ("individual", "batch")
 
-def llm_rerank_individual(query: str, documents: list[dict], limit: int = 5) -> list[dict]:
-    scored_docs = []
-    for doc in documents:
-        prompt = f"""Rate how well this movie matches the search query.
+
+def parse_score(text: str, low: float = 0, high: float = 10) -> float:
+    match = SCORE_PATTERN.search(text or "")
+    if not match:
+        return low
+    return min(high, max(low, float(match.group())))
+
+
+def individual_rerank_prompt(query: str, doc: dict) -> str:
+    return f"""Rate how well this movie matches the search query.
 
 Query: "{query}"
 Movie: {doc.get("title", "")} - {doc.get("document", "")}
@@ -30,16 +52,42 @@ Rate 0-10 (10 = perfect match).
 Give me ONLY the number in your response, no other text or explanation.
 
 Score:"""
-        resp = client.models.generate_content(model=model, contents=prompt)
-        score_text = (resp.text or "").strip()
-        score = int(score_text)
-        scored_docs.append({**doc, "individual_score": score})
-        sleep(3)
-    
+
+
+async def llm_rerank_individual_async(
+    query: str,
+    documents: list[dict],
+    limit: int = 5,
+    max_concurrency: int = DEFAULT_RERANK_CONCURRENCY,
+    timeout: Optional[float] = None,
+) -> list[dict]:
+    """Score every document with its own LLM call, at most `max_concurrency` in flight.
+
+    Requests are paced by the process-wide rate limit in llm_client.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def score_document(doc: dict) -> dict:
+        prompt = individual_rerank_prompt(query, doc)
+        async with semaphore:
+            resp = await generate_content_async(prompt, "rerank", timeout=timeout)
+        return {**doc, "individual_score": parse_score(resp.text)}
+
+    scored_docs = await asyncio.wait_for(asyncio.gather(*(score_document(doc) for doc in documents)), timeout)
     scored_docs.sort(key=lambda item:item["individual_score"], reverse=True)
     return scored_docs[:limit]
 
-def llm_rerank_batch(query: str, documents: list[dict], limit: int = 5) -> list[dict]:
+
+def llm_rerank_individual(
+    query: str,
+    documents: list[dict],
+    limit: int = 5,
+    max_concurrency: int = DEFAULT_RERANK_CONCURRENCY,
+    timeout: Optional[float] = None,
+) -> list[dict]:
+    return asyncio.run(llm_rerank_individual_async(query, documents, limit, max_concurrency, timeout))
+
+def llm_rerank_batch(query: str, documents: list[dict], limit: int = 5, timeout: Optional[float] = None) -> list[dict]:
     if not documents:
         return []
     
@@ -65,7 +113,7 @@ Return ONLY the IDs in order of relevance (best match first). Return a valid JSO
 
 [75, 12, 34, 2, 1]
 """
-    resp = client.models.generate_content(model=model, contents=prompt)
+    resp = generate_content(prompt, "rerank", timeout=timeout)
     ranking_text = (resp.text or "").strip()
 
     parsed_ids = json.loads(ranking_text)
@@ -76,26 +124,208 @@ Return ONLY the IDs in order of relevance (best match first). Return a valid JSO
             reranked.append({**doc_map[doc_id], "batch_rank": i + 1})
     return reranked[:limit]
 
-def cross_encoder_rerank(query: str, documents: list[dict], limit: int = 5) -> list[dict]:
-    pairs = []
-    for doc in documents:
-        pairs.append([query, f"{doc.get("title", "")} - {doc.get("document", "")}"])
-    
-    scores = cross_encoder.predict(pairs)
+class CrossEncoderReranker:
+    """Scores (query, document) pairs with a cross-encoder loaded on first use.
 
-    for doc, score in zip(documents, scores):
-        doc["crossencoder_score"] = float(score)
-    
-    documents.sort(key=lambda item:item["crossencoder_score"], reverse=True)
-    return documents[:limit]
+    Scores are kept in an LRU cache keyed by query, document id and a hash of
+    the document text, so repeated candidates are not sent to the model again.
+    """
+
+    def __init__(
+        self,
+        model_name: str = CROSS_ENCODER_MODEL,
+        max_length: int = CROSS_ENCODER_MAX_LENGTH,
+        cache_size: int = CROSS_ENCODER_CACHE_SIZE,
+    ) -> None:
+        self.model_name = model_name
+        self.max_length = max_length
+        self.cache_size = cache_size
+        self._model = None
+        self.cache: OrderedDict[tuple, float] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def model(self) -> CrossEncoder:
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+
+            self._model = CrossEncoder(self.model_name, max_length=self.max_length)
+        return self._model
+
+    def score(self, query: str, documents: list[dict], batch_size: int = CROSS_ENCODER_BATCH_SIZE) -> list[float]:
+        texts = [f"{doc.get("title", "")} - {doc.get("document", "")}" for doc in documents]
+        keys = [
+            (query, doc.get("id"), hashlib.sha1(text.encode("utf-8")).hexdigest())
+            for doc, text in zip(documents, texts)
+        ]
+
+        scores: list[float | None] = []
+        missing = {}
+        for i, key in enumerate(keys):
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                scores.append(self.cache[key])
+                self.hits += 1
+            else:
+                scores.append(None)
+                missing.setdefault(key, []).append(i)
 
-def rerank(query: str, documents: list[dict], method: str = "batch", limit: int = 5) -> list[dict]:
+        if missing:
+            self.misses += len(missing)
+            pairs = [[query, texts[positions[0]]] for positions in missing.values()]
+            predicted = self.model.predict(pairs, batch_size=batch_size)
+            for (key, positions), score in zip(missing.items(), predicted):
+                for i in positions:
+                    scores[i] = float(score)
+                self.cache[key] = float(score)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return scores
+
+    def rerank(
+        self,
+        query: str,
+        documents: list[dict],
+        limit: int = 5,
+        batch_size: int = CROSS_ENCODER_BATCH_SIZE,
+    ) -> list[dict]:
+        if not documents:
+            return []
+        scores = self.score(query, documents, batch_size)
+        top = heapq.nlargest(limit, range(len(documents)), key=lambda i: scores[i])
+        return [{**documents[i], "crossencoder_score": scores[i]} for i in top]
+
+
+cross_encoder = CrossEncoderReranker()
+
+
+def cross_encoder_rerank(
+    query: str,
+    documents: list[dict],
+    limit: int = 5,
+    batch_size: int = CROSS_ENCODER_BATCH_SIZE,
+) -> list[dict]:
+    return cross_encoder.rerank(query, documents, limit, batch_size)
+
+def rerank(
+    query: str,
+    documents: list[dict],
+    method: str = "batch",
+    limit: int = 5,
+    timeout: Optional[float] = None,
+    concurrency: int = DEFAULT_RERANK_CONCURRENCY,
+) -> list[dict]:
+    with span("rerank", method=method, candidates=len(documents)):
+        return _rerank(query, documents, method, limit, timeout, concurrency)
+
+
+def _rerank(query: str, documents: list[dict], method: str, limit: int, timeout: Optional[float], concurrency: int) -> list[dict]:
     if method == "individual":
-        return llm_rerank_individual(query, documents, limit)
+        return llm_rerank_individual(query, documents, limit, concurrency, timeout=timeout)
     if method == "batch":
-        return llm_rerank_batch(query, documents, limit)
+        return llm_rerank_batch(query, documents, limit, timeout)
     if method == "cross_encoder":
         return cross_encoder_rerank(query, documents, limit)
     else:
         return documents[:limit]
 
+
+def rerank_within_deadline(
+    query: str,
+    documents: list[dict],
+    method: str,
+    limit: int,
+    deadline: Optional[float] = None,
+    concurrency: int = DEFAULT_RERANK_CONCURRENCY,
+) -> tuple[list[dict], Optional[dict]]:
+    """Rerank unless the time.monotonic() `deadline` gets in the way.
+
+    An LLM method is swapped for the cross-encoder when less than
+    MIN_LLM_STAGE_BUDGET is left, or when its calls time out or keep failing;
+    with no time left at all the documents keep their incoming order. The LLM
+    calls only get the time beyond CROSS_ENCODER_RESERVE, so a timed-out
+    stage still leaves the cross-encoder time to run.
+    Returns the documents and, if the stage was degraded, why and what ran instead.
+    """
+    left = time_left(deadline)
+    if left is None:
+        return rerank(query, documents, method=method, limit=limit, concurrency=concurrency), None
+
+    reason = None
+    if method in LLM_RERANK_METHODS:
+        budget = left - CROSS_ENCODER_RESERVE
+        if budget < MIN_LLM_STAGE_BUDGET:
+            reason = f"{left:.2f}s left"
+        else:
+            try:
+                return rerank(query, documents, method=method, limit=limit, timeout=budget, concurrency=concurrency), None
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                reason = describe_error(e)
+        left = time_left(deadline)
+        fallback = "cross_encoder" if left > 0 else "none"
+    else:
+        fallback = method if left > 0 else "none"
+        if fallback == "none":
+            reason = "deadline exceeded"
+
+    documents = rerank(query, documents, method=fallback, limit=limit)
+    if reason is None:
+        return documents, None
+    return documents, {"stage": f"rerank:{method}", "reason": reason, "fallback": fallback}
+
+
+def parse_cascade(spec: str) -> list[tuple[str, int]]:
+    """Parse a cascade such as "rrf:100,cross_encoder:20,batch:5" into (method, width) stages.
+
+    Only the first stage may be "rrf", which sets the retrieval depth; every
+    other stage is a rerank method and must not be wider than the one before.
+    """
+    stages = []
+    for part in spec.split(","):
+        method, sep, width = part.strip().partition(":")
+        if not sep or not width.strip().isdigit() or int(width) < 1:
+            raise ValueError(f"invalid cascade stage '{part.strip()}', expected method:width")
+        method = method.strip()
+        if method == "rrf" and stages:
+            raise ValueError("rrf can only be the first cascade stage")
+        if method != "rrf" and method not in RERANK_METHODS:
+            raise ValueError(f"unknown rerank method '{method}', expected one of {', '.join(RERANK_METHODS)}")
+        if stages and int(width) > stages[-1][1]:
+            raise ValueError(f"cascade stage '{part.strip()}' is wider than the stage before it")
+        stages.append((method, int(width)))
+    if not stages:
+        raise ValueError("empty cascade")
+    return stages
+
+
+def cascade_rerank(
+    query: str,
+    documents: list[dict],
+    stages: list[tuple[str, int]],
+    deadline: Optional[float] = None,
+    concurrency: int = DEFAULT_RERANK_CONCURRENCY,
+) -> tuple[list[dict], list[dict]]:
+    """Run each rerank stage on the survivors of the one before.
+
+    Returns the final documents and, per stage, its candidates, survivors,
+    latency and how it was degraded to meet `deadline`, if at all.
+    """
+    report = []
+    for method, width in stages:
+        start = time.perf_counter()
+        candidates = len(documents)
+        documents, degraded = rerank_within_deadline(query, documents, method, width, deadline, concurrency)
+        report.append({
+            "method": method,
+            "width": width,
+            "candidates": candidates,
+            "survivors": len(documents),
+            "latency": time.perf_counter() - start,
+            "degraded": degraded,
+        })
+    return documents, report
+
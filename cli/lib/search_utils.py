@@ -2,35 +2,129 @@ import json
 import os
 from typing import Any
 
+from .tracing import span
+
 DEFAULT_ALPHA = 0.5
 RRF_K = 60
 SEARCH_MULTIPLIER = 5
+# Each retriever returns limit * CANDIDATE_MULTIPLIER candidates for fusion.
+CANDIDATE_MULTIPLIER = 500
 
 DEFAULT_SEARCH_LIMIT = 5
 DOCUMENT_PREVIEW_LENGTH = 100
 SCORE_PRECISION = 3
 
+DEFAULT_RAG_CONCURRENCY = 4
+DEFAULT_CONTEXT_TOKEN_BUDGET = 1200
+CHARS_PER_TOKEN = 4
+DEFAULT_SHARD_COUNT = 4
+DEFAULT_BENCHMARK_REPEAT = 5
+DEFAULT_BASELINE_NAME = "main"
+# A benchmark regresses when it is this much worse than the worst of its
+# baseline runs, worse by at least the absolute minimum, and the bootstrap
+# test finds the slowdown significant at BENCHMARK_SIGNIFICANCE
+# (Bonferroni-corrected over every check) in each of BENCHMARK_COMPARE_ROUNDS
+# fresh processes. Baselines record that many runs too.
+BENCHMARK_REGRESSION_THRESHOLD = 0.10
+BENCHMARK_MIN_DELTA_MS = 1.0
+BENCHMARK_MIN_DELTA_MB = 1.0
+BENCHMARK_SIGNIFICANCE = 0.05
+BENCHMARK_BOOTSTRAP_SAMPLES = 2000
+BENCHMARK_COMPARE_ROUNDS = 3
+MEMORY_REPORT_SCALES = (2, 10, 100)
+DEFAULT_LOAD_CONCURRENCY = 4
+# Open-loop replay never has more requests in flight than this.
+LOAD_MAX_WORKERS = 64
+LOAD_LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+PROFILE_INTERVAL = 0.005
+PROFILE_TOP = 20
+# Slowest acceptable import time for any CLI, and the modules none may import just to start.
+STARTUP_IMPORT_BUDGET = 0.5
+STARTUP_REPEAT = 3
+STARTUP_HEAVY_MODULES = ("torch", "sentence_transformers", "google.genai", "nltk", "httpx", "PIL")
+
+LLM_MODEL = "gemini-2.0-flash"
+LLM_TIMEOUT = 30.0
+LLM_MAX_CONNECTIONS = 20
+
+# Requests per second every Gemini call in the process shares, whatever the stage.
+LLM_RPS = 5.0
+DEFAULT_RERANK_CONCURRENCY = 5
+LLM_MAX_RETRIES = 4
+LLM_BACKOFF_BASE = 0.5
+LLM_BACKOFF_MAX = 8.0
+# Least time left on a request deadline for an optional LLM stage to be started.
+MIN_LLM_STAGE_BUDGET = 1.0
+# Time an LLM rerank stage leaves unused so the cross-encoder can still
+# replace it if its calls time out.
+CROSS_ENCODER_RESERVE = 0.5
+
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-TinyBERT-L2-v2"
+CROSS_ENCODER_BATCH_SIZE = 32
+CROSS_ENCODER_MAX_LENGTH = 256
+CROSS_ENCODER_CACHE_SIZE = 4096
+
+LLM_CACHE_TTL = 7 * 24 * 60 * 60
+LLM_CACHE_MAX_BYTES = 64 * 1024 * 1024
+LLM_CACHE_MODE = os.environ.get("LLM_CACHE_MODE", "readwrite")
+
+# EMBEDDING_MODEL=random swaps the sentence-transformer for seeded random
+# unit vectors, so synthetic corpora can be embedded without the model.
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+RANDOM_EMBEDDING_MODEL = "random"
+RANDOM_EMBEDDING_DIM = 384
+
+SYNTHETIC_VOCAB_SIZE = 20000
+SYNTHETIC_ZIPF_EXPONENT = 1.1
+SYNTHETIC_QUERY_COUNT = 50
+SYNTHETIC_BATCH_SIZE = 10000
+
+SEMANTIC_CACHE_MODEL = EMBEDDING_MODEL
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_MAX_ENTRIES = 1000
+# Enhancement methods whose cached output may be reused for a merely similar
+# query. A spelling fix or rewrite belongs to the exact wording it was made
+# for, so those only ever hit on the normalized query text.
+SEMANTIC_CACHE_FUZZY_METHODS = ("expand",)
+
 BM25_K1 = 1.5
 BM25_B = 0.75
 
+# Filter fields with more distinct values than this keep sorted position
+# arrays instead of one N/8-byte bitset per value.
+FILTER_BITSET_MAX_VALUES = 256
+
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-DATA_PATH = os.path.join(PROJECT_ROOT, "data", "movies.json")
-GOLDEN_DATASET_PATH = os.path.join(PROJECT_ROOT, "data", "golden_dataset.json")
-STOPWORDS_PATH = os.path.join(PROJECT_ROOT, "data", "stopwords.txt")
+DATA_DIR = os.environ.get("SEARCH_DATA_DIR", os.path.join(PROJECT_ROOT, "data"))
+DATA_PATH = os.path.join(DATA_DIR, "movies.json")
+GOLDEN_DATASET_PATH = os.path.join(DATA_DIR, "golden_dataset.json")
+STOPWORDS_PATH = os.path.join(DATA_DIR, "stopwords.txt")
+BASELINES_DIR = os.environ.get("SEARCH_BASELINES_DIR", os.path.join(PROJECT_ROOT, "benchmarks"))
 
-CACHE_DIR = os.path.join(PROJECT_ROOT, "cache")
+CACHE_DIR = os.environ.get("SEARCH_CACHE_DIR", os.path.join(PROJECT_ROOT, "cache"))
 
 DEFAULT_CHUNK_SIZE = 200
 DEFAULT_CHUNK_OVERLAP = 1
 DEFAULT_SEMANTIC_CHUNK_SIZE = 4
 
-MOVIE_EMBEDDINGS_PATH = os.path.join(CACHE_DIR, "movie_embeddings.npy")
-CHUNK_EMBEDDINGS_PATH = os.path.join(CACHE_DIR, "chunk_embeddings.npy")
-CHUNK_METADATA_PATH = os.path.join(CACHE_DIR, "chunk_metadata.json")
+SNAPSHOTS_DIR = os.path.join(CACHE_DIR, "snapshots")
+CURRENT_SNAPSHOT_PATH = os.path.join(CACHE_DIR, "current")
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, "llm_cache.sqlite")
+SEMANTIC_CACHE_PATH = os.path.join(CACHE_DIR, "enhancement_cache.pkl")
+SNAPSHOT_RETENTION = 3
+
+DOCSTORE_ARTIFACT = "docstore.bin"
+INDEX_ARTIFACT = "index.pkl"
+TERM_FREQUENCIES_ARTIFACT = "term_frequencies.pkl"
+DOC_LENGTHS_ARTIFACT = "doc_lengths.pkl"
+FILTERS_ARTIFACT = "filters.pkl"
+MOVIE_EMBEDDINGS_ARTIFACT = "movie_embeddings.npy"
+CHUNK_EMBEDDINGS_ARTIFACT = "chunk_embeddings.npy"
+CHUNK_METADATA_ARTIFACT = "chunk_metadata.json"
 
 
 def load_movies() -> list[dict]:
-    with open(DATA_PATH, "r") as f:
+    with span("corpus load", "io"), open(DATA_PATH, "r") as f:
         data = json.load(f)
     return data["movies"]
 
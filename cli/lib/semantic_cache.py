@@ -0,0 +1,203 @@
+import os
+import pickle
+import threading
+import time
+import uuid
+from typing import Optional
+
+import numpy as np
+
+from .search_utils import (
+    SEMANTIC_CACHE_FUZZY_METHODS,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_MODEL,
+    SEMANTIC_CACHE_PATH,
+    SEMANTIC_CACHE_THRESHOLD,
+)
+from .semantic_search import get_model
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class SemanticCache:
+    """Maps queries to earlier results, one namespace per enhancement method.
+
+    A lookup first tries the normalized query text. Namespaces listed in
+    `fuzzy_namespaces` then fall back to the closest cached query by cosine
+    similarity, returning its value at or above `threshold`; the others only
+    ever hit exactly. Each namespace keeps at most `max_entries`, evicting the
+    least recently used. Hit and miss counters are per process.
+
+    `path` is a stream of pickles: an optional snapshot of every namespace
+    followed by one record per insert, so a put appends a single record
+    instead of rewriting the file. Once the appended records outnumber the
+    live entries the file is compacted back into a snapshot.
+    """
+
+    def __init__(
+        self,
+        path: str = SEMANTIC_CACHE_PATH,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        model_name: str = SEMANTIC_CACHE_MODEL,
+        fuzzy_namespaces: tuple[str, ...] = SEMANTIC_CACHE_FUZZY_METHODS,
+    ) -> None:
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.model_name = model_name
+        self.fuzzy_namespaces = fuzzy_namespaces
+        self.namespaces: Optional[dict[str, dict]] = None
+        self.appended = 0
+        self.hits = 0
+        self.exact_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def embed(self, query: str) -> np.ndarray:
+        embedding = np.asarray(get_model(self.model_name).encode([query])[0], dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+
+    def _load(self) -> dict[str, dict]:
+        if self.namespaces is None:
+            self.namespaces = {}
+            self.appended = 0
+            if os.path.exists(self.path):
+                with open(self.path, "rb") as f:
+                    while True:
+                        try:
+                            record = pickle.load(f)
+                        except EOFError:
+                            break
+                        except pickle.UnpicklingError:
+                            # A writer died mid-append; compact on the next put so the torn tail is dropped.
+                            self.appended = self._entry_count() + 1
+                            break
+                        if isinstance(record, dict):
+                            self.namespaces = record
+                        else:
+                            self._insert(*record)
+                            self.appended += 1
+        return self.namespaces
+
+    def _entry_count(self) -> int:
+        return sum(len(namespace["queries"]) for namespace in self.namespaces.values())
+
+    def _namespace(self, name: str) -> dict:
+        return self._load().setdefault(
+            name,
+            {"queries": [], "values": [], "last_used": [], "embeddings": None},
+        )
+
+    def _insert(self, name: str, key: str, value: str, last_used: float, embedding: Optional[np.ndarray]) -> None:
+        namespace = self._namespace(name)
+        if key in namespace["queries"]:
+            return
+
+        if len(namespace["queries"]) >= self.max_entries:
+            oldest = int(np.argmin(namespace["last_used"]))
+            for field in ("queries", "values", "last_used"):
+                del namespace[field][oldest]
+            if namespace["embeddings"] is not None:
+                namespace["embeddings"] = np.delete(namespace["embeddings"], oldest, axis=0)
+
+        namespace["queries"].append(key)
+        namespace["values"].append(value)
+        namespace["last_used"].append(last_used)
+        if embedding is not None:
+            if namespace["embeddings"] is None:
+                namespace["embeddings"] = embedding[np.newaxis, :]
+            else:
+                namespace["embeddings"] = np.vstack([namespace["embeddings"], embedding])
+
+    def get(self, name: str, query: str) -> Optional[str]:
+        key = normalize_query(query)
+        with self._lock:
+            namespace = self._namespace(name)
+            if key in namespace["queries"]:
+                i = namespace["queries"].index(key)
+                namespace["last_used"][i] = time.time()
+                self.hits += 1
+                self.exact_hits += 1
+                return namespace["values"][i]
+            if name not in self.fuzzy_namespaces or namespace["embeddings"] is None:
+                self.misses += 1
+                return None
+
+        embedding = self.embed(key)
+        with self._lock:
+            embeddings = namespace["embeddings"]
+            if embeddings is None or len(embeddings) == 0:
+                self.misses += 1
+                return None
+            similarities = embeddings @ embedding
+            i = int(np.argmax(similarities))
+            if similarities[i] < self.threshold:
+                self.misses += 1
+                return None
+            namespace["last_used"][i] = time.time()
+            self.hits += 1
+            return namespace["values"][i]
+
+    def put(self, name: str, query: str, value: str) -> None:
+        key = normalize_query(query)
+        embedding = self.embed(key) if name in self.fuzzy_namespaces else None
+        with self._lock:
+            if key in self._namespace(name)["queries"]:
+                return
+            record = (name, key, value, time.time(), embedding)
+            self._insert(*record)
+            if self.appended >= max(self._entry_count(), 1):
+                self._save()
+            else:
+                self._append(record)
+
+    def _append(self, record: tuple) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(pickle.dumps(record))
+        self.appended += 1
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.namespaces, f)
+        os.replace(tmp_path, self.path)
+        self.appended = 0
+
+    def clear(self) -> int:
+        with self._lock:
+            removed = sum(len(namespace["queries"]) for namespace in self._load().values())
+            self.namespaces = {}
+            self._save()
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = {name: len(namespace["queries"]) for name, namespace in self._load().items() if namespace["queries"]}
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "threshold": self.threshold,
+            "max_entries": self.max_entries,
+            "entries": entries,
+            "hits": self.hits,
+            "exact_hits": self.exact_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+enhancement_cache = SemanticCache()
+
+
+def semantic_cache_stats_command() -> dict:
+    return enhancement_cache.stats()
+
+
+def semantic_cache_clear_command() -> dict:
+    return {"removed": enhancement_cache.clear(), **enhancement_cache.stats()}
@@ -1,63 +1,131 @@
+from __future__ import annotations
+
+import hashlib
 import json
-import os
 import re
+from typing import TYPE_CHECKING, Optional
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
 from .search_utils import (
-    CHUNK_EMBEDDINGS_PATH,
-    CHUNK_METADATA_PATH,
+    CHUNK_EMBEDDINGS_ARTIFACT,
+    CHUNK_METADATA_ARTIFACT,
     DEFAULT_CHUNK_OVERLAP,
     DEFAULT_CHUNK_SIZE,
     DEFAULT_SEARCH_LIMIT,
     DEFAULT_SEMANTIC_CHUNK_SIZE,
     DOCUMENT_PREVIEW_LENGTH,
-    MOVIE_EMBEDDINGS_PATH,
+    EMBEDDING_MODEL,
+    MOVIE_EMBEDDINGS_ARTIFACT,
+    RANDOM_EMBEDDING_DIM,
+    RANDOM_EMBEDDING_MODEL,
     format_search_result,
-    load_movies,
 )
+from .metadata_filter import BitmapIndex
+from .docstore import load_documents
+from .snapshot import SnapshotBuilder, current_snapshot, resolve_artifact
+from .tracing import span, traced
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+_models: dict[str, SentenceTransformer] = {}
+
+
+class RandomEmbedder:
+    """Stand-in for a SentenceTransformer that maps each text to a seeded random unit vector.
+
+    The same text always gets the same vector, so indexes built with it are
+    reproducible, but similarities carry no meaning: it exists to build and
+    query large synthetic corpora without running the model.
+    """
+
+    def __init__(self, dim: int = RANDOM_EMBEDDING_DIM) -> None:
+        self.dim = dim
+
+    def encode(self, sentences, **kwargs) -> np.ndarray:
+        texts = [sentences] if isinstance(sentences, str) else list(sentences)
+        embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha1(str(text).encode("utf-8")).digest()[:8], "little")
+            embeddings[i] = np.random.default_rng(seed).standard_normal(self.dim)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings[0] if isinstance(sentences, str) else embeddings
+
+
+def get_model(model_name: str) -> SentenceTransformer:
+    """Load each sentence-transformer once per process and share it."""
+    if model_name not in _models:
+        if model_name == RANDOM_EMBEDDING_MODEL:
+            _models[model_name] = RandomEmbedder()
+        else:
+            from sentence_transformers import SentenceTransformer
+
+            _models[model_name] = SentenceTransformer(model_name)
+    return _models[model_name]
 
 
 class SemanticSearch:
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        self.model_name = model_name
+        self._model = None
         self.embeddings = None
         self.documents = None
-        self.document_map = {}
+        self.filters = BitmapIndex()
+        self.query_embeddings: dict[str, np.ndarray] = {}
+
+    @property
+    def model(self) -> SentenceTransformer:
+        if self._model is None:
+            self._model = get_model(self.model_name)
+        return self._model
 
+    @traced("query encode")
     def generate_embedding(self, text):
         if not text or not text.strip():
             raise ValueError("cannot generate embedding for empty text")
+        if text in self.query_embeddings:
+            return self.query_embeddings[text]
         return self.model.encode([text])[0]
 
-    def build_embeddings(self, documents):
+    def encode_queries(self, queries: list[str]) -> None:
+        """Encode `queries` in one batch, so searching for any of them later skips the model."""
+        texts = [query for query in dict.fromkeys(queries) if query and query.strip() and query not in self.query_embeddings]
+        if texts:
+            self.query_embeddings.update(zip(texts, self.model.encode(texts)))
+
+    def snapshot_params(self) -> dict:
+        return {"model": self.model_name}
+
+    def build_embeddings(self, documents, snapshot: Optional[SnapshotBuilder] = None):
+        if snapshot is None:
+            with SnapshotBuilder() as snapshot:
+                return self.build_embeddings(documents, snapshot)
+
         self.documents = documents
-        self.document_map = {}
         movie_strings = []
         for doc in documents:
-            self.document_map[doc["id"]] = doc
             movie_strings.append(f"{doc['title']}: {doc['description']}")
         self.embeddings = self.model.encode(movie_strings, show_progress_bar=True)
 
-        os.makedirs(os.path.dirname(MOVIE_EMBEDDINGS_PATH), exist_ok=True)
-        np.save(MOVIE_EMBEDDINGS_PATH, self.embeddings)
+        np.save(snapshot.artifact_path(MOVIE_EMBEDDINGS_ARTIFACT), self.embeddings)
+        snapshot.record(MOVIE_EMBEDDINGS_ARTIFACT, self.snapshot_params())
         return self.embeddings
 
+    @traced("embeddings load", "io")
     def load_or_create_embeddings(self, documents):
         self.documents = documents
-        self.document_map = {}
-        for doc in documents:
-            self.document_map[doc["id"]] = doc
+        snapshot = current_snapshot()
+        self.filters.defer_load(snapshot)
 
-        if os.path.exists(MOVIE_EMBEDDINGS_PATH):
-            self.embeddings = np.load(MOVIE_EMBEDDINGS_PATH)
-            if len(self.embeddings) == len(documents):
-                return self.embeddings
+        embeddings_path = resolve_artifact(MOVIE_EMBEDDINGS_ARTIFACT, self.snapshot_params(), snapshot)
+        if embeddings_path is not None:
+            self.embeddings = np.load(embeddings_path)
+            return self.embeddings
 
         return self.build_embeddings(documents)
 
-    def search(self, query, limit=DEFAULT_SEARCH_LIMIT):
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT, filters: Optional[list[str]] = None):
         if self.embeddings is None or self.embeddings.size == 0:
             raise ValueError(
                 "No embeddings loaded. Call `load_or_create_embeddings` first."
@@ -69,16 +137,20 @@ class SemanticSearch:
             )
 
         query_embedding = self.generate_embedding(query)
+        mask = self.filters.mask(filters)
+        candidate_idxs = range(len(self.embeddings)) if mask is None else np.flatnonzero(mask)
 
-        similarities = []
-        for i, doc_embedding in enumerate(self.embeddings):
-            similarity = cosine_similarity(query_embedding, doc_embedding)
-            similarities.append((similarity, self.documents[i]))
+        with span("vector scan"):
+            similarities = []
+            for i in candidate_idxs:
+                similarity = cosine_similarity(query_embedding, self.embeddings[i])
+                similarities.append((similarity, i))
 
-        similarities.sort(key=lambda x: x[0], reverse=True)
+            similarities.sort(key=lambda x: x[0], reverse=True)
 
         results = []
-        for score, doc in similarities[:limit]:
+        for score, i in similarities[:limit]:
+            doc = self.documents[i]
             results.append(
                 {
                     "score": score,
@@ -117,7 +189,7 @@ def embed_text(text):
 
 def verify_embeddings():
     search_instance = SemanticSearch()
-    documents = load_movies()
+    documents = load_documents()
     embeddings = search_instance.load_or_create_embeddings(documents)
     print(f"Number of docs:   {len(documents)}")
     print(
@@ -133,12 +205,12 @@ def embed_query_text(query):
     print(f"Shape: {embedding.shape}")
 
 
-def semantic_search(query, limit=DEFAULT_SEARCH_LIMIT):
+def semantic_search(query, limit=DEFAULT_SEARCH_LIMIT, filters: Optional[list[str]] = None):
     search_instance = SemanticSearch()
-    documents = load_movies()
+    documents = load_documents()
     search_instance.load_or_create_embeddings(documents)
 
-    results = search_instance.search(query, limit)
+    results = search_instance.search(query, limit, filters)
 
     print(f"Query: {query}")
     print(f"Top {len(results)} results:")
@@ -229,16 +301,31 @@ def semantic_chunk_text(
 
 
 class ChunkedSemanticSearch(SemanticSearch):
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2") -> None:
+    def __init__(self, model_name: str = EMBEDDING_MODEL) -> None:
         super().__init__(model_name)
         self.chunk_embeddings = None
         self.chunk_metadata = None
+        self.chunk_movie_idxs = np.array([], dtype=np.int64)
+
+    def set_chunks(self, chunk_embeddings: np.ndarray, chunk_metadata: list[dict]) -> None:
+        """Install chunk embeddings and metadata, with the chunk-to-movie index the filters use."""
+        self.chunk_embeddings = chunk_embeddings
+        self.chunk_metadata = chunk_metadata
+        self.chunk_movie_idxs = np.array([chunk["movie_idx"] for chunk in chunk_metadata], dtype=np.int64)
+
+    def snapshot_params(self) -> dict:
+        return {
+            "model": self.model_name,
+            "max_chunk_size": DEFAULT_SEMANTIC_CHUNK_SIZE,
+            "overlap": DEFAULT_CHUNK_OVERLAP,
+        }
+
+    def build_chunk_embeddings(self, documents: list[dict], snapshot: Optional[SnapshotBuilder] = None) -> np.ndarray:
+        if snapshot is None:
+            with SnapshotBuilder() as snapshot:
+                return self.build_chunk_embeddings(documents, snapshot)
 
-    def build_chunk_embeddings(self, documents: list[dict]) -> np.ndarray:
         self.documents = documents
-        self.document_map = {}
-        for doc in documents:
-            self.document_map[doc["id"]] = doc
 
         all_chunks = []
         chunk_metadata = []
@@ -260,36 +347,37 @@ class ChunkedSemanticSearch(SemanticSearch):
                     {"movie_idx": idx, "chunk_idx": i, "total_chunks": len(chunks)}
                 )
 
-        self.chunk_embeddings = self.model.encode(all_chunks, show_progress_bar=True)
-        self.chunk_metadata = chunk_metadata
+        self.set_chunks(self.model.encode(all_chunks, show_progress_bar=True), chunk_metadata)
 
-        os.makedirs(os.path.dirname(CHUNK_EMBEDDINGS_PATH), exist_ok=True)
-        np.save(CHUNK_EMBEDDINGS_PATH, self.chunk_embeddings)
-        with open(CHUNK_METADATA_PATH, "w") as f:
+        params = self.snapshot_params()
+        np.save(snapshot.artifact_path(CHUNK_EMBEDDINGS_ARTIFACT), self.chunk_embeddings)
+        snapshot.record(CHUNK_EMBEDDINGS_ARTIFACT, params)
+        with open(snapshot.artifact_path(CHUNK_METADATA_ARTIFACT), "w") as f:
             json.dump(
                 {"chunks": chunk_metadata, "total_chunks": len(all_chunks)}, f, indent=2
             )
+        snapshot.record(CHUNK_METADATA_ARTIFACT, params)
 
         return self.chunk_embeddings
 
+    @traced("chunk embeddings load", "io")
     def load_or_create_chunk_embeddings(self, documents: list[dict]) -> np.ndarray:
         self.documents = documents
-        self.document_map = {}
-        for doc in documents:
-            self.document_map[doc["id"]] = doc
-
-        if os.path.exists(CHUNK_EMBEDDINGS_PATH) and os.path.exists(
-            CHUNK_METADATA_PATH
-        ):
-            self.chunk_embeddings = np.load(CHUNK_EMBEDDINGS_PATH)
-            with open(CHUNK_METADATA_PATH, "r") as f:
+        snapshot = current_snapshot()
+        self.filters.defer_load(snapshot)
+
+        params = self.snapshot_params()
+        embeddings_path = resolve_artifact(CHUNK_EMBEDDINGS_ARTIFACT, params, snapshot)
+        metadata_path = resolve_artifact(CHUNK_METADATA_ARTIFACT, params, snapshot)
+        if embeddings_path is not None and metadata_path is not None:
+            with open(metadata_path, "r") as f:
                 data = json.load(f)
-                self.chunk_metadata = data["chunks"]
+            self.set_chunks(np.load(embeddings_path), data["chunks"])
             return self.chunk_embeddings
 
         return self.build_chunk_embeddings(documents)
 
-    def search_chunks(self, query: str, limit: int = 10) -> list[dict]:
+    def search_chunks(self, query: str, limit: int = 10, filters: Optional[list[str]] = None) -> list[dict]:
         if self.chunk_embeddings is None or self.chunk_metadata is None:
             raise ValueError(
                 "No chunk embeddings loaded. Call load_or_create_chunk_embeddings first."
@@ -297,9 +385,38 @@ class ChunkedSemanticSearch(SemanticSearch):
 
         query_embedding = self.generate_embedding(query)
 
+        results = []
+        for movie_idx, score, chunk_scores in self.chunk_movie_scores(query_embedding, limit, filters):
+            doc = self.documents[movie_idx]
+            results.append(
+                format_search_result(
+                    doc_id=doc["id"],
+                    title=doc["title"],
+                    document=doc["description"][:DOCUMENT_PREVIEW_LENGTH],
+                    score=score,
+                    chunk_scores=chunk_scores,
+                )
+            )
+
+        return results
+
+    @traced("vector scan")
+    def chunk_movie_scores(
+        self,
+        query_embedding: np.ndarray,
+        limit: int = 10,
+        filters: Optional[list[str]] = None,
+    ) -> list[tuple[int, float, dict[int, float]]]:
+        """Top movies by their best chunk, with every chunk's score keyed by its index in the movie."""
+        mask = self.filters.mask(filters)
+        if mask is None:
+            candidate_idxs = range(len(self.chunk_embeddings))
+        else:
+            candidate_idxs = np.flatnonzero(mask[self.chunk_movie_idxs])
+
         chunk_scores = []
-        for i, chunk_embedding in enumerate(self.chunk_embeddings):
-            similarity = cosine_similarity(query_embedding, chunk_embedding)
+        for i in candidate_idxs:
+            similarity = cosine_similarity(query_embedding, self.chunk_embeddings[i])
             chunk_scores.append(
                 {
                     "chunk_idx": i,
@@ -309,6 +426,7 @@ class ChunkedSemanticSearch(SemanticSearch):
             )
 
         movie_scores = {}
+        movie_chunk_scores = {}
         for chunk_score in chunk_scores:
             movie_idx = chunk_score["movie_idx"]
             if (
@@ -316,33 +434,26 @@ class ChunkedSemanticSearch(SemanticSearch):
                 or chunk_score["score"] > movie_scores[movie_idx]
             ):
                 movie_scores[movie_idx] = chunk_score["score"]
+            movie_chunk_scores.setdefault(movie_idx, {})[
+                self.chunk_metadata[chunk_score["chunk_idx"]]["chunk_idx"]
+            ] = float(chunk_score["score"])
 
         sorted_movies = sorted(movie_scores.items(), key=lambda x: x[1], reverse=True)
-
-        results = []
-        for movie_idx, score in sorted_movies[:limit]:
-            doc = self.documents[movie_idx]
-            results.append(
-                format_search_result(
-                    doc_id=doc["id"],
-                    title=doc["title"],
-                    document=doc["description"][:DOCUMENT_PREVIEW_LENGTH],
-                    score=score,
-                )
-            )
-
-        return results
+        return [
+            (movie_idx, score, movie_chunk_scores[movie_idx])
+            for movie_idx, score in sorted_movies[:limit]
+        ]
 
 
 def embed_chunks_command() -> np.ndarray:
-    movies = load_movies()
+    movies = load_documents()
     searcher = ChunkedSemanticSearch()
     return searcher.load_or_create_chunk_embeddings(movies)
 
 
-def search_chunked_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> dict:
-    movies = load_movies()
+def search_chunked_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT, filters: Optional[list[str]] = None) -> dict:
+    movies = load_documents()
     searcher = ChunkedSemanticSearch()
     searcher.load_or_create_chunk_embeddings(movies)
-    results = searcher.search_chunks(query, limit)
+    results = searcher.search_chunks(query, limit, filters)
     return {"query": query, "results": results}
\ No newline at end of file
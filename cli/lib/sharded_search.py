@@ -0,0 +1,278 @@
+import multiprocessing as mp
+from multiprocessing.connection import Connection
+from typing import Optional
+
+import numpy as np
+
+from .hybrid_search import HybridSearch, combine_search_results, reciprocal_rank_fusion
+from .keyword_search import InvertedIndex, shard_artifact_prefix, shard_bounds
+from .metadata_filter import BitmapIndex
+from .search_utils import (
+    CANDIDATE_MULTIPLIER,
+    DEFAULT_SEARCH_LIMIT,
+    DEFAULT_SHARD_COUNT,
+    DOCUMENT_PREVIEW_LENGTH,
+    RRF_K,
+    format_search_result,
+)
+from .semantic_search import ChunkedSemanticSearch
+from .docstore import DocStore, load_documents
+from .snapshot import Snapshot, current_snapshot
+
+
+class ShardIndex(InvertedIndex):
+    """Inverted index over one shard that scores with corpus-wide BM25 statistics."""
+
+    def __init__(self, artifact_prefix: str = "") -> None:
+        super().__init__(artifact_prefix)
+        self.global_doc_count = 0
+        self.global_avg_doc_length = 0.0
+        self.global_doc_freqs: dict[str, int] = {}
+
+    def local_stats(self) -> dict:
+        return {
+            "doc_count": len(self.doc_lengths),
+            "total_length": sum(self.doc_lengths.values()),
+            "doc_freqs": {token: len(doc_ids) for token, doc_ids in self.index.items()},
+        }
+
+    def set_global_stats(self, stats: dict) -> None:
+        self.global_doc_count = stats["doc_count"]
+        self.global_avg_doc_length = stats["avg_doc_length"]
+        self.global_doc_freqs = stats["doc_freqs"]
+
+    def get_doc_count(self) -> int:
+        return self.global_doc_count
+
+    def get_doc_freq(self, token: str) -> int:
+        return self.global_doc_freqs.get(token, 0)
+
+    def get_avg_doc_length(self) -> float:
+        return self.global_avg_doc_length
+
+
+class ShardChunkSearch(ChunkedSemanticSearch):
+    """Chunk embedding slice for one shard; queries arrive already encoded."""
+
+    def __init__(
+        self,
+        chunk_embeddings: np.ndarray,
+        chunk_metadata: list[dict],
+        filters: BitmapIndex,
+    ) -> None:
+        super().__init__()
+        self.set_chunks(chunk_embeddings, chunk_metadata)
+        self.filters = filters
+
+
+def merge_stats(shard_stats: list[dict]) -> dict:
+    doc_count = 0
+    total_length = 0
+    doc_freqs: dict[str, int] = {}
+    for stats in shard_stats:
+        doc_count += stats["doc_count"]
+        total_length += stats["total_length"]
+        for token, doc_freq in stats["doc_freqs"].items():
+            doc_freqs[token] = doc_freqs.get(token, 0) + doc_freq
+
+    return {
+        "doc_count": doc_count,
+        "avg_doc_length": total_length / doc_count if doc_count else 0.0,
+        "doc_freqs": doc_freqs,
+    }
+
+
+def shard_worker(
+    conn: Connection,
+    snapshot: Snapshot,
+    artifact_prefix: str,
+    chunk_embeddings: np.ndarray,
+    chunk_metadata: list[dict],
+) -> None:
+    """Serve one shard's BM25 and chunk scores, from the shard's indexes in `snapshot`."""
+    try:
+        idx = ShardIndex(artifact_prefix)
+        idx.load(snapshot)
+        idx.filters.ensure_loaded()
+    except Exception as e:
+        conn.send(("error", e))
+        return
+    chunks = ShardChunkSearch(chunk_embeddings, chunk_metadata, idx.filters)
+    conn.send(("ok", idx.local_stats(), idx.filters.fields))
+
+    while True:
+        message = conn.recv()
+        match message[0]:
+            case "stats":
+                _, stats, fields = message
+                idx.set_global_stats(stats)
+                idx.filters.known_fields = set(fields)
+                conn.send(True)
+            case "search":
+                _, query, query_embedding, limit, filters = message
+                try:
+                    bm25 = idx.bm25_scores(query, limit, filters)
+                    semantic = chunks.chunk_movie_scores(query_embedding, limit, filters)
+                    conn.send(("ok", bm25, semantic))
+                except Exception as e:
+                    conn.send(("error", e))
+            case "stop":
+                conn.close()
+                return
+
+
+class ShardedHybridSearch:
+    def __init__(self, documents: DocStore, n_shards: int = DEFAULT_SHARD_COUNT, candidate_multiplier: int = CANDIDATE_MULTIPLIER) -> None:
+        if n_shards < 1:
+            raise ValueError("n_shards must be at least 1")
+
+        self.documents = documents
+        self.candidate_multiplier = candidate_multiplier
+        self.semantic_search = ChunkedSemanticSearch()
+        self.semantic_search.load_or_create_chunk_embeddings(documents)
+
+        snapshot = current_snapshot()
+        bounds = shard_bounds(len(documents), n_shards)
+        prefixes = [shard_artifact_prefix(shard, len(bounds)) for shard in range(len(bounds))]
+        for shard, prefix in enumerate(prefixes):
+            if not ShardIndex(prefix).exists(snapshot):
+                raise FileNotFoundError(
+                    f"No index for shard {shard} of {len(bounds)} in the current snapshot; "
+                    f"run `snapshot_cli.py build --shards {len(bounds)}` first"
+                )
+        self.shard_offsets = [start for start, _ in bounds]
+        chunk_movie_idxs = self.semantic_search.chunk_movie_idxs
+
+        self.connections: list[Connection] = []
+        self.processes: list[mp.Process] = []
+        for (start, end), prefix in zip(bounds, prefixes):
+            chunk_idxs = np.flatnonzero((chunk_movie_idxs >= start) & (chunk_movie_idxs < end))
+            shard_metadata = []
+            for i in chunk_idxs:
+                chunk = dict(self.semantic_search.chunk_metadata[i])
+                chunk["movie_idx"] -= start
+                shard_metadata.append(chunk)
+
+            parent_conn, child_conn = mp.Pipe()
+            process = mp.Process(
+                target=shard_worker,
+                args=(
+                    child_conn,
+                    snapshot,
+                    prefix,
+                    self.semantic_search.chunk_embeddings[chunk_idxs],
+                    shard_metadata,
+                ),
+                daemon=True,
+            )
+            process.start()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+
+        replies = [conn.recv() for conn in self.connections]
+        for reply in replies:
+            if reply[0] == "error":
+                self.close()
+                raise reply[1]
+        stats = merge_stats([reply[1] for reply in replies])
+        # A field missing from one shard's documents must match nothing there, not be an unknown field.
+        fields = sorted(set().union(*(reply[2] for reply in replies)))
+        for conn in self.connections:
+            conn.send(("stats", stats, fields))
+        for conn in self.connections:
+            conn.recv()
+
+    def close(self) -> None:
+        for conn, process in zip(self.connections, self.processes):
+            if process.is_alive():
+                try:
+                    conn.send(("stop",))
+                except OSError:
+                    pass
+            process.join()
+        self.connections = []
+        self.processes = []
+
+    def __enter__(self) -> "ShardedHybridSearch":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _scatter_gather(self, query: str, limit: int, filters: Optional[list[str]] = None) -> tuple[list[dict], list[dict]]:
+        query_embedding = self.semantic_search.generate_embedding(query)
+        for conn in self.connections:
+            conn.send(("search", query, query_embedding, limit, filters))
+
+        bm25_scores, semantic_scores = [], []
+        for offset, conn in zip(self.shard_offsets, self.connections):
+            reply = conn.recv()
+            if reply[0] == "error":
+                raise reply[1]
+            _, bm25, semantic = reply
+            bm25_scores.extend((score, self.documents.position(doc_id)) for doc_id, score in bm25)
+            semantic_scores.extend(
+                (score, offset + movie_idx, chunk_scores) for movie_idx, score, chunk_scores in semantic
+            )
+
+        bm25_scores.sort(key=lambda item: (-item[0], item[1]))
+        semantic_scores.sort(key=lambda item: (-item[0], item[1]))
+
+        bm25_results = []
+        for score, movie_idx in bm25_scores[:limit]:
+            doc = self.documents[movie_idx]
+            bm25_results.append(
+                format_search_result(doc_id=doc["id"], title=doc["title"], document=doc["description"], score=score)
+            )
+
+        semantic_results = []
+        for score, movie_idx, chunk_scores in semantic_scores[:limit]:
+            doc = self.documents[movie_idx]
+            semantic_results.append(
+                format_search_result(
+                    doc_id=doc["id"],
+                    title=doc["title"],
+                    document=doc["description"][:DOCUMENT_PREVIEW_LENGTH],
+                    score=score,
+                    chunk_scores=chunk_scores,
+                )
+            )
+
+        return bm25_results, semantic_results
+
+    def weighted_search(self, query: str, alpha: float, limit: int = DEFAULT_SEARCH_LIMIT, filters: Optional[list[str]] = None) -> list[dict]:
+        bm25_results, semantic_results = self._scatter_gather(query, limit * self.candidate_multiplier, filters)
+        combined = combine_search_results(bm25_results, semantic_results, alpha)
+        return combined[:limit]
+
+    def rrf_search(self, query, k, limit=10, filters: Optional[list[str]] = None) -> list[dict]:
+        bm25_results, semantic_results = self._scatter_gather(query, limit * self.candidate_multiplier, filters)
+        fused = reciprocal_rank_fusion(bm25_results, semantic_results, k)
+        return fused[:limit]
+
+
+def sharded_search_command(
+    query: str,
+    n_shards: int = DEFAULT_SHARD_COUNT,
+    k: int = RRF_K,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    filters: Optional[list[str]] = None,
+    check: bool = False,
+) -> dict:
+    movies = load_documents()
+    with ShardedHybridSearch(movies, n_shards) as searcher:
+        results = searcher.rrf_search(query, k, limit, filters)
+
+    matches_single_shard = None
+    if check:
+        expected = HybridSearch(movies).rrf_search(query, k, limit, filters)
+        matches_single_shard = expected == results
+
+    return {
+        "query": query,
+        "shards": len(searcher.shard_offsets),
+        "k": k,
+        "filters": filters or [],
+        "results": results,
+        "matches_single_shard": matches_single_shard,
+    }
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Optional
+
+from .search_utils import (
+    CURRENT_SNAPSHOT_PATH,
+    DATA_PATH,
+    SNAPSHOT_RETENTION,
+    SNAPSHOTS_DIR,
+)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+_corpus_fingerprint: Optional[tuple[int, int, str]] = None
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def corpus_hash() -> str:
+    global _corpus_fingerprint
+    stat = os.stat(DATA_PATH)
+    if _corpus_fingerprint is None or _corpus_fingerprint[:2] != (stat.st_size, stat.st_mtime_ns):
+        _corpus_fingerprint = (stat.st_size, stat.st_mtime_ns, file_sha256(DATA_PATH))
+    return _corpus_fingerprint[2]
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class Snapshot:
+    def __init__(self, path: str, manifest: dict) -> None:
+        self.path = path
+        self.manifest = manifest
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def artifacts(self) -> dict[str, dict]:
+        return self.manifest.get("artifacts", {})
+
+    def artifact_path(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def check(self, name: str, params: Optional[dict] = None, checksum: bool = False) -> Optional[str]:
+        """Return why `name` cannot be used from this snapshot, or None if it can."""
+        entry = self.artifacts.get(name)
+        if entry is None:
+            return "missing from manifest"
+        if entry["corpus_hash"] != corpus_hash():
+            return "built from a different movies.json"
+        if entry.get("params", {}) != (params or {}):
+            return f"built with params {entry.get('params', {})}, expected {params or {}}"
+
+        path = self.artifact_path(name)
+        if not os.path.exists(path):
+            return "file missing"
+        if os.path.getsize(path) != entry["size"]:
+            return "size does not match manifest"
+        if checksum and file_sha256(path) != entry["sha256"]:
+            return "checksum does not match manifest"
+        return None
+
+    def verify(self) -> dict[str, Optional[str]]:
+        problems = {}
+        for name, entry in self.artifacts.items():
+            problems[name] = self.check(name, entry.get("params", {}), checksum=True)
+        return problems
+
+
+def load_snapshot(path: str) -> Snapshot:
+    with open(os.path.join(path, MANIFEST_NAME), "r") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise SnapshotError(f"unsupported manifest version in {path}")
+    return Snapshot(path, manifest)
+
+
+def current_snapshot() -> Optional[Snapshot]:
+    if not os.path.exists(CURRENT_SNAPSHOT_PATH):
+        return None
+    with open(CURRENT_SNAPSHOT_PATH, "r") as f:
+        name = f.read().strip()
+    path = os.path.join(SNAPSHOTS_DIR, name)
+    if not name or not os.path.exists(os.path.join(path, MANIFEST_NAME)):
+        return None
+    return load_snapshot(path)
+
+
+def resolve_artifact(name: str, params: Optional[dict] = None, snapshot: Optional[Snapshot] = None) -> Optional[str]:
+    """Path of `name` in `snapshot` (by default the current one), or None if it is missing or stale.
+
+    Callers loading several artifacts should resolve the current snapshot
+    once and pass it to every lookup, so a rebuild committing in between
+    cannot mix files from two snapshots.
+    """
+    if snapshot is None:
+        snapshot = current_snapshot()
+    if snapshot is None or snapshot.check(name, params) is not None:
+        return None
+    return snapshot.artifact_path(name)
+
+
+def require_artifact(name: str, params: Optional[dict] = None, snapshot: Optional[Snapshot] = None) -> str:
+    if snapshot is None:
+        snapshot = current_snapshot()
+    if snapshot is None:
+        raise FileNotFoundError(f"No index snapshot found; build one before loading {name}")
+    problem = snapshot.check(name, params)
+    if problem is not None:
+        raise FileNotFoundError(f"{name} in snapshot {snapshot.name} is unusable: {problem}")
+    return snapshot.artifact_path(name)
+
+
+class SnapshotBuilder:
+    """Writes artifacts into a fresh snapshot directory and publishes it atomically.
+
+    Artifacts from the current snapshot that are still valid for this corpus
+    are hard-linked in, so a partial rebuild never mixes generations.
+    Use as a context manager: the snapshot is published on a clean exit and
+    discarded if the build raises.
+    """
+
+    def __init__(self) -> None:
+        self.corpus_hash = corpus_hash()
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.path = os.path.join(SNAPSHOTS_DIR, name)
+        self.artifacts: dict[str, dict] = {}
+        os.makedirs(self.path)
+
+        previous = current_snapshot()
+        if previous is None:
+            return
+        for artifact, entry in previous.artifacts.items():
+            if previous.check(artifact, entry.get("params", {})) is not None:
+                continue
+            link_or_copy(previous.artifact_path(artifact), os.path.join(self.path, artifact))
+            self.artifacts[artifact] = entry
+
+    def artifact_path(self, name: str) -> str:
+        path = os.path.join(self.path, name)
+        if os.path.exists(path):
+            # Never write through a hard link into the previous snapshot.
+            os.remove(path)
+        self.artifacts.pop(name, None)
+        return path
+
+    def record(self, name: str, params: Optional[dict] = None) -> None:
+        path = os.path.join(self.path, name)
+        self.artifacts[name] = {
+            "corpus_hash": self.corpus_hash,
+            "params": params or {},
+            "size": os.path.getsize(path),
+            "sha256": file_sha256(path),
+            "created_at": time.time(),
+        }
+
+    def commit(self) -> Snapshot:
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "created_at": time.time(),
+            "corpus_path": DATA_PATH,
+            "corpus_hash": self.corpus_hash,
+            "artifacts": self.artifacts,
+        }
+        write_atomic(os.path.join(self.path, MANIFEST_NAME), json.dumps(manifest, indent=2))
+        write_atomic(CURRENT_SNAPSHOT_PATH, os.path.basename(self.path))
+        prune_snapshots()
+        return Snapshot(self.path, manifest)
+
+    def abort(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self) -> "SnapshotBuilder":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def write_atomic(path: str, content: str) -> None:
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def prune_snapshots(keep: int = SNAPSHOT_RETENTION) -> list[str]:
+    """Remove all but the newest `keep` committed snapshots, never the current one.
+
+    Directories without a manifest are builds still in progress, possibly
+    in another process, and are left alone.
+    """
+    current = current_snapshot()
+    names = sorted(
+        name for name in os.listdir(SNAPSHOTS_DIR)
+        if os.path.exists(os.path.join(SNAPSHOTS_DIR, name, MANIFEST_NAME))
+    )
+    removed = []
+    for name in names[:-keep] if keep > 0 else names:
+        if current is not None and name == current.name:
+            continue
+        shutil.rmtree(os.path.join(SNAPSHOTS_DIR, name), ignore_errors=True)
+        removed.append(name)
+    return removed
+
+
+def snapshot_status_command() -> dict:
+    snapshot = current_snapshot()
+    if snapshot is None:
+        return {"snapshot": None, "artifacts": {}}
+
+    artifacts = {}
+    for name, entry in snapshot.artifacts.items():
+        artifacts[name] = {
+            "size": entry["size"],
+            "params": entry.get("params", {}),
+            "problem": snapshot.check(name, entry.get("params", {})),
+        }
+    return {"snapshot": snapshot.name, "artifacts": artifacts}
+
+
+def verify_snapshot_command() -> dict:
+    snapshot = current_snapshot()
+    if snapshot is None:
+        return {"snapshot": None, "problems": {}, "ok": False}
+
+    problems = snapshot.verify()
+    return {
+        "snapshot": snapshot.name,
+        "problems": problems,
+        "ok": all(problem is None for problem in problems.values()),
+    }
@@ -0,0 +1,85 @@
+import glob
+import os
+import subprocess
+import sys
+from typing import Optional
+
+from .search_utils import STARTUP_HEAVY_MODULES, STARTUP_IMPORT_BUDGET, STARTUP_REPEAT
+
+CLI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Commands that must start without the listed modules; plain BM25 search only needs nltk.
+STARTUP_COMMANDS = (
+    (("keyword_search_cli.py", "bm25search", "movie"), ("torch", "sentence_transformers", "google.genai")),
+)
+
+
+def parse_importtime(stderr: str) -> tuple[float, set[str]]:
+    """Total import seconds (the sum of top-level cumulative times) and every module imported, from `-X importtime` output."""
+    total_us = 0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line.split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2]
+        modules.add(name.strip())
+        # Nested imports are indented two spaces per level past the separator's one.
+        if not name.startswith("  "):
+            total_us += int(fields[1])
+    return total_us / 1e6, modules
+
+
+def uses_module(modules: set[str], package: str) -> bool:
+    return any(module == package or module.startswith(f"{package}.") for module in modules)
+
+
+def measure_startup(argv: tuple[str, ...], repeat: int = STARTUP_REPEAT) -> dict:
+    """Run a CLI under `-X importtime` `repeat` times and keep the fastest import time."""
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", *argv],
+            cwd=CLI_DIR,
+            capture_output=True,
+            text=True,
+        )
+        import_time, modules = parse_importtime(completed.stderr)
+        runs.append((import_time, modules, completed.returncode))
+    import_time, modules, returncode = min(runs, key=lambda run: run[0])
+    return {"command": " ".join(argv), "import_time": import_time, "modules": modules, "returncode": returncode}
+
+
+def startup_check_command(budget: float = STARTUP_IMPORT_BUDGET, repeat: int = STARTUP_REPEAT, scripts: Optional[list[str]] = None) -> dict:
+    """Check that every CLI imports within `budget` seconds and that none loads a heavy dependency before it needs it.
+
+    Each CLI is timed with --help, which must not import any of
+    STARTUP_HEAVY_MODULES; STARTUP_COMMANDS also run real commands against
+    their own module lists.
+    """
+    scripts = scripts or sorted(os.path.basename(path) for path in glob.glob(os.path.join(CLI_DIR, "*_cli.py")))
+    checks = [((script, "--help"), STARTUP_HEAVY_MODULES) for script in scripts]
+    checks += [(argv, forbidden) for argv, forbidden in STARTUP_COMMANDS if argv[0] in scripts]
+
+    results = []
+    for argv, forbidden in checks:
+        result = measure_startup(argv, repeat)
+        modules = result.pop("modules")
+        heavy = sorted(package for package in forbidden if uses_module(modules, package))
+        problems = []
+        if result["returncode"] != 0:
+            problems.append(f"exited with {result["returncode"]}")
+        if result["import_time"] > budget:
+            problems.append(f"imports took {result["import_time"]:.3f}s, over the {budget:.3f}s budget")
+        if heavy:
+            problems.append(f"imported {", ".join(heavy)}")
+        results.append({**result, "heavy": heavy, "problems": problems})
+
+    return {
+        "budget": budget,
+        "repeat": repeat,
+        "results": results,
+        "failures": [result["command"] for result in results if result["problems"]],
+    }
@@ -0,0 +1,156 @@
+import itertools
+import time
+from typing import Optional
+
+from .benchmark import latency_stats
+from .docstore import load_documents
+from .evaluation import f1_score, precision_at_k, recall_at_k
+from .hybrid_search import HybridSearch
+from .reranking import rerank
+from .search_utils import (
+    CANDIDATE_MULTIPLIER,
+    DEFAULT_ALPHA,
+    DEFAULT_SEARCH_LIMIT,
+    RRF_K,
+    SEARCH_MULTIPLIER,
+    load_golden_dataset,
+)
+
+SWEEP_METRICS = ("precision", "recall", "f1score", "mrr")
+SWEEP_RERANK_METHODS = ("cross_encoder",)
+
+
+def reciprocal_rank(retrieved_docs: list[str], relevant_docs: set[str]) -> float:
+    for rank, doc in enumerate(retrieved_docs, 1):
+        if doc in relevant_docs:
+            return 1 / rank
+    return 0.0
+
+
+def sweep_configs(
+    depths: list[int],
+    rrf_ks: list[int],
+    alphas: list[float],
+    rerank_method: Optional[str] = None,
+    multipliers: Optional[list[int]] = None,
+) -> list[dict]:
+    """Every combination of the knobs: RRF over depth x k, weighted search over depth x alpha.
+
+    With `rerank_method`, each of those is also crossed with the rerank
+    multipliers (how many candidates, as a multiple of the limit, get reranked).
+    """
+    searches = [{"mode": "rrf", "depth": depth, "k": k} for depth, k in itertools.product(depths, rrf_ks)]
+    searches += [{"mode": "weighted", "depth": depth, "alpha": alpha} for depth, alpha in itertools.product(depths, alphas)]
+    if rerank_method is None:
+        return searches
+    return [
+        {**search, "rerank": rerank_method, "multiplier": multiplier}
+        for search, multiplier in itertools.product(searches, multipliers or [SEARCH_MULTIPLIER])
+    ]
+
+
+def describe_config(config: dict) -> str:
+    knob = f"k={config["k"]}" if config["mode"] == "rrf" else f"alpha={config["alpha"]}"
+    label = f"{config["mode"]} depth={config["depth"]} {knob}"
+    if "rerank" in config:
+        label += f" {config["rerank"]} x{config["multiplier"]}"
+    return label
+
+
+def run_config(searcher: HybridSearch, config: dict, query: str, limit: int) -> list[dict]:
+    searcher.candidate_multiplier = config["depth"]
+    fetch = limit * config["multiplier"] if "rerank" in config else limit
+    if config["mode"] == "rrf":
+        results = searcher.rrf_search(query, config["k"], fetch)
+    else:
+        results = searcher.weighted_search(query, config["alpha"], fetch)
+    if "rerank" in config:
+        results = rerank(query, results, config["rerank"], limit)
+    return results[:limit]
+
+
+def pareto_frontier(points: list[dict], metric: str) -> list[dict]:
+    """The points no other point beats on both `metric` and mean latency, fastest first."""
+    frontier = []
+    best = float("-inf")
+    for point in sorted(points, key=lambda point: (point["latency"]["mean_ms"], -point[metric])):
+        if point[metric] > best:
+            frontier.append(point)
+            best = point[metric]
+    return frontier
+
+
+def sweep_command(
+    depths: Optional[list[int]] = None,
+    rrf_ks: Optional[list[int]] = None,
+    alphas: Optional[list[float]] = None,
+    rerank_method: Optional[str] = None,
+    multipliers: Optional[list[int]] = None,
+    metric: str = "recall",
+    min_quality: float = 0.0,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+) -> dict:
+    """Score every knob setting on the golden dataset and find the recall-vs-latency trade-offs.
+
+    All settings share one warm engine with the queries encoded up front, so
+    the latencies compare search work alone. The recommended setting is the
+    fastest one whose `metric` reaches `min_quality`.
+    """
+    if metric not in SWEEP_METRICS:
+        raise ValueError(f"unknown metric: {metric}")
+    if rerank_method is not None and rerank_method not in SWEEP_RERANK_METHODS:
+        raise ValueError(f"unsupported rerank method for a sweep: {rerank_method}")
+    configs = sweep_configs(
+        depths or [CANDIDATE_MULTIPLIER],
+        rrf_ks or [RRF_K],
+        alphas or [DEFAULT_ALPHA],
+        rerank_method,
+        multipliers,
+    )
+    if any(config["depth"] < 1 for config in configs):
+        raise ValueError("depths must be positive")
+
+    test_cases = load_golden_dataset()["test_cases"]
+    searcher = HybridSearch(load_documents())
+    searcher.semantic_search.encode_queries([test_case["query"] for test_case in test_cases])
+
+    points = []
+    for config in configs:
+        run_config(searcher, config, test_cases[0]["query"], limit)
+        scores = {name: 0.0 for name in SWEEP_METRICS}
+        latencies = []
+        for test_case in test_cases:
+            relevant_docs = set(test_case["relevant_docs"])
+            start = time.perf_counter()
+            results = run_config(searcher, config, test_case["query"], limit)
+            latencies.append(time.perf_counter() - start)
+            retrieved_docs = [result["title"] for result in results if result.get("title")]
+            precision = precision_at_k(retrieved_docs, relevant_docs, limit)
+            recall = recall_at_k(retrieved_docs, relevant_docs, limit)
+            scores["precision"] += precision
+            scores["recall"] += recall
+            scores["f1score"] += f1_score(precision, recall)
+            scores["mrr"] += reciprocal_rank(retrieved_docs, relevant_docs)
+        count = len(test_cases)
+        points.append({
+            "config": config,
+            "label": describe_config(config),
+            **{name: total / count if count else 0.0 for name, total in scores.items()},
+            "latency": latency_stats(latencies),
+        })
+    searcher.candidate_multiplier = CANDIDATE_MULTIPLIER
+
+    frontier = pareto_frontier(points, metric)
+    for point in points:
+        point["pareto"] = any(point is member for member in frontier)
+    qualifying = [point for point in frontier if point[metric] >= min_quality]
+
+    return {
+        "test_cases_count": len(test_cases),
+        "limit": limit,
+        "metric": metric,
+        "min_quality": min_quality,
+        "points": points,
+        "frontier": [point["label"] for point in frontier],
+        "recommended": qualifying[0] if qualifying else None,
+    }
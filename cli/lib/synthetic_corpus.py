@@ -0,0 +1,163 @@
+import json
+import os
+import shutil
+from typing import Optional
+
+import numpy as np
+
+from .search_utils import (
+    STOPWORDS_PATH,
+    SYNTHETIC_BATCH_SIZE,
+    SYNTHETIC_QUERY_COUNT,
+    SYNTHETIC_VOCAB_SIZE,
+    SYNTHETIC_ZIPF_EXPONENT,
+    load_stopwords,
+)
+
+GENRES = (
+    "Action", "Adventure", "Animation", "Comedy", "Crime", "Documentary", "Drama",
+    "Family", "Fantasy", "Horror", "Musical", "Mystery", "Romance", "Sci-Fi", "Thriller", "Western",
+)
+ONSETS = ("b", "c", "d", "f", "g", "h", "j", "k", "l", "m", "n", "p", "r", "s", "t", "v", "w", "z", "br", "cr", "dr", "st", "tr", "sh", "ch", "th")
+VOWELS = ("a", "e", "i", "o", "u", "ai", "ea", "ou")
+CODAS = ("", "", "n", "r", "s", "t", "l", "m", "nd", "st")
+
+
+def make_vocabulary(size: int, rng: np.random.Generator, head: Optional[list[str]] = None) -> list[str]:
+    """`size` distinct words, most frequent first: `head` (e.g. stopwords), then made-up words of growing length."""
+    words = list(dict.fromkeys(head or []))[:size]
+    seen = set(words)
+    while len(words) < size:
+        syllables = 1 + min(3, int(rng.exponential(1.0)) + len(words) * 3 // size)
+        word = "".join(
+            ONSETS[rng.integers(len(ONSETS))] + VOWELS[rng.integers(len(VOWELS))] + CODAS[rng.integers(len(CODAS))]
+            for _ in range(syllables)
+        )
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def zipf_probabilities(size: int, exponent: float = SYNTHETIC_ZIPF_EXPONENT) -> np.ndarray:
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+
+def make_description(words: np.ndarray, sentence_lengths: np.ndarray) -> str:
+    sentences = []
+    start = 0
+    for length in sentence_lengths:
+        sentence = " ".join(words[start:start + length])
+        sentences.append(sentence[:1].upper() + sentence[1:] + ".")
+        start += length
+    return " ".join(sentences)
+
+
+def generate_movies(
+    count: int,
+    vocabulary: list[str],
+    rng: np.random.Generator,
+    exponent: float = SYNTHETIC_ZIPF_EXPONENT,
+    start_id: int = 1,
+):
+    """Yield `count` movies.json-style movies.
+
+    Description words follow a Zipf distribution over `vocabulary`, sentence
+    counts are log-normal so a few descriptions are far longer than the
+    rest, and titles are drawn from the less common words.
+    """
+    vocab = np.array(vocabulary)
+    cumulative = np.cumsum(zipf_probabilities(len(vocab), exponent))
+    title_words = vocab[len(vocab) // 20:] if len(vocab) >= 40 else vocab
+
+    for offset in range(count):
+        doc_id = start_id + offset
+        sentence_count = max(1, int(rng.lognormal(mean=1.5, sigma=0.7)))
+        sentence_lengths = rng.integers(5, 20, size=sentence_count)
+        ranks = np.searchsorted(cumulative, rng.random(int(sentence_lengths.sum())), side="right")
+        words = vocab[np.minimum(ranks, len(vocab) - 1)]
+        title = " ".join(word.capitalize() for word in rng.choice(title_words, size=rng.integers(1, 4)))
+        genres = rng.choice(len(GENRES), size=rng.integers(1, 4), replace=False)
+        yield {
+            "id": doc_id,
+            "title": f"{title} {doc_id}",
+            "description": make_description(words, sentence_lengths),
+            "year": int(rng.integers(1920, 2026)),
+            "genres": [GENRES[i] for i in sorted(genres)],
+        }
+
+
+def make_test_case(movie: dict, stopwords: set[str], rng: np.random.Generator) -> Optional[dict]:
+    terms = [word for word in dict.fromkeys(movie["description"].lower().replace(".", "").split()) if word not in stopwords]
+    if len(terms) < 2:
+        return None
+    picked = rng.choice(len(terms), size=2, replace=False)
+    return {"query": " ".join(terms[i] for i in sorted(picked)), "relevant_docs": [movie["title"]]}
+
+
+def generate_corpus(
+    output_dir: str,
+    count: int,
+    vocab_size: int = SYNTHETIC_VOCAB_SIZE,
+    exponent: float = SYNTHETIC_ZIPF_EXPONENT,
+    queries: int = SYNTHETIC_QUERY_COUNT,
+    seed: int = 0,
+    batch_size: int = SYNTHETIC_BATCH_SIZE,
+) -> dict:
+    """Write movies.json, golden_dataset.json and stopwords.txt for a synthetic corpus of `count` movies.
+
+    Movies are streamed to disk `batch_size` at a time, so memory stays flat
+    however large the corpus. Golden queries are two terms from the
+    description of a random movie, with that movie as the only relevant one.
+    """
+    rng = np.random.default_rng(seed)
+    stopwords = load_stopwords()
+    vocabulary = make_vocabulary(vocab_size, rng, head=stopwords)
+    query_positions = set(rng.choice(count, size=min(queries, count), replace=False).tolist())
+
+    os.makedirs(output_dir, exist_ok=True)
+    movies_path = os.path.join(output_dir, "movies.json")
+    test_cases = []
+    total_words = 0
+    with open(movies_path, "w") as f:
+        f.write('{"movies": [')
+        for batch_start in range(0, count, batch_size):
+            batch = generate_movies(min(batch_size, count - batch_start), vocabulary, rng, exponent, start_id=batch_start + 1)
+            for position, movie in enumerate(batch, batch_start):
+                f.write((",\n" if position else "\n") + json.dumps(movie))
+                total_words += len(movie["description"].split())
+                if position in query_positions:
+                    test_case = make_test_case(movie, set(stopwords), rng)
+                    if test_case is not None:
+                        test_cases.append(test_case)
+        f.write("\n]}\n")
+
+    with open(os.path.join(output_dir, "golden_dataset.json"), "w") as f:
+        json.dump({"test_cases": test_cases}, f, indent=2)
+    if os.path.abspath(STOPWORDS_PATH) != os.path.abspath(os.path.join(output_dir, "stopwords.txt")):
+        shutil.copyfile(STOPWORDS_PATH, os.path.join(output_dir, "stopwords.txt"))
+
+    return {
+        "output_dir": output_dir,
+        "movies": count,
+        "vocab_size": len(vocabulary),
+        "avg_words": total_words / count if count else 0.0,
+        "test_cases": len(test_cases),
+        "bytes": os.path.getsize(movies_path),
+    }
+
+
+def generate_corpus_command(
+    output_dir: str,
+    count: int,
+    vocab_size: int = SYNTHETIC_VOCAB_SIZE,
+    exponent: float = SYNTHETIC_ZIPF_EXPONENT,
+    queries: int = SYNTHETIC_QUERY_COUNT,
+    seed: int = 0,
+) -> dict:
+    if count < 1:
+        raise ValueError("count must be positive")
+    if vocab_size < 1:
+        raise ValueError("vocab_size must be positive")
+    return generate_corpus(output_dir, count, vocab_size, exponent, queries, seed)
@@ -0,0 +1,106 @@
+import atexit
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Callable, Optional
+
+_NO_SPAN = nullcontext()
+
+
+class Tracer:
+    """Records timed spans as Chrome trace events ("ph": "X"), viewable in chrome://tracing or Perfetto.
+
+    Until `enable` is called `span` hands back a shared no-op context manager,
+    so instrumented code costs one attribute check per span.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.path: Optional[str] = None
+        self.events: list[dict] = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def enable(self, path: str) -> None:
+        self.path = path
+        self.events = []
+        self._origin = time.perf_counter()
+        self.enabled = True
+
+    def span(self, name: str, category: str = "search", **args):
+        if not self.enabled:
+            return _NO_SPAN
+        return self._record(name, category, args)
+
+    @contextmanager
+    def _record(self, name: str, category: str, args: dict):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if args:
+                event["args"] = {key: value if isinstance(value, (int, float, bool)) else str(value) for key, value in args.items()}
+            with self._lock:
+                self.events.append(event)
+
+    def save(self, path: Optional[str] = None) -> Optional[str]:
+        path = path or self.path
+        if path is None:
+            return None
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event["ts"])
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
+
+
+tracer = Tracer()
+
+
+def span(name: str, category: str = "search", **args):
+    """Time the enclosed block as a span named `name`, when tracing is enabled."""
+    return tracer.span(name, category, **args)
+
+
+def traced(name: str, category: str = "search") -> Callable:
+    """Decorator recording each call of a function (sync or async) as a span."""
+
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not tracer.enabled:
+                    return await fn(*args, **kwargs)
+                with tracer.span(name, category):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with tracer.span(name, category):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def enable_tracing(path: str) -> None:
+    """Record spans for the rest of the process and write them to `path` on exit."""
+    tracer.enable(path)
+    atexit.register(tracer.save)
@@ -0,0 +1,52 @@
+import argparse
+
+from lib.llm_cache import cache_clear_command, cache_evict_command, cache_stats_command
+from lib.semantic_cache import semantic_cache_clear_command, semantic_cache_stats_command
+from lib.profiling import enable_profiling
+from lib.tracing import enable_tracing
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini Response Cache CLI")
+    parser.add_argument("--trace", type=str, metavar="PATH", help="Write a Chrome trace-event JSON of this run to PATH")
+    parser.add_argument("--profile", type=str, metavar="PATH", help="Sample this run's stacks; write them collapsed (flamegraph format) to PATH and print the hottest functions")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    subparsers.add_parser("stats", help="Show the number and size of cached responses")
+    subparsers.add_parser("evict", help="Remove expired responses and shrink the cache to its size limit")
+    subparsers.add_parser("clear", help="Remove every cached response")
+    subparsers.add_parser("enhancements", help="Show the semantic cache of query enhancements")
+    subparsers.add_parser("clear-enhancements", help="Remove every cached query enhancement")
+
+    args = parser.parse_args()
+    if args.trace:
+        enable_tracing(args.trace)
+    if args.profile:
+        enable_profiling(args.profile)
+
+    match args.command:
+        case "stats":
+            result = cache_stats_command()
+            print(f"Cache: {result["path"]} (mode: {result["mode"]})")
+            print(f"Entries: {result["entries"]}")
+            print(f"Size: {result["bytes"]} / {result["max_bytes"]} bytes")
+            print(f"TTL: {result["ttl"]:.0f}s")
+        case "evict":
+            result = cache_evict_command()
+            print(f"Removed {result["removed"]} response(s), {result["entries"]} left")
+        case "clear":
+            result = cache_clear_command()
+            print(f"Removed {result["removed"]} response(s)")
+        case "enhancements":
+            result = semantic_cache_stats_command()
+            print(f"Enhancement cache: {result["path"]} (threshold: {result["threshold"]})")
+            for method, entries in result["entries"].items():
+                print(f"   - {method}: {entries} / {result["max_entries"]} entries")
+        case "clear-enhancements":
+            result = semantic_cache_clear_command()
+            print(f"Removed {result["removed"]} enhancement(s)")
+        case _:
+            parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
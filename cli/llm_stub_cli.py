@@ -0,0 +1,88 @@
+import argparse
+import os
+import time
+
+from lib.llm_stub import StubGeminiServer, start_stub_server, STUB_HOST, STUB_PORT
+from lib.search_utils import DEFAULT_RERANK_CONCURRENCY, DEFAULT_SEARCH_LIMIT, LLM_RPS, SEARCH_MULTIPLIER
+from lib.profiling import enable_profiling
+from lib.tracing import enable_tracing
+
+def bench_rerank(candidates: int, limit: int, latency: float, error_rate: float, rps: float, max_concurrency: int) -> dict:
+    server = start_stub_server(latency=latency, error_rate=error_rate)
+    os.environ["GEMINI_BASE_URL"] = server.base_url
+    os.environ.setdefault("gemini_api_key", "stub")
+
+    from lib.llm_cache import llm_cache
+    from lib.llm_client import set_client, set_rate_limit
+    from lib.reranking import llm_rerank_individual
+
+    # Rebuild the shared client so it picks up the stub's base URL, and
+    # bypass the response cache so every candidate is really requested.
+    set_client(None)
+    set_rate_limit(rps)
+    llm_cache.mode = "off"
+
+    documents = [
+        {"id": i, "title": f"Movie {i}", "document": f"Description of movie {i}"}
+        for i in range(1, candidates + 1)
+    ]
+
+    start = time.perf_counter()
+    results = llm_rerank_individual("stub query", documents, limit, max_concurrency)
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    return {
+        "candidates": candidates,
+        "requests": len(server.requests),
+        "results": len(results),
+        "elapsed": elapsed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stub Gemini server for offline tests and benchmarks")
+    parser.add_argument("--trace", type=str, metavar="PATH", help="Write a Chrome trace-event JSON of this run to PATH")
+    parser.add_argument("--profile", type=str, metavar="PATH", help="Sample this run's stacks; write them collapsed (flamegraph format) to PATH and print the hottest functions")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    serve_parser = subparsers.add_parser("serve", help="Run the stub server in the foreground")
+    serve_parser.add_argument("--host", type=str, default=STUB_HOST, help=f"Host to bind (default={STUB_HOST})")
+    serve_parser.add_argument("--port", type=int, default=STUB_PORT, help=f"Port to bind (default={STUB_PORT})")
+    serve_parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each response")
+    serve_parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    serve_parser.add_argument("--chunk-delay", type=float, default=0.0, help="Seconds between chunks of a streamed response")
+
+    bench_parser = subparsers.add_parser("bench-rerank", help="Measure end-to-end individual LLM rerank latency against the stub")
+    bench_parser.add_argument("--candidates", type=int, default=DEFAULT_SEARCH_LIMIT * SEARCH_MULTIPLIER, help="Number of documents to rerank")
+    bench_parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help="Number of reranked results to keep")
+    bench_parser.add_argument("--latency", type=float, default=0.5, help="Simulated seconds per Gemini call")
+    bench_parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    bench_parser.add_argument("--rps", type=float, default=LLM_RPS, help=f"Requests per second allowed (default={LLM_RPS})")
+    bench_parser.add_argument("--max-concurrency", type=int, default=DEFAULT_RERANK_CONCURRENCY, help=f"Maximum requests in flight (default={DEFAULT_RERANK_CONCURRENCY})")
+
+    args = parser.parse_args()
+    if args.trace:
+        enable_tracing(args.trace)
+    if args.profile:
+        enable_profiling(args.profile)
+
+    match args.command:
+        case "serve":
+            server = StubGeminiServer(args.host, args.port, args.latency, error_rate=args.error_rate, chunk_delay=args.chunk_delay)
+            print(f"Stub Gemini server listening on {server.base_url}")
+            print(f"Point the CLIs at it with: GEMINI_BASE_URL={server.base_url}")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.server_close()
+        case "bench-rerank":
+            result = bench_rerank(args.candidates, args.limit, args.latency, args.error_rate, args.rps, args.max_concurrency)
+            print(f"Reranked {result["candidates"]} candidates in {result["elapsed"]:.2f}s ({result["requests"]} requests)")
+        case _:
+            parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
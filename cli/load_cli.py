@@ -0,0 +1,86 @@
+import argparse
+
+from lib.load_generator import LOAD_MODES, SERVER_HOST, SERVER_PORT, SearchServer, point_llm_at_stub, replay_command, write_sample_log
+from lib.search_utils import DEFAULT_LOAD_CONCURRENCY, DEFAULT_SEARCH_LIMIT
+from lib.profiling import enable_profiling
+from lib.tracing import enable_tracing
+
+def main():
+    parser = argparse.ArgumentParser(description="Query-Log Replay Load Generator CLI")
+    parser.add_argument("--trace", type=str, metavar="PATH", help="Write a Chrome trace-event JSON of this run to PATH")
+    parser.add_argument("--profile", type=str, metavar="PATH", help="Sample this run's stacks; write them collapsed (flamegraph format) to PATH and print the hottest functions")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    replay_parser = subparsers.add_parser("replay", help="Replay a JSONL query log against the engine and report throughput, latency and errors")
+    replay_parser.add_argument("log", type=str, help="JSONL query log, one {\"query\", \"mode\", \"params\"} object per line")
+    replay_parser.add_argument("--requests", type=int, help="Requests to send, cycling through the log (default=one pass)")
+    load_group = replay_parser.add_mutually_exclusive_group()
+    load_group.add_argument("--qps", type=float, help="Open-loop arrival rate in requests per second")
+    load_group.add_argument("--concurrency", type=int, default=DEFAULT_LOAD_CONCURRENCY, help=f"Closed-loop requests in flight (default={DEFAULT_LOAD_CONCURRENCY})")
+    replay_parser.add_argument("--url", type=str, help="Replay against the search server at this URL instead of in-process")
+    replay_parser.add_argument("--live-llm", action="store_true", help="Send LLM stages to Gemini instead of a local stub")
+    replay_parser.add_argument("--stub-latency", type=float, default=0.0, help="Seconds the stub waits before each LLM response")
+    replay_parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Fraction of LLM requests the stub answers with HTTP 429")
+
+    serve_parser = subparsers.add_parser("serve", help="Serve POST /search on one warm engine, as a target for replay --url")
+    serve_parser.add_argument("--host", type=str, default=SERVER_HOST, help=f"Host to bind (default={SERVER_HOST})")
+    serve_parser.add_argument("--port", type=int, default=SERVER_PORT, help=f"Port to bind (default={SERVER_PORT})")
+    serve_parser.add_argument("--live-llm", action="store_true", help="Send LLM stages to Gemini instead of a local stub")
+    serve_parser.add_argument("--stub-latency", type=float, default=0.0, help="Seconds the stub waits before each LLM response")
+    serve_parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Fraction of LLM requests the stub answers with HTTP 429")
+
+    sample_parser = subparsers.add_parser("sample-log", help="Write a query log from the golden-dataset queries")
+    sample_parser.add_argument("output", type=str, help="Path of the JSONL log to write")
+    sample_parser.add_argument("--modes", type=str, nargs="+", choices=LOAD_MODES, default=list(LOAD_MODES), help="Search modes to log each query in (default=all)")
+    sample_parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help=f"Number of results per search (default={DEFAULT_SEARCH_LIMIT})")
+
+    args = parser.parse_args()
+    if args.trace:
+        enable_tracing(args.trace)
+    if args.profile:
+        enable_profiling(args.profile)
+
+    match args.command:
+        case "replay":
+            result = replay_command(
+                args.log, args.requests, args.qps, args.concurrency, args.url,
+                not args.live_llm, args.stub_latency, args.stub_error_rate,
+            )
+            load = f"{result["target_qps"]:g} qps open-loop" if result["target_qps"] else f"concurrency {result["concurrency"]}"
+            print(f"Replayed {result["requests"]} requests from {result["log"]} against {result["target"]} ({load})")
+            if result["stub"]:
+                print(f"LLM stages answered by the stub at {result["stub"]} ({result["llm_requests"]} calls)")
+            print(f"Throughput: {result["throughput"]:.1f} req/s over {result["elapsed"]:.2f}s")
+            print(f"Errors: {result["error_rate"]:.1%}" + "".join(f", {name} x{count}" for name, count in result["errors"].items()))
+            latency = result["latency"]
+            print(f"Latency: mean {latency["mean_ms"]:.2f} ms, p50 {latency["p50_ms"]:.2f} ms, p95 {latency["p95_ms"]:.2f} ms, p99 {latency["p99_ms"]:.2f} ms")
+            for mode, stats in result["by_mode"].items():
+                print(f"   - {mode:<10} {stats["runs"]:>6} ok, p50 {stats["p50_ms"]:.2f} ms, p99 {stats["p99_ms"]:.2f} ms")
+            print("Histogram:")
+            peak = max((bucket["count"] for bucket in result["histogram"]), default=0)
+            for bucket in result["histogram"]:
+                if bucket["count"]:
+                    label = f"<= {bucket["le_ms"]} ms" if bucket["le_ms"] is not None else "slower"
+                    print(f"   {label:>12} {bucket["count"]:>6} {"#" * round(40 * bucket["count"] / peak)}")
+        case "serve":
+            stub_server = None if args.live_llm else point_llm_at_stub(args.stub_latency, args.stub_error_rate)
+            server = SearchServer(args.host, args.port)
+            print(f"Search server listening on {server.base_url}")
+            if stub_server is not None:
+                print(f"LLM stages answered by the stub at {stub_server.base_url}")
+            print(f"Replay against it with: load_cli.py replay LOG --url {server.base_url}")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.server_close()
+        case "sample-log":
+            count = write_sample_log(args.output, tuple(args.modes), args.limit)
+            print(f"Wrote {count} requests to {args.output}")
+        case _:
+            parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
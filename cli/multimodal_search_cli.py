@@ -1,9 +1,13 @@
 import argparse
 
 from lib.multimodal_search import verify_image_embedding, image_search_command
+from lib.profiling import enable_profiling
+from lib.tracing import enable_tracing
 
 def main():
     parser = argparse.ArgumentParser(description="Multimodal Search CLI")
+    parser.add_argument("--trace", type=str, metavar="PATH", help="Write a Chrome trace-event JSON of this run to PATH")
+    parser.add_argument("--profile", type=str, metavar="PATH", help="Sample this run's stacks; write them collapsed (flamegraph format) to PATH and print the hottest functions")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     verify_parser = subparsers.add_parser("verify_image_embedding", help="Image Path")
@@ -13,6 +17,10 @@ def main():
     image_search_parser.add_argument("image", type=str, help="Image path")
     
     args = parser.parse_args()
+    if args.trace:
+        enable_tracing(args.trace)
+    if args.profile:
+        enable_profiling(args.profile)
 
     match args.command:
         case "verify_image_embedding":
@@ -13,10 +13,14 @@ from lib.semantic_search import (
     verify_embeddings,
     verify_model,
 )
+from lib.profiling import enable_profiling
+from lib.tracing import enable_tracing
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Semantic Search CLI")
+    parser.add_argument("--trace", type=str, metavar="PATH", help="Write a Chrome trace-event JSON of this run to PATH")
+    parser.add_argument("--profile", type=str, metavar="PATH", help="Sample this run's stacks; write them collapsed (flamegraph format) to PATH and print the hottest functions")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     subparsers.add_parser("verify", help="Verify that the embedding model is loaded")
@@ -42,6 +46,13 @@ def main() -> None:
     search_parser.add_argument(
         "--limit", type=int, default=5, help="Number of results to return"
     )
+    search_parser.add_argument(
+        "--filter",
+        type=str,
+        action="append",
+        dest="filters",
+        help="Metadata filter such as year>=2000 or genre=comedy (repeatable)",
+    )
 
     chunk_parser = subparsers.add_parser(
         "chunk", help="Split text into fixed-size chunks with optional overlap"
@@ -85,8 +96,19 @@ def main() -> None:
     search_chunked_parser.add_argument(
         "--limit", type=int, default=5, help="Number of results to return"
     )
+    search_chunked_parser.add_argument(
+        "--filter",
+        type=str,
+        action="append",
+        dest="filters",
+        help="Metadata filter such as year>=2000 or genre=comedy (repeatable)",
+    )
 
     args = parser.parse_args()
+    if args.trace:
+        enable_tracing(args.trace)
+    if args.profile:
+        enable_profiling(args.profile)
 
     match args.command:
         case "verify":
@@ -98,7 +120,7 @@ def main() -> None:
         case "embedquery":
             embed_query_text(args.query)
         case "search":
-            semantic_search(args.query, args.limit)
+            semantic_search(args.query, args.limit, args.filters)
         case "chunk":
             chunk_text(args.text, args.chunk_size, args.overlap)
         case "semantic_chunk":
@@ -107,7 +129,7 @@ def main() -> None:
             embeddings = embed_chunks_command()
             print(f"Generated {len(embeddings)} chunked embeddings")
         case "search_chunked":
-            result = search_chunked_command(args.query, args.limit)
+            result = search_chunked_command(args.query, args.limit, args.filters)
             print(f"Query: {result['query']}")
             print("Results:")
             for i, res in enumerate(result["results"], 1):
@@ -0,0 +1,63 @@
+import argparse
+import sys
+
+from lib.hybrid_search import build_snapshot_command
+from lib.snapshot import prune_snapshots, snapshot_status_command, verify_snapshot_command
+from lib.search_utils import DEFAULT_SHARD_COUNT, SNAPSHOT_RETENTION
+from lib.profiling import enable_profiling
+from lib.tracing import enable_tracing
+
+def main():
+    parser = argparse.ArgumentParser(description="Index Snapshot CLI")
+    parser.add_argument("--trace", type=str, metavar="PATH", help="Write a Chrome trace-event JSON of this run to PATH")
+    parser.add_argument("--profile", type=str, metavar="PATH", help="Sample this run's stacks; write them collapsed (flamegraph format) to PATH and print the hottest functions")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    build_parser = subparsers.add_parser("build", help="Build every index artifact into a new snapshot and make it current")
+    build_parser.add_argument("--shards", type=int, nargs="+", default=[DEFAULT_SHARD_COUNT], help=f"Shard counts to build per-shard indexes for, for sharded-search (default={DEFAULT_SHARD_COUNT})")
+    subparsers.add_parser("status", help="Show the current snapshot and whether each artifact is usable")
+    subparsers.add_parser("verify", help="Verify checksums of every artifact in the current snapshot")
+
+    prune_parser = subparsers.add_parser("prune", help="Delete old snapshots")
+    prune_parser.add_argument("--keep", type=int, default=SNAPSHOT_RETENTION, help=f"Number of snapshots to keep (default={SNAPSHOT_RETENTION})")
+
+    args = parser.parse_args()
+    if args.trace:
+        enable_tracing(args.trace)
+    if args.profile:
+        enable_profiling(args.profile)
+
+    match args.command:
+        case "build":
+            result = build_snapshot_command(tuple(args.shards))
+            print(f"Built snapshot {result["snapshot"]}")
+            for name in result["artifacts"]:
+                print(f"   - {name}")
+        case "status":
+            result = snapshot_status_command()
+            if result["snapshot"] is None:
+                print("No current snapshot")
+                return
+            print(f"Current snapshot: {result["snapshot"]}")
+            for name, artifact in result["artifacts"].items():
+                status = artifact["problem"] or "ok"
+                print(f"   - {name} ({artifact["size"]} bytes): {status}")
+        case "verify":
+            result = verify_snapshot_command()
+            if result["snapshot"] is None:
+                print("No current snapshot")
+                sys.exit(1)
+            print(f"Verifying snapshot {result["snapshot"]}")
+            for name, problem in result["problems"].items():
+                print(f"   - {name}: {problem or "ok"}")
+            if not result["ok"]:
+                sys.exit(1)
+        case "prune":
+            removed = prune_snapshots(args.keep)
+            print(f"Removed {len(removed)} snapshot(s)")
+        case _:
+            parser.print_help()
+
+
+if __name__ == "__main__":
+    main()